@@ -0,0 +1,114 @@
+"""
+Решение прямоугольной задачи о назначениях венгерским алгоритмом
+(поиск кратчайших увеличивающих путей с потенциалами)
+"""
+
+import numpy as np
+
+import instrumentation
+from algorithm.cost import MatrixCostOracle
+from util import is_expired
+
+
+INFINITY = np.iinfo(np.int64).max // 4
+
+
+def solve_assignment(costs, deadline=None):
+    """
+    Находит назначение минимальной стоимости для прямоугольной матрицы
+    стоимостей. Каждому столбцу (задаче) назначается ровно одна строка, каждая
+    строка назначается не более чем одному столбцу.
+
+    Матрица может быть задана неявно оракулом (см. algorithm.cost), тогда
+    алгоритму нужно O(rows) дополнительной памяти.
+
+    Если задан deadline и время истекло, алгоритм останавливается между
+    добавлениями столбцов: назначение остальных столбцов равно -1, а
+    назначение добавленных оптимально для подматрицы из этих столбцов.
+
+    :param np.ndarray|algorithm.cost.PositionCostOracle costs: матрица или оракул
+        размера (rows, cols), rows >= cols
+    :param util.Deadline|None deadline:
+    :rtype np.ndarray
+    :return: массив длины cols: для каждого столбца - номер назначенной ему строки
+    """
+    if not hasattr(costs, 'column'):
+        costs = MatrixCostOracle(costs)
+    row_count, column_count = costs.shape
+    return _solve(costs.column, row_count, column_count, deadline)
+
+
+def _solve(column_costs, row_count, column_count, deadline=None):
+    """
+    Венгерский алгоритм в форме последовательного добавления столбцов.
+    Индексация строк сдвинута на единицу: нулевая строка фиктивная.
+
+    :param callable column_costs: column -> np.ndarray стоимостей по всем строкам
+    :param int row_count:
+    :param int column_count:
+    :param util.Deadline|None deadline:
+    :rtype np.ndarray
+    :return:
+    """
+    u = np.zeros(column_count, np.int64)  # потенциалы столбцов (задач)
+    v = np.zeros(row_count + 1, np.int64)  # потенциалы строк
+    row_column = np.full(row_count + 1, -1, np.int64)  # столбец, назначенный строке
+    augmentations = 0
+    for column in range(0, column_count):
+        if is_expired(deadline):
+            break
+        _augment(column, column_costs, u, v, row_column)
+        augmentations += 1
+    instrumentation.count('assignment.augmentations', augmentations)
+    result = np.full(column_count, -1, np.int64)
+    assigned_rows = np.nonzero(row_column[1:] >= 0)[0]
+    result[row_column[assigned_rows + 1]] = assigned_rows
+    return result
+
+
+def _augment(column, column_costs, u, v, row_column):
+    """
+    Добавляет в назначение столбец column по кратчайшему увеличивающему пути,
+    сохраняя допустимость потенциалов. Массивы u, v и row_column изменяются
+    на месте.
+
+    :param int column:
+    :param callable column_costs:
+    :param np.ndarray u:
+    :param np.ndarray v:
+    :param np.ndarray row_column:
+    """
+    size = len(v)
+    min_reduced = np.full(size, INFINITY, np.int64)
+    way = np.zeros(size, np.int64)
+    used = np.zeros(size, bool)
+    row_column[0] = column
+    current_row = 0
+    while True:
+        used[current_row] = True
+        current_column = row_column[current_row]
+        free = ~used
+        reduced = column_costs(current_column) - u[current_column] - v[1:]
+        improved = free[1:] & (reduced < min_reduced[1:])
+        min_reduced[1:][improved] = reduced[improved]
+        way[1:][improved] = current_row
+
+        candidates = np.where(free, min_reduced, INFINITY)
+        candidates[0] = INFINITY
+        next_row = int(np.argmin(candidates))
+        delta = candidates[next_row]
+
+        u[row_column[used]] += delta
+        v[used] -= delta
+        min_reduced[free] -= delta
+
+        current_row = next_row
+        if row_column[current_row] < 0:
+            break
+
+    # разворачиваем увеличивающий путь
+    while current_row:
+        previous_row = way[current_row]
+        row_column[current_row] = row_column[previous_row]
+        current_row = previous_row
+    row_column[0] = -1
@@ -0,0 +1,122 @@
+"""
+Кэш решений задачи о назначениях для независимых задач.
+
+Ключ - хэш формы и содержимого матрицы task_costs, значение - назначение
+тасков на строки матрицы C. В памяти хранится не более max_size последних
+использованных решений, дополнительно решения могут сохраняться на диск.
+Кэшем можно пользоваться из нескольких потоков.
+"""
+
+import hashlib
+import os
+import os.path
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import instrumentation
+
+DEFAULT_MAX_SIZE = 1024
+
+
+class SolutionCache:
+    """
+    LRU-кэш решений с необязательным хранилищем на диске
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, path=None):
+        """
+        :param int max_size: максимальное количество решений в памяти
+        :param str|None path: каталог для хранения решений на диске
+        """
+        self.max_size = max_size
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # защищает _entries и счётчики
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(task_costs):
+        """
+        :param np.matrix task_costs:
+        :rtype str
+        """
+        data = np.ascontiguousarray(task_costs, np.int64)
+        result = hashlib.sha1('{}x{}:'.format(*data.shape).encode())
+        result.update(data.tobytes())
+        return result.hexdigest()
+
+    def _file_name(self, key):
+        return os.path.join(self.path, key + '.npy')
+
+    def _remember(self, key, task_rows):
+        """
+        Вызывается под self._lock
+        """
+        self._entries[key] = task_rows
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, task_costs):
+        """
+        Возвращает сохранённое решение
+
+        :param np.matrix task_costs:
+        :rtype dict|None
+        :return: {таск: строка матрицы C, ...} либо None, если решения нет
+        """
+        key = self.key(task_costs)
+        with self._lock:
+            task_rows = self._entries.get(key)
+            if task_rows is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if task_rows is not None:
+            instrumentation.count('cache.hits')
+        elif self.path and os.path.isfile(self._file_name(key)):
+            task_rows = np.load(self._file_name(key))
+            with self._lock:
+                self._remember(key, task_rows)
+                self.disk_hits += 1
+            instrumentation.count('cache.disk_hits')
+        else:
+            with self._lock:
+                self.misses += 1
+            instrumentation.count('cache.misses')
+            return None
+        return dict(enumerate(task_rows.tolist()))
+
+    def put(self, task_costs, task_rows):
+        """
+        Сохраняет решение
+
+        :param np.matrix task_costs:
+        :param dict task_rows: {таск: строка матрицы C, ...}
+        """
+        key = self.key(task_costs)
+        rows = np.empty(len(task_rows), np.int64)
+        for task, row in task_rows.items():
+            rows[task] = row
+        with self._lock:
+            self._remember(key, rows)
+        if self.path:
+            # запись через временный файл, чтобы другие потоки и процессы не прочитали его недописанным
+            temporary_file_name = '{}.{}.{}.tmp'.format(self._file_name(key), os.getpid(), threading.get_ident())
+            with open(temporary_file_name, 'wb') as f:
+                np.save(f, rows)
+            os.replace(temporary_file_name, self._file_name(key))
+
+    def stats(self):
+        """
+        :rtype dict
+        """
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'size': len(self._entries)}
+
+    def __str__(self, *args, **kwargs):
+        return 'Solution cache: hits={hits}, disk hits={disk_hits}, misses={misses}, size={size}'.format(
+            **self.stats())
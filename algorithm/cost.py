@@ -0,0 +1,139 @@
+"""
+Оракулы стоимостей для задачи о назначениях.
+
+Оракул описывает матрицу стоимостей размера (rows, cols), не обязательно
+храня её целиком: атрибут shape и метод column(col), возвращающий
+стоимости всех строк для заданного столбца.
+"""
+
+import numpy as np
+
+# стоимость назначения таска на строку процессора, на котором его выполнять
+# нельзя: больше стоимости любого допустимого назначения, но с запасом до
+# переполнения при вычислениях с потенциалами
+INELIGIBLE_COST = np.iinfo(np.int64).max // 64
+
+
+class MatrixCostOracle:
+    """
+    Оракул поверх явно заданной матрицы стоимостей
+    """
+    def __init__(self, cost_matrix):
+        self._matrix = np.asarray(cost_matrix, np.int64)
+        self.shape = self._matrix.shape
+
+    def column(self, col):
+        """
+        :param int col:
+        :rtype np.ndarray
+        """
+        return self._matrix[:, col]
+
+    def cost(self, row, col):
+        """
+        :param int row:
+        :param int col:
+        :rtype int
+        """
+        return int(self._matrix[row, col])
+
+
+class PositionCostOracle:
+    """
+    Неявная матрица C для задачи R||sum(Cj). Строка row соответствует паре
+    (позиция с конца, процессор) = divmod(row, processor_count), стоимость
+    назначения таска на неё = (позиция с конца + 1) * task_costs[процессор, таск].
+    Хранится только task_costs и вектор множителей, т.е. O(m*n) памяти
+    вместо O(m*n^2) для явной матрицы.
+
+    Если задана матрица допустимости eligibility, назначение таска на строки
+    процессоров, где его выполнять нельзя, стоит INELIGIBLE_COST.
+
+    Если заданы ограничения позиций position_limits (см. algorithm.positions),
+    оракул описывает подматрицу C из строк с позицией с конца меньше
+    ограничения процессора. Строки оракула тогда нумеруются подряд, номер
+    строки матрицы C для строки оракула index - rows[index]
+    """
+    def __init__(self, task_costs, eligibility=None, position_limits=None):
+        """
+        :param np.ndarray task_costs:
+        :param np.ndarray|None eligibility: булева матрица m x n, None - все пары допустимы
+        :param np.ndarray|None position_limits: наибольшее число тасков каждого процессора, None - n
+        """
+        self.task_costs = np.asarray(task_costs, np.int64)
+        self.eligibility = None if eligibility is None else np.asarray(eligibility, bool)
+        self.processor_count, self.task_count = self.task_costs.shape
+        self.position_limits = np.full(self.processor_count, self.task_count, np.int64) if position_limits is None \
+            else np.minimum(position_limits, self.task_count)
+        self.rows = np.arange(self.processor_count * self.task_count)
+        if position_limits is not None:
+            self.rows = self.rows[self.rows // self.processor_count < self.position_limits[
+                self.rows % self.processor_count]]
+        self._positions, self._processors = np.divmod(self.rows, self.processor_count)
+        self.shape = (len(self.rows), self.task_count)
+        self._multipliers = self._positions + 1
+
+    def row_position(self, row):
+        """
+        Дешифрует строку оракула
+
+        :param int row:
+        :rtype (int, int)
+        :return: position from end, processor
+        """
+        return int(self._positions[row]), int(self._processors[row])
+
+    def column(self, col):
+        """
+        Стоимости назначения таска col на каждую строку оракула
+
+        :param int col:
+        :rtype np.ndarray
+        """
+        result = self._multipliers * self.task_costs[self._processors, col]
+        if self.eligibility is not None:
+            result[~self.eligibility[self._processors, col]] = INELIGIBLE_COST
+        return result
+
+    def cost(self, row, col):
+        """
+        :param int row:
+        :param int col:
+        :rtype int
+        """
+        position_from_end, processor = self.row_position(row)
+        if self.eligibility is not None and not self.eligibility[processor, col]:
+            return int(INELIGIBLE_COST)
+        return (position_from_end + 1) * int(self.task_costs[processor, col])
+
+    def to_matrix(self):
+        """
+        Материализует матрицу оракула целиком
+
+        :rtype np.ndarray
+        """
+        result = self._multipliers.reshape(-1, 1) * self.task_costs[self._processors]
+        if self.eligibility is not None:
+            result[~self.eligibility[self._processors]] = INELIGIBLE_COST
+        return result
+
+    def eligible_arcs(self):
+        """
+        Допустимые пары (строка оракула, таск) в порядке строк, для каждой
+        строки - в порядке тасков. Без матрицы допустимости и ограничений
+        позиций это все m*n^2 пар, иначе для каждого процессора
+        (ограничение позиций) * (количество допустимых тасков)
+
+        :rtype (np.ndarray, np.ndarray, np.ndarray)
+        :return: строки, таски, стоимости
+        """
+        if self.eligibility is None:
+            processors, tasks = np.divmod(np.arange(self.processor_count * self.task_count), self.task_count)
+        else:
+            processors, tasks = np.nonzero(self.eligibility)
+        positions, pairs = np.nonzero(np.arange(self.task_count).reshape(-1, 1) < self.position_limits[processors])
+        row_indices = np.zeros(self.processor_count * self.task_count, np.int64)
+        row_indices[self.rows] = np.arange(len(self.rows))
+        rows = row_indices[positions * self.processor_count + processors[pairs]]
+        costs = (positions + 1) * self.task_costs[processors[pairs], tasks[pairs]]
+        return rows, tasks[pairs], costs
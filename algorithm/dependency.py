@@ -3,7 +3,7 @@
 """
 
 import networkx as nx
-from itertools import groupby
+import numpy as np
 from classes.exception import BaseException as BException
 import random
 
@@ -12,26 +12,267 @@ class NotDirectedAcyclicGraph(BException):
     pass
 
 
+NODE_DTYPE = np.int32
+
+
+class DependencyGraph:
+    """
+    Граф зависимостей в формате CSR: вершины - целые числа 0..node_count-1,
+    последователи вершины v - targets[offsets[v]:offsets[v + 1]]. Занимает
+    4 байта на ребро и 4 байта на вершину.
+
+    Методы nodes, successors и predecessors повторяют интерфейс
+    networkx.DiGraph в той мере, в какой он используется алгоритмами
+    составления расписаний
+    """
+    def __init__(self, offsets, targets):
+        """
+        :param np.ndarray offsets: массив длины node_count + 1
+        :param np.ndarray targets: массив длины edge_count
+        """
+        self.offsets = np.asarray(offsets, NODE_DTYPE)
+        self.targets = np.asarray(targets, NODE_DTYPE)
+        self._reverse = None
+
+    @staticmethod
+    def from_edges(node_count, sources, targets):
+        """
+        :param int node_count:
+        :param np.ndarray|list sources:
+        :param np.ndarray|list targets:
+        :rtype DependencyGraph
+        """
+        sources = np.asarray(sources, np.int64)
+        targets = np.asarray(targets, np.int64)
+        order = np.argsort(sources, kind='mergesort')
+        offsets = np.zeros(node_count + 1, np.int64)
+        np.cumsum(np.bincount(sources, minlength=node_count), out=offsets[1:])
+        return DependencyGraph(offsets, targets[order])
+
+    @staticmethod
+    def from_networkx(graph):
+        """
+        :param nx.DiGraph graph: вершины - целые числа 0..node_count-1
+        :rtype DependencyGraph
+        """
+        node_count = max(graph.nodes()) + 1 if graph.number_of_nodes() else 0
+        edges = graph.edges()
+        return DependencyGraph.from_edges(node_count, [u for u, _ in edges], [v for _, v in edges])
+
+    def to_networkx(self):
+        """
+        :rtype nx.DiGraph
+        """
+        result = nx.DiGraph()
+        result.add_nodes_from(range(0, self.node_count()))
+        result.add_edges_from(zip(self.sources().tolist(), self.targets.tolist()))
+        return result
+
+    def node_count(self):
+        return len(self.offsets) - 1
+
+    def edge_count(self):
+        return len(self.targets)
+
+    def sources(self):
+        """
+        Начальная вершина каждого ребра
+
+        :rtype np.ndarray
+        """
+        return np.repeat(np.arange(0, self.node_count(), dtype=NODE_DTYPE), np.diff(self.offsets))
+
+    def nodes(self):
+        """
+        :rtype list
+        """
+        return list(range(0, self.node_count()))
+
+    def add_nodes(self, node_count):
+        """
+        Добавляет изолированные вершины так, чтобы их стало node_count
+
+        :param int node_count:
+        """
+        if node_count > self.node_count():
+            padding = np.full(node_count - self.node_count(), self.offsets[-1], NODE_DTYPE)
+            self.offsets = np.concatenate((self.offsets, padding))
+            self._reverse = None
+
+    def successors(self, node):
+        """
+        :param int node:
+        :rtype list
+        """
+        return self.targets[self.offsets[node]:self.offsets[node + 1]].tolist()
+
+    def reversed(self):
+        """
+        Граф с обращёнными рёбрами (строится один раз)
+
+        :rtype DependencyGraph
+        """
+        if self._reverse is None:
+            self._reverse = DependencyGraph.from_edges(self.node_count(), self.targets, self.sources())
+        return self._reverse
+
+    def predecessors(self, node):
+        """
+        :param int node:
+        :rtype list
+        """
+        return self.reversed().successors(node)
+
+    def in_degrees(self):
+        """
+        :rtype np.ndarray
+        """
+        return np.bincount(self.targets, minlength=self.node_count())
+
+    def levels(self):
+        """
+        Уровень каждой вершины (длина самого длинного пути в неё) алгоритмом
+        Кана: на каждом шаге обрабатывается сразу весь фронт вершин
+        с нулевой входящей степенью
+
+        :rtype np.ndarray
+        :raises NotDirectedAcyclicGraph If the graph has a cycle
+        """
+        node_count = self.node_count()
+        in_degrees = self.in_degrees()
+        result = np.full(node_count, -1, NODE_DTYPE)
+        frontier = np.nonzero(in_degrees == 0)[0]
+        level = 0
+        processed = 0
+        while len(frontier):
+            result[frontier] = level
+            processed += len(frontier)
+            starts, finishes = self.offsets[frontier], self.offsets[frontier + 1]
+            counts = finishes - starts
+            # индексы рёбер всех вершин фронта
+            edge_indices = np.repeat(finishes - np.cumsum(counts), counts) + np.arange(counts.sum())
+            candidates, counts = np.unique(self.targets[edge_indices], return_counts=True)
+            in_degrees[candidates] -= counts
+            frontier = candidates[in_degrees[candidates] == 0]
+            level += 1
+        if processed != node_count:
+            raise NotDirectedAcyclicGraph()
+        return result
+
+
+class DependencyIndex:
+    """
+    Индекс графа зависимостей, который строится один раз и затем
+    используется всеми алгоритмами: CSR последователей и предшественников,
+    уровень каждой вершины и вершины, упорядоченные по уровням
+    (level_nodes[level_offsets[l]:level_offsets[l + 1]] - вершины уровня l).
+
+    Внутри вершины нумеруются 0..node_count-1 в порядке graph.nodes(), наружу
+    методы возвращают исходные вершины графа. Внутри уровня вершины идут
+    в том же порядке
+    """
+    def __init__(self, graph):
+        """
+        :param nx.DiGraph|DependencyGraph graph:
+        :raises NotDirectedAcyclicGraph If dependency graph is not a directed acyclic graph
+        """
+        if isinstance(graph, DependencyGraph):
+            self._labels = None
+            self._ids = None
+            self.successor_graph = graph
+        else:
+            self._labels = graph.nodes()
+            self._ids = {label: node for node, label in enumerate(self._labels)}
+            edges = graph.edges()
+            self.successor_graph = DependencyGraph.from_edges(
+                    len(self._labels), [self._ids[u] for u, _ in edges], [self._ids[v] for _, v in edges])
+        self.predecessor_graph = self.successor_graph.reversed()
+        self.levels = self.successor_graph.levels()
+        self.level_nodes = np.argsort(self.levels, kind='mergesort').astype(NODE_DTYPE)
+        self.level_offsets = np.zeros(self.level_count() + 1, np.int64)
+        if len(self.levels):
+            np.cumsum(np.bincount(self.levels), out=self.level_offsets[1:])
+
+    def _to_labels(self, nodes):
+        """
+        :param list nodes: внутренние номера вершин
+        :rtype list
+        """
+        if self._labels is None:
+            return nodes
+        return [self._labels[node] for node in nodes]
+
+    def _to_id(self, label):
+        return label if self._ids is None else self._ids[label]
+
+    def node_count(self):
+        return len(self.levels)
+
+    def level_count(self):
+        return int(self.levels.max()) + 1 if len(self.levels) else 0
+
+    def nodes(self):
+        """
+        :rtype list
+        """
+        return self._to_labels(list(range(0, self.node_count())))
+
+    def successors(self, node):
+        """
+        :rtype list
+        """
+        return self._to_labels(self.successor_graph.successors(self._to_id(node)))
+
+    def predecessors(self, node):
+        """
+        :rtype list
+        """
+        return self._to_labels(self.predecessor_graph.successors(self._to_id(node)))
+
+    def node_levels(self):
+        """
+        :rtype dict
+        :returns {<node>: <level>, ...}
+        """
+        return dict(zip(self.nodes(), self.levels.tolist()))
+
+    def level(self, level):
+        """
+        Вершины уровня
+
+        :param int level:
+        :rtype list
+        """
+        return self._to_labels(self.level_nodes[self.level_offsets[level]:self.level_offsets[level + 1]].tolist())
+
+    def iterate_levels(self):
+        """
+        :return: iterator по парам (номер уровня, список вершин)
+        """
+        return ((level, self.level(level)) for level in range(0, self.level_count()))
+
+
+def dependency_index(graph):
+    """
+    Возвращает индекс графа зависимостей, строя его, если передан граф
+
+    :param nx.DiGraph|DependencyGraph|DependencyIndex graph:
+    :rtype DependencyIndex
+    :raises NotDirectedAcyclicGraph If dependency graph is not a directed acyclic graph
+    """
+    return graph if isinstance(graph, DependencyIndex) else DependencyIndex(graph)
+
+
 def get_node_levels(graph):
     """
     Returns the level of each node in graph
 
-    :param nx.DiGraph graph:
+    :param nx.DiGraph|DependencyGraph|DependencyIndex graph:
     :rtype dict
     :returns {<node>: <level>, ...}
     :raises NotDirectedAcyclicGraph If dependency graph is not a directed acyclic graph
     """
-    levels = {k: 0 for k in graph.nodes_iter()}
-    try:
-        topological_sort_result = nx.topological_sort(graph)
-    except nx.NetworkXUnfeasible:
-        raise NotDirectedAcyclicGraph()
-    for node in topological_sort_result:
-        for successor in graph.successors_iter(node):
-            successor_level_candidate = levels[node] + 1
-            if levels[successor] < successor_level_candidate:
-                levels[successor] = successor_level_candidate
-    return levels
+    return dependency_index(graph).node_levels()
 
 
 def iterate_levels(graph):
@@ -40,13 +281,8 @@ def iterate_levels(graph):
 
     Возвращает итератор, который на каждой итерации по нему выдаёт пару (номер уровня, список вершин)
 
-    :param nx.DiGraph graph:
+    :param nx.DiGraph|DependencyGraph|DependencyIndex graph:
     :return: iterator
     :raises NotDirectedAcyclicGraph If dependency graph is not a directed acyclic graph
     """
-    def _level(node_level_tuple):
-        return node_level_tuple[1]
-    node_levels = get_node_levels(graph)
-    sorted_nodes = sorted(node_levels.items(), key=_level)
-    for level, node_iter in groupby(sorted_nodes, key=_level):
-        yield (level, list(map(lambda x: x[0], node_iter)))
+    return dependency_index(graph).iterate_levels()
@@ -2,9 +2,11 @@
 Составление расписаний для зависимых задач
 """
 
+import instrumentation
 import algorithm.schedule as at
 import algorithm.dependency as ad
-from classes.schedule import Schedule, Task
+import input_output.export as export
+from classes.schedule import Schedule
 from algorithm.dependency import NotDirectedAcyclicGraph
 from classes.exception import BaseException as BException
 
@@ -19,12 +21,18 @@ def validate_dependency_graph(dependency_graph, task_costs):
     в матрице task_costs. Также добавляет в граф зависимостей задачи,
     которых там не хватает
 
-    :param networkx.DiGraph dependency_graph:
+    :param networkx.DiGraph|algorithm.dependency.DependencyGraph dependency_graph:
     :param numpy.matrix task_costs:
     :rtype None|str
     :return: None if no errors or error message if there is some
     """
     _, task_count = task_costs.shape
+    if isinstance(dependency_graph, ad.DependencyGraph):
+        if dependency_graph.node_count() > task_count:
+            return "Redundant tasks in dependency graph: {}".format(
+                    str(set(range(task_count, dependency_graph.node_count()))))
+        dependency_graph.add_nodes(task_count)
+        return None
     tasks = set(range(0, task_count))
     dependency_graph_tasks = set(dependency_graph.nodes())
     redundant_tasks = dependency_graph_tasks.difference(tasks)
@@ -34,32 +42,148 @@ def validate_dependency_graph(dependency_graph, task_costs):
     return None
 
 
-def get_optimal_schedule(task_costs, dependency_graph, export_intermediate_results = False):
+def _solve_level(task_costs, tasks, export_path, export_file_name_prefix, solver, deadline, eligibility,
+                 collect_events):
     """
-    Возвращает расписание для зависимых задач
+    Решение подзадачи одного уровня в процессе-исполнителе. Экспорт
+    завершается до возврата: процессы-исполнители не вызывают atexit
+
+    :param str|None export_path: каталог для промежуточных результатов либо None
+    :param bool collect_events: собирать ли события instrumentation для основного процесса
+    :rtype tuple
+    :return: ({таск: строка матрицы C, ...}, список событий instrumentation)
+    """
+    export.path = export_path
+    with instrumentation.collecting() as sink:
+        if not collect_events:
+            instrumentation.remove_sink(sink)
+        task_rows = at.get_optimal_assignment(task_costs, export_path is not None, export_file_name_prefix, solver,
+                                              deadline=deadline, export_tasks=tasks, eligibility=eligibility)
+    export.flush()
+    return task_rows, sink.events
+
+
+def _iterate_level_schedules_in_parallel(task_costs, levels, export_intermediate_results, export_file_name_prefix,
+                                         solver, cache, processes, deadline=None, eligibility=None):
+    """
+    Решает подзадачи всех уровней параллельно в пуле процессов и выдаёт их
+    расписания в порядке уровней
 
     :param numpy.matrix task_costs:
-    :param networkx.DiGraph dependency_graph:
+    :param list levels: [(уровень, список тасков), ...]
     :param bool export_intermediate_results:
+    :param str export_file_name_prefix:
+    :param str solver:
+    :param algorithm.cache.SolutionCache|None cache:
+    :param int processes: количество процессов
+    :param util.Deadline|None deadline:
+    :param np.ndarray|None eligibility:
+    :return: iterator
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = []
+        for level, tasks in levels:
+            stage_costs = task_costs[:, tasks]
+            stage_eligibility = None if eligibility is None else eligibility[:, tasks]
+            task_rows = cache.get(stage_costs) if cache is not None and eligibility is None else None
+            if task_rows is None:
+                task_rows = executor.submit(_solve_level, stage_costs, tasks,
+                                            export.path if export_intermediate_results else None,
+                                            '{}level{}_'.format(export_file_name_prefix, level), solver, deadline,
+                                            stage_eligibility, instrumentation.is_enabled())
+            pending.append((level, stage_costs, stage_eligibility, tasks, task_rows))
+
+        for level, stage_costs, stage_eligibility, tasks, task_rows in pending:
+            with instrumentation.span('dependent_schedule.level', level=level):
+                if not isinstance(task_rows, dict):
+                    task_rows, events = task_rows.result()
+                    instrumentation.replay(events)
+                    if cache is not None and stage_eligibility is None and len(task_rows) == len(tasks):
+                        cache.put(stage_costs, task_rows)
+                stage_schedule = at.assignment_to_schedule(stage_costs, task_rows,
+                                                           at.check_eligibility(stage_costs, stage_eligibility))
+            yield tasks, stage_schedule
+
+
+def _iterate_level_schedules(task_costs, levels, export_intermediate_results, export_file_name_prefix, solver, cache,
+                             deadline=None, eligibility=None):
+    """
+    Решает подзадачи уровней по очереди и выдаёт их расписания
+
+    :param numpy.matrix task_costs:
+    :param list levels: [(уровень, список тасков), ...]
+    :param bool export_intermediate_results:
+    :param str export_file_name_prefix:
+    :param str solver:
+    :param algorithm.cache.SolutionCache|None cache:
+    :param util.Deadline|None deadline:
+    :param np.ndarray|None eligibility:
+    :return: iterator
+    """
+    for level, tasks in levels:
+        with instrumentation.span('dependent_schedule.level', level=level):
+            # составление подматрицы для уровня тасок
+            stage_schedule = at.get_optimal_schedule(task_costs[:, tasks],
+                                                     export_intermediate_results=export_intermediate_results,
+                                                     export_file_name_prefix='{}level{}_'.format(
+                                                             export_file_name_prefix, level),
+                                                     solver=solver, cache=cache, deadline=deadline,
+                                                     export_tasks=tasks,
+                                                     eligibility=None if eligibility is None else eligibility[:, tasks])
+        yield tasks, stage_schedule
+
+
+def get_optimal_schedule(task_costs, dependency_graph, export_intermediate_results=False, export_file_name_prefix='',
+                         solver=at.DEFAULT_SOLVER, cache=None, processes=1, deadline=None, progress=None,
+                         eligibility=None):
+    """
+    Возвращает расписание для зависимых задач
+
+    Подзадачи уровней не зависят друг от друга (уровни связывает только
+    Schedule.concat), поэтому при processes > 1 они решаются параллельно.
+    Уровни, которые не успели решить до deadline, составляются жадно,
+    результат тогда помечается is_optimal = False.
+
+    :param numpy.matrix task_costs:
+    :param networkx.DiGraph|DependencyGraph|DependencyIndex dependency_graph: граф зависимостей
+        либо заранее построенный по нему индекс (см. algorithm.dependency)
+    :param bool export_intermediate_results: экспортировать ли подзадачи уровней и их решения
+    :param str export_file_name_prefix: префикс имён экспортируемых файлов
+    :param str solver: алгоритм решения подзадач уровней, один из algorithm.schedule.SOLVERS
+    :param algorithm.cache.SolutionCache|None cache: кэш решений подзадач уровней
+    :param int processes: количество процессов для решения подзадач уровней
+    :param util.Deadline|None deadline: ограничение времени решения
+    :param callable|None progress: вызывается после каждого уровня как progress(готово уровней, всего уровней)
+    :param np.ndarray|None eligibility: булева матрица m x n допустимых пар процессор-таск
     :return:
     :raises NoOptimalSchedule If failed to calculate optimal schedule
+    :raises algorithm.schedule.NoEligibleProcessor If some task can't be executed on any processor
     """
     processor_count, _ = task_costs.shape
     result = Schedule(list(range(0, processor_count)))
+    eligibility = at.check_eligibility(task_costs, eligibility)
     try:
-        # обходим граф зависимости по уровням
-        for (level, tasks) in ad.iterate_levels(dependency_graph):
-            # составление подматрицы для уровня тасок
-            stage_schedule = at.get_optimal_schedule(task_costs[:, tasks],
-                                                     export_intermediate_results=True,
-                                                     export_file_name_prefix='level{}_'.format(level))
-            # переименование тасков правильно
-            for proc, items in stage_schedule:
-                for item in items:
-                    if isinstance(item, Task):
-                        item.name = tasks[item.name]
-            result.concat(stage_schedule)
+        levels = list(ad.dependency_index(dependency_graph).iterate_levels())
     except NotDirectedAcyclicGraph:
         raise NoOptimalSchedule('Dependency graph is not a directed acyclic graph')
 
+    if processes > 1 and len(levels) > 1:
+        level_schedules = _iterate_level_schedules_in_parallel(
+                task_costs, levels, export_intermediate_results, export_file_name_prefix, solver, cache, processes,
+                deadline, eligibility)
+    else:
+        level_schedules = _iterate_level_schedules(task_costs, levels, export_intermediate_results,
+                                                   export_file_name_prefix, solver, cache, deadline, eligibility)
+
+    # обходим граф зависимости по уровням
+    for completed_levels, (tasks, stage_schedule) in enumerate(level_schedules, 1):
+        with instrumentation.span('dependent_schedule.concat'):
+            # переименование тасков правильно
+            stage_schedule.rename_tasks(tasks)
+            result.concat(stage_schedule)
+        if progress is not None:
+            progress(completed_levels, len(levels))
+
     return result
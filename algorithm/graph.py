@@ -2,133 +2,267 @@
 Общие алгоритмы работы с графами
 """
 
-import networkx as nx
-from networkx.algorithms.flow.utils import build_residual_network
-from networkx.algorithms.shortest_paths.weighted import _dijkstra
+from collections import deque
+from heapq import heappush, heappop
 
+import numpy as np
 
-def successive_shortest_path(network, source, sink):
+import instrumentation
+from classes.exception import BaseException as BException
+from util import is_expired
+
+
+INFINITY = float('inf')
+
+
+class NegativeCycle(BException):
+    pass
+
+
+class FlowNetwork:
     """
-    Successive Shortest Path max flow min cost algo
+    Транспортная сеть с целочисленными вершинами 0..node_count-1.
+
+    Рёбра накапливаются в массивах, перед решением сеть упаковывается в
+    остаточную сеть формата CSR: для каждого ребра e дуга 2e - прямая,
+    2e+1 - обратная, дуги упорядочены по начальной вершине. Во внутреннем
+    цикле алгоритма массивы используются в виде списков Python, т.к.
+    поэлементный доступ к ним заметно быстрее, чем к np.ndarray
+    """
+    def __init__(self, node_count):
+        self.node_count = node_count
+        self._tails = []
+        self._heads = []
+        self._capacities = []
+        self._costs = []
+        self._flow = None
+
+    def add_edge(self, u, v, capacity, cost):
+        """
+        Добавляет ребро u -> v
+
+        :param int u:
+        :param int v:
+        :param int capacity:
+        :param int cost:
+        :rtype int
+        :return: номер ребра
+        """
+        self.add_edges([u], [v], [capacity], [cost])
+        return self.edge_count() - 1
+
+    def add_edges(self, tails, heads, capacities, costs):
+        """
+        Добавляет пачку рёбер tails[i] -> heads[i]
+
+        :param np.ndarray|list tails:
+        :param np.ndarray|list heads:
+        :param np.ndarray|list capacities:
+        :param np.ndarray|list costs:
+        """
+        self._tails.append(np.asarray(tails, np.int64).ravel())
+        self._heads.append(np.asarray(heads, np.int64).ravel())
+        self._capacities.append(np.asarray(capacities, np.int64).ravel())
+        self._costs.append(np.asarray(costs, np.int64).ravel())
+        self._flow = None
+
+    def edge_count(self):
+        """
+        :rtype int
+        """
+        return sum(len(tails) for tails in self._tails)
+
+    def _edge_arrays(self):
+        """
+        :rtype (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+        :return: tails, heads, capacities, costs
+        """
+        if not self._tails:
+            empty = np.empty(0, np.int64)
+            return empty, empty, empty, empty
+        return tuple(np.concatenate(arrays) for arrays in (self._tails, self._heads, self._capacities, self._costs))
+
+    def _build_residual_network(self):
+        """
+        Строит остаточную сеть в формате CSR
+
+        :rtype (list, list, list, list, list, np.ndarray)
+        :return: offsets, heads, capacities, costs, reverse arcs, edge -> forward arc
+        """
+        tails, heads, capacities, costs = self._edge_arrays()
+        edge_count = len(tails)
+        arc_tails = np.empty(2 * edge_count, np.int64)
+        arc_tails[0::2], arc_tails[1::2] = tails, heads
+        arc_heads = np.empty(2 * edge_count, np.int64)
+        arc_heads[0::2], arc_heads[1::2] = heads, tails
+        arc_capacities = np.zeros(2 * edge_count, np.int64)
+        arc_capacities[0::2] = capacities
+        arc_costs = np.empty(2 * edge_count, np.int64)
+        arc_costs[0::2], arc_costs[1::2] = costs, -costs
+
+        order = np.argsort(arc_tails, kind='mergesort')
+        arc_position = np.empty_like(order)
+        arc_position[order] = np.arange(len(order))
+        # парная дуга для дуги a - это a ^ 1 в исходной нумерации
+        reverse = arc_position[order ^ 1]
+        offsets = np.zeros(self.node_count + 1, np.int64)
+        np.cumsum(np.bincount(arc_tails, minlength=self.node_count), out=offsets[1:])
+        return (offsets.tolist(), arc_heads[order].tolist(), arc_capacities[order].tolist(),
+                arc_costs[order].tolist(), reverse.tolist(), arc_position[0::2])
+
+    def _initial_potentials(self, source, offsets, heads, capacities, costs):
+        """
+        Начальные потенциалы вершин. Если в сети нет рёбер отрицательной
+        стоимости, достаточно нулевых, иначе это кратчайшие расстояния от
+        источника (алгоритм Беллмана-Форда с очередью)
+
+        :rtype list
+        """
+        potentials = [0] * self.node_count
+        if not any(cost < 0 and capacity > 0 for cost, capacity in zip(costs, capacities)):
+            return potentials
+        distances = [INFINITY] * self.node_count
+        distances[source] = 0
+        in_queue = [False] * self.node_count
+        queue = deque([source])
+        in_queue[source] = True
+        relaxations = 0
+        max_relaxations = self.node_count * max(len(heads), 1)
+        while queue:
+            u = queue.popleft()
+            in_queue[u] = False
+            for arc in range(offsets[u], offsets[u + 1]):
+                if capacities[arc] <= 0:
+                    continue
+                v = heads[arc]
+                new_distance = distances[u] + costs[arc]
+                if new_distance < distances[v]:
+                    distances[v] = new_distance
+                    relaxations += 1
+                    if relaxations > max_relaxations:
+                        raise NegativeCycle()
+                    if not in_queue[v]:
+                        queue.append(v)
+                        in_queue[v] = True
+        for node, distance in enumerate(distances):
+            if distance != INFINITY:
+                potentials[node] = distance
+        return potentials
+
+    def min_cost_flow(self, source, sink, max_flow=None, deadline=None):
+        """
+        Successive Shortest Path max flow min cost algo
+
+        https://www.topcoder.com/community/data-science/data-science-tutorials/minimum-cost-flow-part-two-algorithms/
+
+        Кратчайшие пути ищутся алгоритмом Дейкстры с двоичной кучей по
+        приведённым стоимостям, после каждого увеличения потенциалы вершин
+        пересчитываются (потенциалы Джонсона). Поток увеличивается на
+        пропускную способность узкого места пути. Если задан deadline и время
+        истекло, алгоритм останавливается между увеличениями потока: найденный
+        поток имеет минимальную стоимость среди потоков такой же величины.
+
+        :param int source:
+        :param int sink:
+        :param int|None max_flow: ограничение на величину потока
+        :param util.Deadline|None deadline:
+        :rtype (int, int)
+        :return: величина потока, его стоимость
+        """
+        offsets, heads, capacities, costs, reverse, edge_arcs = self._build_residual_network()
+        original_capacities = capacities[:]
+        potentials = self._initial_potentials(source, offsets, heads, capacities, costs)
+        node_count = self.node_count
+        flow_value = 0
+        flow_cost = 0
+        augmentations = 0
 
-    https://www.topcoder.com/community/data-science/data-science-tutorials/minimum-cost-flow-part-two-algorithms/
+        while (max_flow is None or flow_value < max_flow) and not is_expired(deadline):
+            distances = [INFINITY] * node_count
+            parent_arcs = [-1] * node_count
+            distances[source] = 0
+            heap = [(0, source)]
+            while heap:
+                distance, u = heappop(heap)
+                if distance > distances[u]:
+                    continue
+                if u == sink:
+                    break
+                base = distance + potentials[u]
+                for arc in range(offsets[u], offsets[u + 1]):
+                    if capacities[arc] > 0:
+                        v = heads[arc]
+                        new_distance = base + costs[arc] - potentials[v]
+                        if new_distance < distances[v]:
+                            distances[v] = new_distance
+                            parent_arcs[v] = arc
+                            heappush(heap, (new_distance, v))
+            sink_distance = distances[sink]
+            if sink_distance == INFINITY:
+                break
+
+            # потенциалы Джонсона: вершины дальше стока получают расстояние до стока
+            for node in range(0, node_count):
+                potentials[node] += min(distances[node], sink_distance)
+
+            bottleneck = INFINITY if max_flow is None else max_flow - flow_value
+            node = sink
+            while node != source:
+                arc = parent_arcs[node]
+                bottleneck = min(bottleneck, capacities[arc])
+                node = heads[reverse[arc]]
+            node = sink
+            while node != source:
+                arc = parent_arcs[node]
+                capacities[arc] -= bottleneck
+                capacities[reverse[arc]] += bottleneck
+                flow_cost += bottleneck * costs[arc]
+                node = heads[reverse[arc]]
+            flow_value += bottleneck
+            augmentations += 1
+
+        instrumentation.count('flow.augmentations', augmentations)
+        self._flow = np.asarray(original_capacities)[edge_arcs] - np.asarray(capacities)[edge_arcs] \
+            if len(edge_arcs) else np.empty(0, np.int64)
+        return flow_value, flow_cost
+
+    def flow(self):
+        """
+        Поток по каждому ребру в порядке добавления рёбер
+
+        :rtype np.ndarray
+        """
+        return self._flow
+
+
+def successive_shortest_path(network, source, sink):
+    """
+    Находит максимальный поток минимальной стоимости в сети networkx.
+    Рёбра должны иметь атрибуты capacity и cost
 
     :param networkx.DiGraph network:
-    :param str source:
-    :param str sink:
-    :rtype dict|None
-    :return:
+    :param source:
+    :param sink:
+    :rtype dict
+    :return: поток в формате networkx: {u: {v: flow, ...}, ...}
     """
+    nodes = network.nodes()
+    node_ids = {node: node_id for node_id, node in enumerate(nodes)}
+    edges = network.edges(data=True)
+    flow_network = FlowNetwork(len(nodes))
+    if edges:
+        flow_network.add_edges([node_ids[u] for u, _, _ in edges], [node_ids[v] for _, v, _ in edges],
+                               [data['capacity'] for _, _, data in edges],
+                               [data.get('cost', 0) for _, _, data in edges])
+    flow_network.min_cost_flow(node_ids[source], node_ids[sink])
 
-    def _cost_optimal_augmenting_path(graph, source, target):
-        """
-        Возвращает оптимальный увеличивающий путь, используя
-        алгоритм Дейкстры
-        :param graph:
-        :param source:
-        :param target:
-        :return:
-        """
-        paths = {source: [source]}
-        (length, path) = _dijkstra(graph, source, target=target, paths=paths, get_weight=lambda u, v, edata:
-             None if edata.get('capacity') <= 0 else edata.get('cost'))
-        if target not in path:
-            raise nx.NetworkXNoPath
-        return path[target]
-
-    def _augment_flow(graph, path, flow_diff):
-        """
-        Увеличивает поток по заданному увеличивающему пути на значение flow_diff
-        :param graph:
-        :param path:
-        :param flow_diff:
-        :return:
-        """
-        for u, v in zip(path[:-1], path[1:]):
-            graph[u][v]['capacity'] = graph[u][v]['capacity'] - flow_diff
-            graph[v][u]['capacity'] = graph[v][u]['capacity'] + flow_diff
-
-    def _build_residual_network(network):
-        """
-        Строит остаточную сеть для заданной сети
-        :param network:
-        :return:
-        """
-        result = build_residual_network(network, 'capacity')
-        # add costs for residual edges using their original counterparts
-        for u, v, cost in network.edges_iter(data='cost'):
-            result[u][v]['cost'] = cost
-            result[v][u]['cost'] = -cost
-        return result
-
-    def _reduce_cost(residual_network, network, potentials):
-        """
-        Модифицирует стоимости ребёр, чтобы в остаточной сети не было ребер с
-        отрицательной стоимостью
-        :param residual_network:
-        :param network:
-        :param potentials:
-        :return:
-        """
-        for u, v, cost in network.edges_iter(data='cost'):
-            residual_network[u][v]['cost'] = cost + potentials[u] - potentials[v]
-            residual_network[v][u]['cost'] = 0
-
-    def _remove_2cycles_in_residual_network(graph):
-        """
-        Удаление 2-циклов с заменой их на одно рёбро, capacity которого
-        равно разнице capacity составляющих 2-цикла, а направлено ребро в сторону,
-        в которую была направлена большая из его составляющих
-        :param graph:
-        :return:
-        """
-        for u in residual_network.nodes_iter():
-            for v in residual_network.successors(u):
-                if not residual_network.has_edge(v, u):
-                    continue
-                merged_cost = residual_network[v][u]['capacity'] - residual_network[u][v]['capacity']
-                if merged_cost > 0:
-                    residual_network[u][v]['capacity'] = merged_cost
-                    del residual_network[v][u]
-                elif merged_cost < 0:
-                    residual_network[v][u]['capacity'] = -merged_cost
-                    del residual_network[u][v]
-                else:
-                    del residual_network[u][v], residual_network[v][u]
-
-    def _residual_network_to_flow_dict(residual_network):
-        """
-        Собирает по остаточной сети данные, необходимые для расшифровки
-        в результирующее расписание
-        :param residual_network:
-        :return:
-        """
-        result = {}
-        for u, v, capacity in residual_network.edges_iter(data='capacity'):
-            if capacity == 0:
-                continue
-            if u not in result:
-                result[u] = {}
-            result[u][v] = capacity
-        return result
-
-    residual_network = _build_residual_network(network)
-    node_potentials = nx.bellman_ford(network, source, weight='cost')[1]
-    _reduce_cost(residual_network, network, node_potentials)
-
-    while True:
-        # TODO: maybe we must recalculate node_potentials on every iteration
-        try:
-            augmenting_path = _cost_optimal_augmenting_path(residual_network, source, sink)
-        except nx.NetworkXNoPath:
-            break
-        _reduce_cost(residual_network, network, node_potentials)
-        _augment_flow(residual_network, augmenting_path, 1)
-
-    _remove_2cycles_in_residual_network(residual_network)
-    return _residual_network_to_flow_dict(residual_network)
+    result = {node: {} for node in nodes}
+    for (u, v, _), flow in zip(edges, flow_network.flow().tolist()):
+        result[u][v] = flow
+    return result
 
 if __name__ == '__main__':
+    import networkx as nx
     g = nx.DiGraph()
     g.add_edges_from([
         ('s', 1, {'capacity': 5, 'cost': 0}),
@@ -142,3 +276,4 @@ if __name__ == '__main__':
         (5, 't', {'capacity': 2, 'cost': 0}),
     ])
     print(successive_shortest_path(g, 's', 't'))
+    print(nx.max_flow_min_cost(g, 's', 't', weight='cost'))
@@ -0,0 +1,308 @@
+"""
+Инкрементальное пересчитывание оптимального расписания для независимых задач.
+
+Решатель хранит оптимальное назначение тасков на строки матрицы C и
+двойственные потенциалы. При изменении исходных данных с назначения снимаются
+только затронутые таски, после чего оптимальность восстанавливается
+несколькими кратчайшими увеличивающими путями.
+
+Прямоугольная задача рассматривается как квадратная: свободные строки матрицы
+C заняты фиктивными тасками нулевой стоимости, которые представлены одной
+вершиной D. Строка, освободившаяся после снятия таска, остаётся "висячей", пока
+увеличивающий путь не займёт её реальным либо фиктивным таском.
+"""
+
+import numpy as np
+
+import instrumentation
+import algorithm.schedule as at
+from classes.exception import BaseException as BException
+
+
+INFINITY = np.iinfo(np.int64).max // 4
+DUMMY = -1  # предшественник строки в пути - вершина D
+
+
+class UnknownTask(BException):
+    pass
+
+
+class UnknownProcessor(BException):
+    pass
+
+
+class InvalidTaskCost(BException):
+    pass
+
+
+class IncrementalScheduleSolver:
+    """
+    Оптимальное расписание для независимых задач с поддержкой изменений.
+
+    Инварианты: для всех тасков i и строк r u[i] + v[r] <= C[r, i], на
+    назначенных парах выполняется равенство, v[r] <= 0 для всех строк и
+    v[r] = 0 для свободных (занятых фиктивными тасками) строк
+    """
+    def __init__(self, task_costs):
+        """
+        :param np.matrix task_costs:
+        """
+        self._task_costs = np.array(task_costs, np.int64)
+        self.processor_count, self.task_count = self._task_costs.shape
+        self._u = np.zeros(self.task_count, np.int64)
+        self._v = np.zeros(self._row_count(), np.int64)
+        self._row_task = np.full(self._row_count(), -1, np.int64)
+        self._unassigned = set(range(0, self.task_count))  # таски без назначения
+        self._pending = set()  # висячие строки
+        self.augmentations = 0  # количество увеличивающих путей, найденных с момента создания
+        self._repair()
+
+    def _row_count(self):
+        return self.processor_count * self.task_count
+
+    def _task_row_costs(self, task):
+        """
+        Стоимости назначения таска на каждую строку матрицы C
+
+        :param int task:
+        :rtype np.ndarray
+        """
+        return np.outer(np.arange(1, self.task_count + 1), self._task_costs[:, task]).ravel()
+
+    def _task_row(self, task):
+        """
+        Строка матрицы C, на которую назначен таск, либо -1
+
+        :param int task:
+        :rtype int
+        """
+        rows = np.nonzero(self._row_task == task)[0]
+        return int(rows[0]) if len(rows) else -1
+
+    def _release(self, task):
+        """
+        Снимает таск с назначения, его строка становится висячей
+
+        :param int task:
+        """
+        row = self._task_row(task)
+        if row >= 0:
+            self._row_task[row] = -1
+            self._pending.add(row)
+        self._unassigned.add(task)
+
+    def _repair(self):
+        """
+        Восстанавливает полное оптимальное назначение
+        """
+        for task in self._unassigned:
+            self._u[task] = np.min(self._task_row_costs(task) - self._v)
+        augmentations = 0
+        while self._unassigned or self._pending:
+            self._augment()
+            augmentations += 1
+        self.augmentations += augmentations
+        instrumentation.count('incremental.augmentations', augmentations)
+
+    def _augment(self):
+        """
+        Находит алгоритмом Дейкстры кратчайший по приведённым стоимостям
+        увеличивающий путь из таска без назначения (либо из D, если таких нет)
+        в висячую строку. Если тасков без назначения больше, чем висячих
+        строк, путь может закончиться и в свободной строке
+        """
+        row_count = self._row_count()
+        distances = np.full(row_count, INFINITY, np.int64)
+        way = np.zeros(row_count, np.int64)  # предшественник строки: таск или DUMMY
+        used = np.zeros(row_count, bool)
+        task_distances = np.full(self.task_count, INFINITY, np.int64)
+        entry_rows = {}  # строка, через которую пришли в таск или в D
+        dummy_distance = None
+        allow_free_end = len(self._unassigned) > len(self._pending)
+
+        def _visit(node, distance):
+            if node == DUMMY:
+                reduced = -self._v
+            else:
+                task_distances[node] = distance
+                reduced = self._task_row_costs(node) - self._u[node] - self._v
+            candidates = distance + reduced
+            improved = ~used & (candidates < distances)
+            distances[improved] = candidates[improved]
+            way[improved] = node
+
+        if self._unassigned:
+            start = self._unassigned.pop()
+            _visit(start, 0)
+        else:
+            start = DUMMY
+            dummy_distance = 0
+            _visit(DUMMY, 0)
+
+        while True:
+            row = int(np.argmin(np.where(used, INFINITY, distances)))
+            distance = int(distances[row])
+            used[row] = True
+            occupant = self._row_task[row]
+            if row in self._pending:
+                break
+            if occupant >= 0:
+                entry_rows[occupant] = row
+                _visit(occupant, distance)
+            elif allow_free_end:
+                break
+            elif dummy_distance is None:
+                dummy_distance = distance
+                entry_rows[DUMMY] = row
+                _visit(DUMMY, distance)
+
+        # потенциалы Джонсона
+        self._v += np.minimum(distances, distance)
+        self._u -= np.minimum(task_distances, distance)
+        dummy_shift = distance if dummy_distance is None else min(dummy_distance, distance)
+
+        # разворачиваем путь
+        self._pending.discard(row)
+        while True:
+            node = way[row]
+            self._row_task[row] = node if node != DUMMY else -1
+            if node == start:
+                break
+            row = entry_rows[node]
+
+        # нормировка: потенциал свободных строк снова равен нулю
+        self._v -= dummy_shift
+        self._u += dummy_shift
+
+    def _check_task(self, task):
+        """
+        :param int task:
+        :raises UnknownTask
+        """
+        if not 0 <= task < self.task_count:
+            raise UnknownTask('Unknown task: {}'.format(task))
+
+    def _check_processor(self, processor):
+        """
+        :param int processor:
+        :raises UnknownProcessor
+        """
+        if not 0 <= processor < self.processor_count:
+            raise UnknownProcessor('Unknown processor: {}'.format(processor))
+
+    @staticmethod
+    def _check_costs(costs):
+        """
+        :param np.ndarray costs:
+        :raises InvalidTaskCost
+        """
+        if np.any(costs < 0):
+            raise InvalidTaskCost('Task cost must not be negative: {}'.format(costs.tolist()))
+
+    def update_cost(self, processor, task, value):
+        """
+        Изменяет время выполнения таска на процессоре
+
+        :param int processor:
+        :param int task:
+        :param int value:
+        :raises UnknownTask
+        :raises UnknownProcessor
+        :raises InvalidTaskCost If value is negative
+        """
+        self._check_task(task)
+        self._check_processor(processor)
+        self._check_costs(np.asarray(value, np.int64))
+        self._task_costs[processor, task] = value
+        row = self._task_row(task)
+        processor_rows = np.arange(processor, self._row_count(), self.processor_count)
+        reduced = self._task_row_costs(task)[processor_rows] - self._u[task] - self._v[processor_rows]
+        if row % self.processor_count != processor and reduced.min() >= 0:
+            return  # условия оптимальности не нарушены
+        self._release(task)
+        self._repair()
+
+    def add_task(self, costs):
+        """
+        Добавляет таск с заданными временами выполнения на процессорах.
+        Новый таск получает номер task_count
+
+        :param list[int]|np.ndarray costs: время выполнения на каждом процессоре
+        :rtype int
+        :return: номер нового таска
+        :raises InvalidTaskCost If some cost is negative
+        """
+        costs = np.asarray(costs, np.int64).reshape(self.processor_count, 1)
+        self._check_costs(costs)
+        self._task_costs = np.hstack((self._task_costs, costs))
+        self.task_count += 1
+        new_task = self.task_count - 1
+        self._u = np.append(self._u, 0)
+        # у всех процессоров появляется новая, самая дорогая позиция с конца
+        self._v = np.append(self._v, np.zeros(self.processor_count, np.int64))
+        self._row_task = np.append(self._row_task, np.full(self.processor_count, -1, np.int64))
+
+        new_row_costs = self._task_costs[:, :new_task] * self.task_count
+        violated = np.nonzero(np.any(self._u[:new_task] > new_row_costs, axis=0))[0]
+        for task in violated.tolist():
+            self._release(task)
+        self._unassigned.add(new_task)
+        self._repair()
+        return new_task
+
+    def remove_task(self, task):
+        """
+        Удаляет таск. Таски с большими номерами сдвигаются на единицу,
+        как столбцы task_costs
+
+        :param int task:
+        :raises UnknownTask
+        """
+        self._check_task(task)
+        self._release(task)
+        self._unassigned.discard(task)
+
+        self._task_costs = np.delete(self._task_costs, task, axis=1)
+        self._u = np.delete(self._u, task)
+        self._row_task[self._row_task > task] -= 1
+        self._unassigned = set(t - 1 if t > task else t for t in self._unassigned)
+        self.task_count -= 1
+
+        # самые дорогие позиции с конца исчезают вместе с таском
+        row_count = self._row_count()
+        dropped_tasks = self._row_task[row_count:]
+        self._unassigned.update(dropped_tasks[dropped_tasks >= 0].tolist())
+        self._pending = set(row for row in self._pending if row < row_count)
+        self._v = self._v[:row_count]
+        self._row_task = self._row_task[:row_count]
+        self._repair()
+
+    def task_rows(self):
+        """
+        :rtype dict
+        :return: {таск: строка матрицы C, ...}
+        """
+        rows = np.nonzero(self._row_task >= 0)[0]
+        return dict(zip(self._row_task[rows].tolist(), rows.tolist()))
+
+    def total_flow_time(self):
+        """
+        Total flow time текущего оптимального расписания
+
+        :rtype int
+        """
+        return sum(int(self._task_row_costs(task)[row]) for task, row in self.task_rows().items())
+
+    def get_task_costs(self):
+        """
+        :rtype np.matrix
+        """
+        return np.asmatrix(self._task_costs)
+
+    def get_schedule(self):
+        """
+        Возвращает текущее оптимальное расписание
+
+        :rtype classes.schedule.Schedule
+        """
+        return at.assignment_to_schedule(self.get_task_costs(), self.task_rows())
@@ -0,0 +1,168 @@
+"""
+Асинхронный интерфейс к решателям для программ на asyncio.
+
+JobRunner выполняет решатели в пуле потоков и возвращает задания Job,
+которые можно ожидать (await job). Отмена задания (job.cancel() либо
+отмена ожидающей его задачи asyncio) выставляет util.CancellationToken,
+переданный решателю вместо deadline: венгерский алгоритм и ssp
+останавливаются после текущего дополняющего пути, перебор
+algorithm.optimized_dependent_schedule - на следующем узле, зависимые
+методы - после текущего уровня. Решатель flow (networkx) прервать нельзя,
+отмена подействует только после него, поэтому по умолчанию задания
+используют венгерский алгоритм, а для flow выдаётся предупреждение.
+
+Решатели в основном выполняют код Python и держат GIL, поэтому потоки дают
+одновременность, но не параллельность: для загрузки нескольких ядер
+подходит service.py.
+"""
+
+import asyncio
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import algorithm.schedule as asc
+import algorithm.dependent_schedule as ads
+import algorithm.optimized_dependent_schedule as aods
+from classes.exception import BaseException as BException
+from util import CancellationToken, Deadline
+
+DEFAULT_SOLVER = asc.DEFAULT_DEADLINE_SOLVER  # проверяет отмену после каждого увеличивающего пути
+
+
+class JobCancelled(BException):
+    pass
+
+
+class Job:
+    """
+    Задание на составление расписания. await job возвращает расписание
+    classes.schedule.Schedule либо возбуждает asyncio.CancelledError, если
+    задание отменено
+    """
+    def __init__(self, token):
+        """
+        :param util.CancellationToken token:
+        """
+        self.token = token
+        self.future = None  # asyncio.Future с результатом
+        self.progress = None  # (готово уровней, всего уровней) для зависимых задач
+
+    def cancel(self):
+        """
+        Отменяет задание. Решатель остановится на ближайшей проверке
+
+        :rtype bool
+        :return: False, если задание уже завершено
+        """
+        self.token.cancel()
+        return self.future.cancel()
+
+    def cancelled(self):
+        """
+        :rtype bool
+        """
+        return self.future.cancelled()
+
+    def done(self):
+        """
+        :rtype bool
+        """
+        return self.future.done()
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class JobRunner:
+    """
+    Выполняет задания в пуле потоков. Общий для заданий кэш
+    algorithm.cache.SolutionCache можно использовать из нескольких потоков
+    """
+    def __init__(self, max_workers=None):
+        """
+        :param int|None max_workers: количество потоков, см. ThreadPoolExecutor
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='schedule-job')
+
+    @staticmethod
+    def _check_solver(solver):
+        if solver == asc.SOLVER_FLOW:
+            warnings.warn('Solver "flow" can not be interrupted, cancellation and time budget take effect only '
+                          'after it finishes', RuntimeWarning, stacklevel=3)
+
+    def _submit(self, function, time_budget, on_progress=None):
+        """
+        :param callable function: функция (deadline, progress), запускающая решатель
+        :param float|None time_budget: ограничение времени в секундах, отсчитывается с начала решения
+        :param callable|None on_progress: вызывается в цикле событий как on_progress(готово, всего)
+        :rtype Job
+        """
+        loop = asyncio.get_running_loop()
+        token = CancellationToken()
+        job = Job(token)
+
+        def _progress(completed, total):
+            if token.cancelled():
+                raise JobCancelled('Job cancelled')
+            job.progress = (completed, total)
+            if on_progress is not None:
+                loop.call_soon_threadsafe(on_progress, completed, total)
+
+        def _run():
+            if token.cancelled():
+                raise JobCancelled('Job cancelled')
+            if time_budget:
+                token.deadline = Deadline(time_budget)
+            return function(token, _progress)
+
+        job.future = loop.run_in_executor(self._executor, _run)
+        job.future.add_done_callback(lambda future: token.cancel() if future.cancelled() else None)
+        return job
+
+    def schedule(self, task_costs, solver=DEFAULT_SOLVER, time_budget=None, cache=None):
+        """
+        Задание для независимых задач, см. algorithm.schedule.get_optimal_schedule
+
+        :param np.matrix task_costs:
+        :param str solver:
+        :param float|None time_budget:
+        :param algorithm.cache.SolutionCache|None cache:
+        :rtype Job
+        """
+        self._check_solver(solver)
+
+        def _solve(deadline, _):
+            return asc.get_optimal_schedule(task_costs, solver=solver, cache=cache, deadline=deadline)
+
+        return self._submit(_solve, time_budget)
+
+    def dependent_schedule(self, task_costs, dependency_graph, optimized=False, solver=DEFAULT_SOLVER,
+                           time_budget=None, cache=None, on_progress=None):
+        """
+        Задание для зависимых задач, см. algorithm.dependent_schedule и
+        algorithm.optimized_dependent_schedule. Ход решения доступен в
+        job.progress и передаётся on_progress после каждого уровня
+
+        :param np.matrix task_costs:
+        :param networkx.DiGraph|DependencyGraph|DependencyIndex dependency_graph:
+        :param bool optimized: использовать ли algorithm.optimized_dependent_schedule
+        :param str solver:
+        :param float|None time_budget:
+        :param algorithm.cache.SolutionCache|None cache:
+        :param callable|None on_progress: функция (готово уровней, всего уровней)
+        :rtype Job
+        """
+        self._check_solver(solver)
+        module = aods if optimized else ads
+
+        def _solve(deadline, progress):
+            return module.get_optimal_schedule(task_costs, dependency_graph, solver=solver, cache=cache,
+                                               deadline=deadline, progress=progress)
+
+        return self._submit(_solve, time_budget, on_progress)
+
+    def shutdown(self, wait=True):
+        """
+        :param bool wait: дождаться ли завершения выполняющихся заданий
+        """
+        self._executor.shutdown(wait=wait)
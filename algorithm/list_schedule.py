@@ -0,0 +1,136 @@
+"""
+Списочное составление расписаний для зависимых задач (HEFT).
+
+Таскам назначаются приоритеты - восходящие ранги: средняя по процессорам
+длительность таска плюс наибольший ранг его последователей. Готовые таски
+(все предшественники которых уже в расписании) хранятся в куче по убыванию
+ранга, очередной таск ставится в конец расписания того процессора, на
+котором он раньше всего закончится. Время работы O((n + e) log n + n*m),
+в отличие от algorithm.dependent_schedule решать задачу о назначениях на
+каждом уровне не нужно и барьеров между уровнями нет.
+"""
+
+from heapq import heapify, heappush, heappop
+
+import numpy as np
+
+import algorithm.dependency as ad
+from algorithm.cost import INELIGIBLE_COST
+from algorithm.dependency import NotDirectedAcyclicGraph
+from algorithm.schedule import check_eligibility
+from classes.exception import BaseException as BException
+from classes.schedule import Schedule
+
+
+class NoSchedule(BException):
+    pass
+
+
+def get_upward_ranks(task_costs, dependency_index, eligibility=None):
+    """
+    Восходящие ранги тасков. Уровни обрабатываются с последнего, ранги всех
+    тасков уровня вычисляются сразу
+
+    :param np.ndarray task_costs:
+    :param algorithm.dependency.DependencyIndex dependency_index:
+    :param np.ndarray|None eligibility: допустимые пары процессор-таск, средняя
+        длительность считается только по допустимым процессорам
+    :rtype np.ndarray
+    :return: ранг для каждого таска (по внутренним номерам индекса)
+    """
+    if eligibility is None:
+        mean_costs = np.asarray(task_costs, np.float64).mean(axis=0)
+    else:
+        mean_costs = np.where(eligibility, task_costs, 0).sum(axis=0) / eligibility.sum(axis=0)
+    successors = dependency_index.successor_graph
+    result = mean_costs.copy()
+    for level in range(dependency_index.level_count() - 1, -1, -1):
+        nodes = dependency_index.level_nodes[dependency_index.level_offsets[level]:
+                                             dependency_index.level_offsets[level + 1]]
+        starts, finishes = successors.offsets[nodes], successors.offsets[nodes + 1]
+        counts = finishes - starts
+        if not counts.sum():
+            continue
+        edge_indices = np.repeat(finishes - np.cumsum(counts), counts) + np.arange(counts.sum())
+        best_successor_ranks = np.zeros(len(nodes))
+        np.maximum.at(best_successor_ranks, np.repeat(np.arange(len(nodes)), counts),
+                      result[successors.targets[edge_indices]])
+        result[nodes] += best_successor_ranks
+    return result
+
+
+def get_schedule(task_costs, dependency_graph, eligibility=None):
+    """
+    Возвращает расписание для зависимых задач, составленное списочным
+    алгоритмом HEFT. Расписание не обязательно оптимально
+
+    :param numpy.matrix task_costs:
+    :param networkx.DiGraph|DependencyGraph|DependencyIndex dependency_graph: граф зависимостей
+        либо заранее построенный по нему индекс (см. algorithm.dependency)
+    :param np.ndarray|None eligibility: булева матрица m x n допустимых пар процессор-таск
+    :rtype classes.schedule.Schedule
+    :raises NoSchedule If dependency graph is not a directed acyclic graph
+    :raises algorithm.schedule.NoEligibleProcessor If some task can't be executed on any processor
+    """
+    eligibility = check_eligibility(task_costs, eligibility)
+    try:
+        dependency_index = ad.dependency_index(dependency_graph)
+    except NotDirectedAcyclicGraph:
+        raise NoSchedule('Dependency graph is not a directed acyclic graph')
+
+    processor_count, _ = task_costs.shape
+    costs = np.asarray(task_costs, np.int64)
+    node_tasks = dependency_index.nodes()  # таск для каждого внутреннего номера
+    costs = costs[:, node_tasks]
+    if eligibility is not None:
+        eligibility = eligibility[:, node_tasks]
+    ranks = get_upward_ranks(costs, dependency_index, eligibility)
+    if eligibility is not None:
+        # на недопустимом процессоре таск никогда не закончится раньше
+        costs = np.where(eligibility, costs, INELIGIBLE_COST)
+    # во внутреннем цикле массивы используются в виде списков Python,
+    # т.к. поэлементный доступ к ним заметно быстрее, чем к np.ndarray
+    offsets = dependency_index.successor_graph.offsets.tolist()
+    targets = dependency_index.successor_graph.targets.tolist()
+    remaining_predecessors = np.bincount(dependency_index.successor_graph.targets,
+                                         minlength=dependency_index.node_count()).tolist()
+    ready_times = [0] * dependency_index.node_count()
+    ranks = ranks.tolist()
+    processor_available_times = np.zeros(processor_count, np.int64)
+    result = Schedule(list(range(0, processor_count)))
+    result.is_optimal = False
+
+    ready = [(-ranks[node], node) for node, count in enumerate(remaining_predecessors) if count == 0]
+    heapify(ready)
+    while ready:
+        _, node = heappop(ready)
+        start_times = np.maximum(processor_available_times, ready_times[node])
+        finish_times = start_times + costs[:, node]
+        processor = int(np.argmin(finish_times))
+        wait_time = int(start_times[processor] - processor_available_times[processor])
+        if wait_time:
+            result.add_wait(processor, wait_time)
+        finish_time = int(finish_times[processor])
+        result.add_task(processor, node_tasks[node], finish_time - int(start_times[processor]))
+        processor_available_times[processor] = finish_time
+
+        for successor in targets[offsets[node]:offsets[node + 1]]:
+            if ready_times[successor] < finish_time:
+                ready_times[successor] = finish_time
+            remaining_predecessors[successor] -= 1
+            if not remaining_predecessors[successor]:
+                heappush(ready, (-ranks[successor], successor))
+    return result
+
+
+if __name__ == '__main__':
+    import input_output.input as i
+    from algorithm.dependent_schedule import validate_dependency_graph
+
+    task_costs = i.random_task_parameters(5, 40, 20)
+    dependency_graph = i.random_dependency_graph(list(range(0, 40)), 4, 25)
+    validate_dependency_graph(dependency_graph, task_costs)
+
+    s = get_schedule(task_costs, dependency_graph)
+    print(str(s))
+    print(s.max_busy_time())
@@ -0,0 +1,208 @@
+"""
+Составление расписания для зависимых задач, поступающих по ходу работы.
+
+OnlineDependentScheduler хранит текущее расписание, время завершения
+каждого таска и его предшественников. Новые таски могут зависеть от уже
+размещённых и друг от друга, но не наоборот: уже размещённые таски не
+переносятся. Новые таски разбиваются на уровни по зависимостям между
+собой (таски, все предшественники которых уже размещены, - первый
+уровень) и размещаются так же, как в algorithm.optimized_dependent_schedule:
+уровень сначала заполняет простои процессоров до текущего времени
+занятости расписания (с учётом времени завершения предшественников),
+остальные таски уровня решаются как независимые и ставятся в конец
+расписания новым уровнем.
+
+Стоимость добавления зависит только от новых тасков, их зависимостей и
+количества процессоров, но не от размера уже составленного расписания.
+Если все таски добавить одним вызовом, получится то же расписание, что
+даёт algorithm.optimized_dependent_schedule (при optimized=False -
+algorithm.dependent_schedule) для графа, вершины которого перечислены
+по возрастанию номеров
+"""
+
+import numpy as np
+
+import instrumentation
+import algorithm.schedule as at
+import algorithm.optimized_dependent_schedule as aods
+from algorithm.dependency import NotDirectedAcyclicGraph
+from classes.exception import BaseException as BException
+from classes.schedule import Schedule
+
+
+class InvalidTasks(BException):
+    pass
+
+
+class OnlineDependentScheduler:
+    """
+    Расписание, к которому можно добавлять зависимые задачи. Таски
+    нумеруются подряд в порядке поступления, начиная с 0
+    """
+    def __init__(self, processor_count, solver=at.DEFAULT_SOLVER, cache=None, optimized=True, node_limit=None,
+                 time_limit=None):
+        """
+        :param int processor_count:
+        :param str solver: алгоритм решения подзадач уровней, один из algorithm.schedule.SOLVERS
+        :param algorithm.cache.SolutionCache|None cache: кэш решений подзадач уровней
+        :param bool optimized: заполнять ли простои тасками новых уровней
+        :param int|None node_limit: максимальное количество узлов перебора при заполнении простоев одного процессора
+        :param float|None time_limit: максимальное время перебора при заполнении простоев одного процессора в секундах
+        """
+        self.processor_count = processor_count
+        self.solver = solver
+        self.cache = cache
+        self.optimized = optimized
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.schedule = Schedule(list(range(0, processor_count)))
+        self.task_count = 0
+        self.level_count = 0  # количество обработанных уровней
+        self._task_costs = np.zeros((processor_count, 0), np.int64)  # с запасом по столбцам
+        self._eligibility = None  # с запасом по столбцам, None - все пары допустимы
+        self._predecessors = {}
+        self._task_flow_times = {}
+
+    def predecessors(self, task):
+        """
+        :param int task:
+        :rtype list
+        """
+        return self._predecessors[task]
+
+    def task_flow_times(self):
+        """
+        :rtype dict
+        :return: {таск: flow time, ...}
+        """
+        return dict(self._task_flow_times)
+
+    def _reserve(self, task_count):
+        """
+        Увеличивает запас массивов вдвое, если в них не помещается task_count тасков
+        """
+        capacity = self._task_costs.shape[1]
+        if task_count <= capacity:
+            return
+        capacity = max(task_count, 2 * capacity)
+        task_costs = np.zeros((self.processor_count, capacity), np.int64)
+        task_costs[:, :self.task_count] = self._task_costs[:, :self.task_count]
+        self._task_costs = task_costs
+        if self._eligibility is not None:
+            eligibility = np.ones((self.processor_count, capacity), bool)
+            eligibility[:, :self.task_count] = self._eligibility[:, :self.task_count]
+            self._eligibility = eligibility
+
+    def _iterate_new_levels(self, tasks, predecessors):
+        """
+        Уровни новых тасков по зависимостям между ними (алгоритм Кана)
+
+        :param list tasks:
+        :param dict predecessors: {новый таск: список предшественников, ...}
+        :return: iterator по спискам тасков уровней
+        :raises algorithm.dependency.NotDirectedAcyclicGraph If dependencies contain a cycle
+        """
+        successors = {task: [] for task in tasks}
+        in_degrees = dict.fromkeys(tasks, 0)
+        for task in tasks:
+            for predecessor in predecessors[task]:
+                if predecessor in successors:
+                    successors[predecessor].append(task)
+                    in_degrees[task] += 1
+        frontier = [task for task in tasks if not in_degrees[task]]
+        processed = 0
+        while frontier:
+            yield frontier
+            processed += len(frontier)
+            next_frontier = []
+            for task in frontier:
+                for successor in successors[task]:
+                    in_degrees[successor] -= 1
+                    if not in_degrees[successor]:
+                        next_frontier.append(successor)
+            frontier = sorted(next_frontier)
+        if processed != len(tasks):
+            raise NotDirectedAcyclicGraph('Task dependencies contain a cycle')
+
+    def _append_stage(self, stage_schedule, tasks):
+        """
+        Ставит расписание уровня в конец расписания, как Schedule.concat, но без
+        нормализации всего расписания
+
+        :param classes.schedule.Schedule stage_schedule: таски названы номерами в tasks
+        :param list tasks:
+        """
+        start_time = self.schedule.max_busy_time()
+        for processor, items in stage_schedule:
+            if not items:
+                continue
+            busy_time = self.schedule.busy_time(processor)
+            if busy_time < start_time:
+                self.schedule.add_wait(processor, start_time - busy_time)
+            for item in items:
+                self.schedule.add_task(processor, tasks[item.name], item.time)
+                self._task_flow_times[tasks[item.name]] = self.schedule.busy_time(processor)
+        self.schedule.is_optimal = self.schedule.is_optimal and stage_schedule.is_optimal
+
+    def _schedule_level(self, tasks, deadline):
+        """
+        :param list tasks: таски уровня, предшественники которых уже размещены
+        :param util.Deadline|None deadline:
+        """
+        task_costs = self._task_costs[:, :self.task_count]
+        eligibility = None if self._eligibility is None else self._eligibility[:, :self.task_count]
+        remaining_tasks = tasks
+        if self.optimized and self.level_count > 0:
+            remaining_tasks = aods._add_tasks_to_schedule_without_changing_busy_time(
+                    self.schedule, tasks, task_costs, self, self.node_limit, self.time_limit, deadline, eligibility,
+                    self._task_flow_times)
+        if remaining_tasks:
+            stage_schedule = at.get_optimal_schedule(np.asmatrix(task_costs[:, remaining_tasks]), solver=self.solver,
+                                                     cache=self.cache, deadline=deadline,
+                                                     eligibility=None if eligibility is None
+                                                     else eligibility[:, remaining_tasks])
+            self._append_stage(stage_schedule, remaining_tasks)
+        self.level_count += 1
+
+    def add_tasks(self, task_costs, dependencies=(), eligibility=None, deadline=None):
+        """
+        Добавляет таски в расписание
+
+        :param np.matrix task_costs: времена новых тасков, матрица m x k
+        :param iterable dependencies: пары (предшественник, новый таск); предшественник - новый
+            либо уже добавленный таск
+        :param np.ndarray|None eligibility: булева матрица m x k допустимых пар процессор-таск
+        :param util.Deadline|None deadline: ограничение времени размещения
+        :rtype list
+        :return: номера новых тасков
+        :raises InvalidTasks If task costs shape or dependencies are wrong
+        :raises algorithm.dependency.NotDirectedAcyclicGraph If new dependencies contain a cycle
+        :raises algorithm.schedule.NoEligibleProcessor If some task can't be executed on any processor
+        """
+        task_costs = np.asarray(task_costs, np.int64)
+        if task_costs.ndim != 2 or task_costs.shape[0] != self.processor_count:
+            raise InvalidTasks('Task costs shape {} does not match processor count {}'.format(
+                    task_costs.shape, self.processor_count))
+        eligibility = at.check_eligibility(task_costs, eligibility)
+        first_task = self.task_count
+        tasks = list(range(first_task, first_task + task_costs.shape[1]))
+        predecessors = {task: [] for task in tasks}
+        for predecessor, task in dependencies:
+            if task not in predecessors or not 0 <= predecessor < first_task + len(tasks):
+                raise InvalidTasks('Invalid dependency: ({}, {})'.format(predecessor, task))
+            predecessors[task].append(predecessor)
+        levels = list(self._iterate_new_levels(tasks, predecessors))
+
+        self._reserve(first_task + len(tasks))
+        self._task_costs[:, first_task:first_task + len(tasks)] = task_costs
+        if eligibility is not None:
+            if self._eligibility is None:
+                self._eligibility = np.ones(self._task_costs.shape, bool)
+            self._eligibility[:, first_task:first_task + len(tasks)] = eligibility
+        self._predecessors.update(predecessors)
+        self.task_count += len(tasks)
+
+        with instrumentation.span('online_schedule.add_tasks', tasks=len(tasks)):
+            for level_tasks in levels:
+                self._schedule_level(level_tasks, deadline)
+        return tasks
@@ -1,6 +1,8 @@
+import util
+import instrumentation
 import algorithm.schedule as at
 import algorithm.dependency as ad
-from classes.schedule import Schedule, Task
+from classes.schedule import Schedule, PartialSchedule, Task, KIND_TASK
 from algorithm.dependency import NotDirectedAcyclicGraph
 from classes.exception import BaseException as BException
 
@@ -9,14 +11,23 @@ class NoOptimalSchedule(BException):
     pass
 
 
-def _add_tasks_to_schedule_without_changing_busy_time(schedule, tasks, task_costs, dependency_graph):
+def _add_tasks_to_schedule_without_changing_busy_time(schedule, tasks, task_costs, dependency_index,
+                                                      node_limit=None, time_limit=None, deadline=None,
+                                                      eligibility=None, task_flow_times=None):
     """
-    Добавляет задачи в расписании таким образом, чтобы максимальное время выполнения расписания не росло
+    Добавляет задачи в расписании таким образом, чтобы максимальное время выполнения расписания не росло.
+    Если перебор прерван по одному из ограничений, расписание помечается is_optimal = False
 
     :param classes.schedule.Schedule schedule: Расписание, к которому происходит добавление
     :param list[int] tasks: Задачи, которые можно добавить
     :param numpy.matrix task_costs: Матрица стоимостей задач
-    :param networkx.DiGraph dependency_graph: Граф зависимостей задач
+    :param algorithm.dependency.DependencyIndex dependency_index: Индекс графа зависимостей задач
+    :param int|None node_limit: Максимальное количество узлов перебора для одного процессора
+    :param float|None time_limit: Максимальное время перебора для одного процессора в секундах
+    :param util.Deadline|None deadline: Ограничение времени решения всей задачи
+    :param np.ndarray|None eligibility: Допустимые пары процессор-задача
+    :param dict|None task_flow_times: Время завершения задач расписания {задача: flow time, ...}, None - вычислить
+        по расписанию. Переданный словарь дополняется добавленными задачами
     :rtype list[int]
     :return: Список задач, которые не удалось добавить
     """
@@ -27,7 +38,7 @@ def _add_tasks_to_schedule_without_changing_busy_time(schedule, tasks, task_cost
         :param int task:
         :return:
         """
-        predecessors = dependency_graph.predecessors(task)
+        predecessors = dependency_index.predecessors(task)
         return max(task_flow_times[p] for p in predecessors) if predecessors else 0
 
     def _branch_and_bound(processor, tasks):
@@ -35,107 +46,214 @@ def _add_tasks_to_schedule_without_changing_busy_time(schedule, tasks, task_cost
         Возвращает промежуточное расписание для заданного процессора,
         задачами из которого можно дополнить текущее расписание, не изменив
         его максимальное время выполнения.
+
+        Поиск в глубину с отсечениями: узел отбрасывается, если верхняя
+        оценка времени занятости и нижняя оценка flow time в его поддереве
+        не позволяют улучшить рекорд, а также если уже встречался узел с тем
+        же множеством оставшихся тасков, тем же временем и не большим flow time.
+        Два таска, идущие подряд без ожидания и оба доступные к началу первого
+        из них, перебираются только в порядке SPT, если перед первым из них
+        нет ожидания: обратный порядок даёт то же время занятости и не меньший
+        flow time. После ожидания правило не применяется: перебор не создаёт
+        добровольных ожиданий, поэтому порядок SPT с тем же ожиданием может
+        не встретиться.
         :param processor:
         :param tasks:
+        :rtype (classes.schedule.PartialSchedule, list[int])
         :return: Пару (промежуточное расписание, нераспределенные задачи)
         """
+        def _is_better(node, other):
+            return node.busy_time > other.busy_time or (
+                node.busy_time == other.busy_time and node.flow_time < other.flow_time)
 
-        class SolutionNode:
-            """
-            Узел принятия решения
-            """
-            def __init__(self, schedule, remaining_tasks):
-                self.schedule = schedule  # промежуточное расписание
-                self.remaining_tasks = remaining_tasks.copy()  # ещё не распределенные таски
-                self.total_flow_time = schedule.total_flow_time()
-                self.busy_time = schedule.max_busy_time()  # время выполнения промежуточного расписания в этом узле
-
-            def is_better_than(self, other):
-                return self.busy_time > other.busy_time or (
-                    self.busy_time == other.busy_time and self.total_flow_time < other.total_flow_time)
+        def _limit_reached():
+            if node_limit is not None and nodes_expanded >= node_limit:
+                return True
+            if util.is_expired(deadline):
+                return True
+            return time_limit is not None and util.default_timer() - search_start >= time_limit
 
+        # узел принятия решения - пара (промежуточное расписание, маска ещё не распределенных тасков)
         interval_start = schedule.busy_time(processor)
         interval_finish = max_busy_time
-        first_node = SolutionNode(Schedule([processor]), tasks)
+        task_times = [int(task_costs[processor, task]) for task in tasks]
+        task_start_times = [earliest_start_times[task] for task in tasks]
+        first_node = (PartialSchedule(), (1 << len(tasks)) - 1)
         result = first_node
+        best_partial = first_node[0]  # лучший узел вообще, на случай прерывания поиска
+        seen_states = {}  # (маска, реальное время) -> наименьший flow time
         stack = [first_node]
+        search_start = util.default_timer()
+        nodes_expanded = 0
         while stack:
-            solution_node = stack.pop()
-            current_schedule = solution_node.schedule
-            remaining_tasks = solution_node.remaining_tasks
-            current_schedule_real_time = solution_node.busy_time + interval_start
-
-            search_is_finished = True
-            for new_task in remaining_tasks:
-                new_task_time = task_costs[processor, new_task]
-                new_task_start_time = max(current_schedule_real_time, earliest_start_times[new_task])
+            if _limit_reached():
+                break
+            nodes_expanded += 1
+            current_schedule, remaining_mask = stack.pop()
+            current_schedule_real_time = current_schedule.busy_time + interval_start
+            if _is_better(current_schedule, best_partial):
+                best_partial = current_schedule
+
+            # последний таск, если он стоит в самом конце расписания и перед ним нет ожидания
+            last_task = None
+            parent_schedule = current_schedule.parent
+            if current_schedule.kind == KIND_TASK and (parent_schedule.kind == KIND_TASK or
+                                                       parent_schedule.parent is None):
+                last_task = (current_schedule.time, current_schedule.name)
+                last_task_start_time = current_schedule_real_time - current_schedule.time
+
+            children = []
+            children_time = 0
+            children_latest_start = current_schedule_real_time
+            for index, new_task in enumerate(tasks):
+                if not remaining_mask >> index & 1:
+                    continue
+                new_task_time = task_times[index]
+                new_task_start_time = max(current_schedule_real_time, task_start_times[index])
                 if new_task_start_time + new_task_time <= interval_finish:  # можно добавить таск, углубляем отбор
-                    new_schedule = current_schedule.copy()
-                    wait_time = new_task_start_time - current_schedule_real_time
-                    if wait_time:
-                        new_schedule.add_wait(processor, wait_time)
-                    new_schedule.add_task(processor, new_task, new_task_time)
+                    children_time += new_task_time
+                    children_latest_start = max(children_latest_start, new_task_start_time)
+                    if (last_task is not None and task_start_times[index] <= last_task_start_time and
+                            (new_task_time, new_task) < last_task):
+                        continue  # порядок SPT нарушен, этот вариант доминируется
+                    children.append((index, new_task, new_task_start_time, new_task_time))
 
-                    new_remaining_tasks = remaining_tasks.copy()
-                    new_remaining_tasks.remove(new_task)
+            if not children:
+                if children_time == 0 and _is_better(current_schedule, result[0]):
+                    result = (current_schedule, remaining_mask)
+                continue
 
-                    stack.append(SolutionNode(new_schedule, new_remaining_tasks))
-                    search_is_finished = False
+            # верхняя оценка времени занятости и нижняя оценка flow time в поддереве
+            incumbent = result[0]
+            busy_time_bound = min(interval_finish, children_latest_start + children_time) - interval_start
+            if busy_time_bound < incumbent.busy_time:
+                continue
+            if busy_time_bound == incumbent.busy_time:
+                # в поддереве добавляется хотя бы один таск; если ожиданий больше не будет,
+                # то не меньше тасков, чем нужно для достижения рекордного времени занятости
+                child_times = sorted(child[3] for child in children)
+                tasks_needed = 1
+                if children_latest_start == current_schedule_real_time:
+                    time_needed = incumbent.busy_time - current_schedule.busy_time
+                    for child_time in reversed(child_times):
+                        time_needed -= child_time
+                        if time_needed <= 0:
+                            break
+                        tasks_needed += 1
+                flow_time_bound = current_schedule.flow_time
+                finish_time = current_schedule.busy_time
+                for child_time in child_times[:tasks_needed]:
+                    finish_time += child_time
+                    flow_time_bound += finish_time
+                if flow_time_bound >= incumbent.flow_time:
+                    continue
+
+            state = (remaining_mask, current_schedule_real_time)
+            if seen_states.get(state, current_schedule.flow_time + 1) <= current_schedule.flow_time:
+                continue
+            seen_states[state] = current_schedule.flow_time
+
+            for index, new_task, new_task_start_time, new_task_time in children:
+                new_schedule = current_schedule
+                wait_time = new_task_start_time - current_schedule_real_time
+                if wait_time:
+                    new_schedule = new_schedule.add_wait(wait_time)
+                new_schedule = new_schedule.add_task(new_task, new_task_time)
+                stack.append((new_schedule, remaining_mask & ~(1 << index)))
 
-            if search_is_finished and solution_node.is_better_than(result):
-                result = solution_node
-        return result.schedule, result.remaining_tasks
+        instrumentation.count('branch_and_bound.nodes_expanded', nodes_expanded)
+        best_schedule, remaining_mask = result
+        if stack:
+            schedule.is_optimal = False
+        if stack and _is_better(best_partial, best_schedule):
+            # поиск прерван, берём лучшее найденное заполнение
+            best_schedule = best_partial
+            placed = set(item.name for item in best_partial.items() if isinstance(item, Task))
+            remaining_mask = sum(1 << index for index, task in enumerate(tasks) if task not in placed)
+        return best_schedule, [task for index, task in enumerate(tasks) if remaining_mask >> index & 1]
 
     processors = schedule.get_processors()
-    task_flow_times = schedule.task_flow_times()
+    if task_flow_times is None:
+        task_flow_times = schedule.task_flow_times()
     max_busy_time = schedule.max_busy_time()
     # минимальное начальное время для каждой таски по зависимостям
     earliest_start_times = {task: _earliest_start_time(task) for task in tasks}
 
     remaining_tasks = tasks
     for processor in processors:
-        interval_schedule, remaining_tasks = _branch_and_bound(processor, remaining_tasks)
-        for new_item in interval_schedule.get_items_iter(processor):
+        if eligibility is None:
+            with instrumentation.span('branch_and_bound', processor=processor):
+                interval_schedule, remaining_tasks = _branch_and_bound(processor, remaining_tasks)
+        else:
+            eligible_tasks = [task for task in remaining_tasks if eligibility[processor, task]]
+            with instrumentation.span('branch_and_bound', processor=processor):
+                interval_schedule, unplaced_tasks = _branch_and_bound(processor, eligible_tasks)
+            placed_tasks = set(eligible_tasks).difference(unplaced_tasks)
+            remaining_tasks = [task for task in remaining_tasks if task not in placed_tasks]
+        for new_item in interval_schedule.items():
             schedule.add_item(processor, new_item)
+            if isinstance(new_item, Task):
+                task_flow_times[new_item.name] = schedule.busy_time(processor)
 
     return remaining_tasks
 
 
-def get_optimal_schedule(task_costs, dependency_graph, export_intermediate_results = False):
+def get_optimal_schedule(task_costs, dependency_graph, export_intermediate_results=False, export_file_name_prefix='',
+                         solver=at.DEFAULT_SOLVER, cache=None, node_limit=None, time_limit=None, deadline=None,
+                         progress=None, eligibility=None):
     """
     Возвращает расписание для зависимых задач
 
     :param numpy.matrix task_costs:
-    :param networkx.DiGraph dependency_graph:
-    :param bool export_intermediate_results:
+    :param networkx.DiGraph|DependencyGraph|DependencyIndex dependency_graph: граф зависимостей
+        либо заранее построенный по нему индекс (см. algorithm.dependency)
+    :param bool export_intermediate_results: экспортировать ли подзадачи уровней и их решения
+    :param str export_file_name_prefix: префикс имён экспортируемых файлов
+    :param str solver: алгоритм решения подзадач уровней, один из algorithm.schedule.SOLVERS
+    :param algorithm.cache.SolutionCache|None cache: кэш решений подзадач уровней
+    :param int|None node_limit: максимальное количество узлов перебора при заполнении простоев одного процессора
+    :param float|None time_limit: максимальное время перебора при заполнении простоев одного процессора в секундах
+    :param util.Deadline|None deadline: ограничение времени решения, по его истечении перебор прекращается,
+        а оставшиеся уровни составляются жадно
+    :param callable|None progress: вызывается после каждого уровня как progress(готово уровней, всего уровней)
+    :param np.ndarray|None eligibility: булева матрица m x n допустимых пар процессор-таск
     :return:
     :raises NoOptimalSchedule If failed to calculate optimal schedule
+    :raises algorithm.schedule.NoEligibleProcessor If some task can't be executed on any processor
     """
     processor_count, _ = task_costs.shape
     result = Schedule(list(range(0, processor_count)))
+    eligibility = at.check_eligibility(task_costs, eligibility)
     try:
         # обходим граф зависимости по уровням
-        for (level, tasks) in ad.iterate_levels(dependency_graph):
-            if level > 0:
-                # добавление тасков с уровня на свободное место в прошлый уровень
-                remaining_tasks = _add_tasks_to_schedule_without_changing_busy_time(
-                        result, tasks, task_costs, dependency_graph)
-                if not remaining_tasks:
-                    continue
-            else:
-                remaining_tasks = tasks
-
-            # составление подматрицы для уровня тасок
-            stage_schedule = at.get_optimal_schedule(task_costs[:, remaining_tasks],
-                                                     export_intermediate_results=export_intermediate_results,
-                                                     export_file_name_prefix='level{}_'.format(level))
-            # переименование тасков правильно
-            for proc, items in stage_schedule:
-                for item in items:
-                    if isinstance(item, Task):
-                        item.name = remaining_tasks[item.name]
-
-            result.concat(stage_schedule)
+        dependency_index = ad.dependency_index(dependency_graph)
+        for (level, tasks) in dependency_index.iterate_levels():
+            with instrumentation.span('optimized_dependent_schedule.level', level=level):
+                if level > 0:
+                    # добавление тасков с уровня на свободное место в прошлый уровень
+                    remaining_tasks = _add_tasks_to_schedule_without_changing_busy_time(
+                            result, tasks, task_costs, dependency_index, node_limit, time_limit, deadline,
+                            eligibility)
+                else:
+                    remaining_tasks = tasks
+
+                if remaining_tasks:
+                    # составление подматрицы для уровня тасок
+                    stage_schedule = at.get_optimal_schedule(task_costs[:, remaining_tasks],
+                                                             export_intermediate_results=export_intermediate_results,
+                                                             export_file_name_prefix='{}level{}_'.format(
+                                                                     export_file_name_prefix, level),
+                                                             solver=solver, cache=cache, deadline=deadline,
+                                                             export_tasks=remaining_tasks,
+                                                             eligibility=None if eligibility is None
+                                                             else eligibility[:, remaining_tasks])
+            if remaining_tasks:
+                with instrumentation.span('optimized_dependent_schedule.concat'):
+                    # переименование тасков правильно
+                    stage_schedule.rename_tasks(remaining_tasks)
+                    result.concat(stage_schedule)
+            if progress is not None:
+                progress(level + 1, dependency_index.level_count())
     except NotDirectedAcyclicGraph:
         raise NoOptimalSchedule('Dependency graph is not a directed acyclic graph')
 
@@ -0,0 +1,127 @@
+"""
+Ограничение числа позиций процессоров в задаче R||sum(Cj).
+
+Матрица C содержит для каждого процессора n строк-позиций, но в
+оптимальном расписании процессор i выполняет не больше limits[i] тасков.
+Если на процессоре i выполняется k тасков, total flow time не меньше
+нижней оценки LB_i(k); если LB_i(k) больше стоимости какого-нибудь
+допустимого расписания (жадного, см. get_upper_bound), ни одно оптимальное
+расписание не ставит на процессор i k тасков. Поэтому limits[i] - наибольшее
+k, для которого LB_i(k) <= верхней оценки, и строки с позицией с конца
+>= limits[i] можно не строить.
+
+LB_i(k) - максимум двух оценок (все времена неотрицательны, таски с
+большим множителем позиции получают меньшие времена):
+ - k наименьших времён строки i с множителями k..1 плюс n - k наименьших
+   времён q[j] = min по остальным процессорам с наименьшими возможными для
+   n - k тасков на m - 1 процессорах множителями (по m - 1 каждого из 1, 2, ...);
+ - то же для всех n тасков с временами w[j] = min по всем процессорам и
+   множителями 1..k процессора i вместе с множителями остальных.
+Вторая оценка учитывает, что таски на процессоре i и на остальных разные,
+для одинаковых процессоров она даёт limits[i] = ceil(n / m).
+"""
+
+import numpy as np
+
+
+def get_upper_bound(task_costs):
+    """
+    Total flow time жадного расписания: таски по убыванию минимального
+    времени ставятся в начало процессора, где они меньше всего увеличивают
+    total flow time
+
+    :param np.ndarray task_costs:
+    :rtype int
+    """
+    costs = np.asarray(task_costs, np.int64)
+    task_counts = np.zeros(costs.shape[0], np.int64)
+    result = 0
+    for task in np.argsort(-costs.min(axis=0), kind='stable').tolist():
+        increments = (task_counts + 1) * costs[:, task]
+        processor = int(np.argmin(increments))
+        result += int(increments[processor])
+        task_counts[processor] += 1
+    return result
+
+
+def _prefix_sums(values):
+    """
+    :param np.ndarray values:
+    :rtype np.ndarray
+    :return: массив длины len(values) + 1, result[t] - сумма первых t значений
+    """
+    return np.concatenate([[0], np.cumsum(values)])
+
+
+def _spread_costs(sorted_costs, processor_count):
+    """
+    Нижние оценки total flow time t тасков на processor_count процессорах:
+    t наименьших времён с наименьшими возможными множителями позиций
+
+    :param np.ndarray sorted_costs: времена по возрастанию
+    :param int processor_count:
+    :rtype np.ndarray
+    :return: массив длины len(sorted_costs) + 1, result[t] - оценка для t тасков
+    """
+    # result[t] = result[t - processor_count] + (сумма t наименьших времён)
+    result = _prefix_sums(sorted_costs)
+    for residue in range(0, processor_count):
+        result[residue::processor_count] = np.cumsum(result[residue::processor_count])
+    return result
+
+
+def _shared_costs(sorted_costs, processor_count):
+    """
+    Вторая оценка (см. описание модуля) для всех k. Множители не меньше r
+    получают N_k(r) тасков с наименьшими временами, а сумма произведений
+    равна сумме по r сумм их времён
+
+    :param np.ndarray sorted_costs: минимальные по процессорам времена по возрастанию
+    :param int processor_count:
+    :rtype np.ndarray
+    :return: массив длины n + 1, result[k] - оценка для k тасков на одном процессоре
+    """
+    task_count = len(sorted_costs)
+    prefix_sums = _prefix_sums(sorted_costs)
+    multipliers = np.arange(1, task_count + 1)
+    result = np.zeros(task_count + 1, np.int64)
+    for task_count_on_processor in range(0, task_count + 1):
+        at_least = np.maximum(0, task_count_on_processor - multipliers + 1) + \
+            np.maximum(0, task_count - task_count_on_processor - (processor_count - 1) * (multipliers - 1))
+        result[task_count_on_processor] = prefix_sums[np.minimum(at_least, task_count)].sum()
+    return result
+
+
+def get_position_limits(task_costs, eligibility=None):
+    """
+    Наибольшее число тасков на каждом процессоре в оптимальном расписании.
+    Для матрицы допустимости оценки не вычисляются, ограничение - число
+    допустимых для процессора тасков
+
+    :param np.ndarray task_costs:
+    :param np.ndarray|None eligibility: булева матрица m x n, None - все пары допустимы
+    :rtype np.ndarray
+    :return: массив длины m
+    """
+    costs = np.asarray(task_costs, np.int64)
+    processor_count, task_count = costs.shape
+    if eligibility is not None:
+        return np.asarray(eligibility, bool).sum(axis=1)
+    if processor_count == 1 or task_count == 0 or costs.min() < 0:
+        return np.full(processor_count, task_count, np.int64)
+
+    upper_bound = get_upper_bound(costs)
+    shared_costs = _shared_costs(np.sort(costs.min(axis=0)), processor_count)
+    two_smallest = np.partition(costs, 1, axis=0)
+    task_counts = np.arange(0, task_count + 1)
+    result = np.zeros(processor_count, np.int64)
+    for processor in range(0, processor_count):
+        # k наименьших времён с множителями k..1: (k + 1) * sum(s[:k]) - sum(r * s[r - 1])
+        own_costs = np.sort(costs[processor])
+        own_bounds = (task_counts + 1) * _prefix_sums(own_costs) - \
+            _prefix_sums(np.arange(1, task_count + 1) * own_costs)
+        other_costs = np.where(costs[processor] == two_smallest[0], two_smallest[1], two_smallest[0])
+        other_bounds = _spread_costs(np.sort(other_costs), processor_count - 1)[::-1]
+        lower_bounds = np.maximum(own_bounds + other_bounds, shared_costs)
+        result[processor] = np.flatnonzero(lower_bounds <= upper_bound)[-1]
+    return result
@@ -2,41 +2,92 @@
 Нахождение оптимального расписания для независимых задач
 """
 
-from itertools import dropwhile
-
 import networkx as nx
 import numpy as np
 
-from algorithm.graph import successive_shortest_path
+import instrumentation
+from algorithm.assignment import solve_assignment
+from algorithm.cost import PositionCostOracle
+from algorithm.graph import FlowNetwork
+from algorithm.positions import get_position_limits
+from algorithm.uniform import get_uniform_factors, solve_uniform
+from classes.exception import BaseException as BException
 from classes.schedule import Schedule
+from util import default_timer, is_expired
+
+
+SOLVER_FLOW = 'flow'  # поток минимальной стоимости в транспортной сети (networkx)
+SOLVER_HUNGARIAN = 'hungarian'  # венгерский алгоритм на матрице стоимостей
+SOLVER_SSP = 'ssp'  # поток минимальной стоимости на массивах (algorithm.graph.FlowNetwork)
+SOLVERS = (SOLVER_FLOW, SOLVER_HUNGARIAN, SOLVER_SSP)
+DEFAULT_SOLVER = SOLVER_FLOW
+# решатели, которые проверяют deadline во время решения; flow проверяет его только до запуска networkx
+DEADLINE_SOLVERS = (SOLVER_HUNGARIAN, SOLVER_SSP)
+DEFAULT_DEADLINE_SOLVER = SOLVER_HUNGARIAN  # решатель по умолчанию при ограничении времени
+
+
+class UnknownSolver(BException):
+    pass
+
+
+class NoEligibleProcessor(BException):
+    pass
+
+
+def check_eligibility(task_costs, eligibility):
+    """
+    Проверяет матрицу допустимости: у каждого таска должен быть хотя бы
+    один процессор, на котором его можно выполнять. Каждый такой процессор
+    может взять все таски, поэтому тогда допустимое расписание существует
+
+    :param np.matrix task_costs:
+    :param np.ndarray|None eligibility: булева матрица m x n, None - все пары допустимы
+    :rtype np.ndarray|None
+    :return: eligibility либо None, если допустимы все пары
+    :raises NoEligibleProcessor If some task can't be executed on any processor
+    """
+    if eligibility is None:
+        return None
+    eligibility = np.asarray(eligibility, bool)
+    if eligibility.shape != task_costs.shape:
+        raise NoEligibleProcessor('Eligibility matrix shape {} does not match task parameters shape {}'.format(
+                eligibility.shape, task_costs.shape))
+    if eligibility.all():
+        return None
+    impossible_tasks = np.flatnonzero(~eligibility.any(axis=0))
+    if len(impossible_tasks):
+        raise NoEligibleProcessor('No eligible processor for tasks: {}'.format(impossible_tasks.tolist()))
+    return eligibility
 
 
 def calculate_cost_matrix(task_costs):
     """
-    Составление матрицы C для алгоритма
+    Составление матрицы C для алгоритма. Матрица занимает O(m*n^2) памяти,
+    решатели используют её неявное представление PositionCostOracle
 
     :param np.ndarray task_costs:
     :rtype np.ndarray
     :return:
     """
-    (proc_count, task_count) = task_costs.shape
-    result = np.empty((proc_count * task_count, task_count), np.uint)
-    for i in range(1, task_count + 1):
-        submatrix_start = (i - 1) * proc_count
-        result[submatrix_start: submatrix_start + proc_count] = task_costs * i
-    return result
+    return PositionCostOracle(task_costs).to_matrix().astype(np.uint)
 
 
-def create_schedule_graph(task_costs):
+def create_schedule_graph(task_costs, eligibility=None, position_limits=None):
     """
-    Создание транспортной сети для алгоритма
+    Создание транспортной сети для алгоритма. Рёбра "строка -> таск"
+    создаются только для допустимых пар процессор-таск, вершины строк -
+    только для позиций в пределах position_limits. Вершина строки row
+    матрицы C называется 'x' + str(row + 1)
 
     :param np.ndarray task_costs:
+    :param np.ndarray|None eligibility: булева матрица m x n, None - все пары допустимы
+    :param np.ndarray|None position_limits: наибольшее число тасков каждого процессора
+        (см. algorithm.positions), None - без ограничений
     :rtype nx.DiGraph
     :return:
     """
-    cost_matrix = calculate_cost_matrix(task_costs)
-    cost_matrix_rows, cost_matrix_cols = cost_matrix.shape
+    costs = PositionCostOracle(task_costs, position_limits=position_limits)
+    cost_matrix_rows, cost_matrix_cols = costs.shape
 
     result = nx.DiGraph()
 
@@ -44,66 +95,325 @@ def create_schedule_graph(task_costs):
     result.add_node('y0')
     result.add_edge('y0', 'x0', capacity=cost_matrix_cols, cost=0)
 
+    for j in range(0, cost_matrix_cols):
+        new_y = 'y' + str(j + 1)
+        result.add_node(new_y)
+        result.add_edge(new_y, 'y0', capacity=1, cost=0)
+
     for i in range(0, cost_matrix_rows):
-        new_x = 'x' + str(i + 1)
+        new_x = 'x' + str(int(costs.rows[i]) + 1)
         result.add_node(new_x)
         result.add_edge('x0', new_x, capacity=1, cost=0)
 
-        for j in range(0, cost_matrix_cols):
-            new_y = 'y' + str(j + 1)
-            result.add_node(new_y)
-            result.add_edge(new_y, 'y0', capacity=1, cost=0)
+        position_from_end, processor = costs.row_position(i)
+        row_costs = (costs.task_costs[processor] * (position_from_end + 1)).tolist()
+        row_tasks = range(0, cost_matrix_cols) if eligibility is None \
+            else np.flatnonzero(eligibility[processor]).tolist()
+        for j in row_tasks:
+            result.add_edge(new_x, 'y' + str(j + 1), capacity=1, cost=row_costs[j])
+
+    return result
+
+
+def create_schedule_flow_network(task_costs, eligibility=None, position_limits=None):
+    """
+    Создание транспортной сети для алгоритма в виде FlowNetwork.
+    Вершины: 0 - источник, далее строки оракула PositionCostOracle (без
+    position_limits это все m*n строк матрицы C), n вершин тасок и сток.
+    Первые рёбра - рёбра "строка -> таск" для допустимых пар в порядке
+    PositionCostOracle.eligible_arcs (без ограничений их m*n*n)
+
+    :param np.ndarray task_costs:
+    :param np.ndarray|None eligibility: булева матрица m x n, None - все пары допустимы
+    :param np.ndarray|None position_limits: наибольшее число тасков каждого процессора
+        (см. algorithm.positions), None - без ограничений
+    :rtype (FlowNetwork, int, int)
+    :return: сеть, источник, сток
+    """
+    costs = PositionCostOracle(task_costs, eligibility, position_limits)
+    row_count, task_count = costs.shape
+    source, sink = 0, row_count + task_count + 1
+    rows = np.arange(1, row_count + 1)
+    tasks = np.arange(row_count + 1, row_count + task_count + 1)
+
+    arc_rows, arc_tasks, arc_costs = costs.eligible_arcs()
+    result = FlowNetwork(row_count + task_count + 2)
+    result.add_edges(arc_rows + 1, arc_tasks + row_count + 1, np.ones(len(arc_rows)), arc_costs)
+    result.add_edges(np.zeros(row_count), rows, np.ones(row_count), np.zeros(row_count))
+    result.add_edges(tasks, np.full(task_count, sink), np.ones(task_count), np.zeros(task_count))
+    return result, source, sink
 
-            result.add_edge(new_x, new_y, capacity=1, cost=int(cost_matrix[i][j]))
 
+def _solve_flow(task_costs, eligibility=None, deadline=None, position_limits=None):
+    """
+    Решает задачу как поиск максимального потока минимальной стоимости.
+    Алгоритм networkx нельзя прервать, поэтому deadline проверяется только
+    перед его запуском, для жёстких ограничений по времени лучше подходят
+    другие решатели
+
+    :param np.matrix task_costs:
+    :param np.ndarray|None eligibility:
+    :param util.Deadline|None deadline:
+    :param np.ndarray|None position_limits:
+    :rtype dict
+    :return: {таск: строка матрицы C, ...}
+    """
+    if is_expired(deadline):
+        return {}
+    with instrumentation.span('schedule.graph_construction', solver=SOLVER_FLOW):
+        problem_graph = create_schedule_graph(task_costs, eligibility, position_limits)
+    if is_expired(deadline):
+        return {}
+    with instrumentation.span('schedule.flow_solve', solver=SOLVER_FLOW):
+        flow_dict = nx.max_flow_min_cost(problem_graph, 'x0', 'y0', weight='cost')
+
+    result = {}
+    with instrumentation.span('schedule.flow_decode', solver=SOLVER_FLOW):
+        for start_node in flow_dict:
+            if start_node[0] != 'x' or start_node == 'x0':
+                continue
+            finish_node_dict = flow_dict[start_node]
+            for finish_node in finish_node_dict:
+                if finish_node_dict[finish_node] > 0:
+                    result[int(finish_node[1:]) - 1] = int(start_node[1:]) - 1
     return result
 
 
-def get_optimal_schedule(task_costs, export_intermediate_results = False, export_file_name_prefix=''):
+def _solve_hungarian(task_costs, eligibility=None, deadline=None, position_limits=None):
     """
-    Возвращает оптимальное расписание
+    Решает задачу о назначениях на матрице C венгерским алгоритмом.
+    Алгоритм работает с плотной матрицей, недопустимые пары в ней стоят
+    INELIGIBLE_COST
 
     :param np.matrix task_costs:
-    :param bool export_intermediate_results:
-    :param str export_file_name_prefix:
+    :param np.ndarray|None eligibility:
+    :param util.Deadline|None deadline:
+    :param np.ndarray|None position_limits:
+    :rtype dict
+    :return: {таск: строка матрицы C, ...}
+    """
+    with instrumentation.span('schedule.flow_solve', solver=SOLVER_HUNGARIAN):
+        costs = PositionCostOracle(task_costs, eligibility, position_limits)
+        task_rows = solve_assignment(costs, deadline)
+    return {task: int(costs.rows[row]) for task, row in enumerate(task_rows.tolist()) if row >= 0}
+
+
+def _solve_ssp(task_costs, eligibility=None, deadline=None, position_limits=None):
+    """
+    Решает задачу как поиск максимального потока минимальной стоимости
+    алгоритмом последовательных кратчайших путей на массивах
+
+    :param np.matrix task_costs:
+    :param np.ndarray|None eligibility:
+    :param util.Deadline|None deadline:
+    :param np.ndarray|None position_limits:
+    :rtype dict
+    :return: {таск: строка матрицы C, ...}
+    """
+    with instrumentation.span('schedule.graph_construction', solver=SOLVER_SSP):
+        network, source, sink = create_schedule_flow_network(task_costs, eligibility, position_limits)
+    with instrumentation.span('schedule.flow_solve', solver=SOLVER_SSP):
+        network.min_cost_flow(source, sink, deadline=deadline)
+    with instrumentation.span('schedule.flow_decode', solver=SOLVER_SSP):
+        costs = PositionCostOracle(task_costs, eligibility, position_limits)
+        rows, tasks, _ = costs.eligible_arcs()
+        used_arcs = np.flatnonzero(network.flow()[:len(rows)])
+        return dict(zip(tasks[used_arcs].tolist(), costs.rows[rows[used_arcs]].tolist()))
+
+
+def complete_assignment(task_costs, task_rows, eligibility=None):
+    """
+    Жадно дополняет неполное назначение: таски без назначения по убыванию
+    минимального времени выполнения получают самую дешёвую свободную строку
+    матрицы C
+
+    :param np.matrix task_costs:
+    :param dict task_rows: {таск: строка матрицы C, ...}, возможно, не для всех тасков
+    :param np.ndarray|None eligibility:
+    :rtype dict
+    :return: {таск: строка матрицы C, ...} для всех тасков
+    """
+    costs = PositionCostOracle(task_costs, eligibility)
+    result = dict(task_rows)
+    free_rows = np.ones(costs.shape[0], bool)
+    free_rows[list(result.values())] = False
+    unassigned = [task for task in range(0, costs.task_count) if task not in result]
+    unassigned.sort(key=lambda task: -int(costs.task_costs[:, task].min()))
+    for task in unassigned:
+        row = int(np.argmin(np.where(free_rows, costs.column(task), np.iinfo(np.int64).max)))
+        result[task] = row
+        free_rows[row] = False
+    return result
+
+
+def _assignment_cost(task_costs, task_rows, eligibility=None):
+    """
+    Total flow time расписания, соответствующего назначению
+
+    :param np.matrix task_costs:
+    :param dict task_rows: {таск: строка матрицы C, ...}
+    :param np.ndarray|None eligibility:
+    :rtype int
+    """
+    costs = PositionCostOracle(task_costs, eligibility)
+    return sum(costs.cost(row, task) for task, row in task_rows.items())
+
+
+def assignment_to_schedule(task_costs, task_rows, eligibility=None):
+    """
+    Составляет расписание по назначению тасков на строки матрицы C.
+    Неполное назначение (решатель прерван по времени) дополняется
+    complete_assignment, если это лучше чисто жадного назначения, такое
+    расписание помечается как неоптимальное
+
+    :param np.matrix task_costs:
+    :param dict task_rows: {таск: строка матрицы C, ...}
+    :param np.ndarray|None eligibility: допустимые пары процессор-таск для дополнения назначения
     :rtype classes.schedule.Schedule
     :return:
     """
 
-    def _edge_to_task_processor_position(u, v):
+    def _row_to_processor_position(row):
         """
-        Дешифрует ребро (пару вершин) в место и процессор для таски
+        Дешифрует строку матрицы C в место и процессор для таски
 
-        :rtype (int, int, int)
-        :return: task, processor, position
+        :rtype (int, int)
+        :return: processor, position
         """
-        task = int(v[1:]) - 1
-        recommendation = int(u[1:]) - 1
-        position_from_end, processor = divmod(recommendation, processor_count)
+        position_from_end, processor = divmod(row, processor_count)
         position = task_count - position_from_end - 1
-        return task, processor, position
+        return processor, position
 
     processor_count, task_count = task_costs.shape
+    is_optimal = len(task_rows) == task_count
+    if not is_optimal:
+        with instrumentation.span('schedule.complete_assignment'):
+            task_rows = min(complete_assignment(task_costs, task_rows, eligibility),
+                            complete_assignment(task_costs, {}, eligibility),
+                            key=lambda rows: _assignment_cost(task_costs, rows, eligibility))
+
+    with instrumentation.span('schedule.decode'):
+        schedule_dict = {p: [-1] * task_count for p in range(0, processor_count)}
+        for task, row in task_rows.items():
+            processor, position = _row_to_processor_position(row)
+            schedule_dict[processor][position] = task
+
+        result = Schedule(list(range(0, processor_count)))
+        result.is_optimal = is_optimal
+        for processor in schedule_dict:
+            for task in filter(lambda x: x >= 0, schedule_dict[processor]):
+                result.add_task(processor, task, task_costs[processor, task])
+        return result
+
+
+def _find_assignment(task_costs, solver, cache, deadline, detect_structure, eligibility, prune_positions):
+    """
+    :rtype dict
+    :return: {таск: строка матрицы C, ...}
+    :raises UnknownSolver If solver is not one of SOLVERS
+    """
+    if eligibility is not None:
+        # ни однородных процессоров, ни ключа кэша для таких задач нет
+        detect_structure = False
+        cache = None
+
+    if detect_structure:
+        uniform_factors = get_uniform_factors(task_costs)
+        if uniform_factors is not None:
+            with instrumentation.span('schedule.uniform_solve'):
+                return solve_uniform(*uniform_factors)
 
-    problem_graph = create_schedule_graph(task_costs)
+    if cache is not None:
+        task_rows = cache.get(task_costs)
+        if task_rows is not None:
+            return task_rows
+
+    if solver == SOLVER_FLOW:
+        solve = _solve_flow
+    elif solver == SOLVER_HUNGARIAN:
+        solve = _solve_hungarian
+    elif solver == SOLVER_SSP:
+        solve = _solve_ssp
+    else:
+        raise UnknownSolver('Unknown solver: {}'.format(solver))
+
+    position_limits = None
+    if prune_positions:
+        with instrumentation.span('schedule.position_limits'):
+            position_limits = get_position_limits(task_costs, eligibility)
+        instrumentation.count('schedule.position_rows', int(np.minimum(position_limits, task_costs.shape[1]).sum()))
+    task_rows = solve(task_costs, eligibility, deadline, position_limits)
+    if cache is not None and len(task_rows) == task_costs.shape[1]:
+        cache.put(task_costs, task_rows)
+    return task_rows
+
+
+def get_optimal_assignment(task_costs, export_intermediate_results=False, export_file_name_prefix='',
+                           solver=DEFAULT_SOLVER, cache=None, deadline=None, detect_structure=True,
+                           export_tasks=None, eligibility=None, prune_positions=True):
+    """
+    Возвращает оптимальное назначение тасков на строки матрицы C.
+    Если время deadline истекло до окончания решения, назначение может быть
+    неполным (см. assignment_to_schedule), такие назначения не кэшируются.
+    Для одинаковых и однородных процессоров назначение находится за
+    O(m*n log(m*n)) без решателя (см. algorithm.uniform).
+    Если задана матрица допустимости eligibility, таски назначаются только
+    на допустимые процессоры, сети строятся только из допустимых рёбер,
+    а кэш не используется.
+    При prune_positions решатель получает только строки позиций, которые
+    могут быть заняты в оптимальном расписании (см. algorithm.positions)
+
+    :param np.matrix task_costs:
+    :param bool export_intermediate_results: экспортировать ли подзадачу и её решение
+        (см. input_output.export.export_assignment)
+    :param str export_file_name_prefix:
+    :param str solver: алгоритм решения, один из SOLVERS
+    :param algorithm.cache.SolutionCache|None cache: кэш решений
+    :param util.Deadline|None deadline: ограничение времени решения
+    :param bool detect_structure: искать ли однородные процессоры
+    :param list|None export_tasks: номера тасков исходной задачи для экспорта
+    :param np.ndarray|None eligibility: булева матрица m x n допустимых пар процессор-таск
+    :param bool prune_positions: ограничивать ли число позиций процессоров
+    :rtype dict
+    :return: {таск: строка матрицы C, ...}
+    :raises UnknownSolver If solver is not one of SOLVERS
+    :raises NoEligibleProcessor If some task can't be executed on any processor
+    """
+    start_time = default_timer()
+    eligibility = check_eligibility(task_costs, eligibility)
+    task_rows = _find_assignment(task_costs, solver, cache, deadline, detect_structure, eligibility,
+                                 prune_positions)
     if export_intermediate_results:
-        from input_output.export import export_graph
-        export_graph(problem_graph, export_file_name_prefix + 'problem_graph')
-    flow_dict = nx.max_flow_min_cost(problem_graph, 'x0', 'y0', weight='cost')
-
-    schedule_dict = {p: [-1] * task_count for p in range(0, processor_count)}
-    for start_node in flow_dict:
-        if start_node[0] != 'x' or start_node == 'x0':
-            continue
-        finish_node_dict = flow_dict[start_node]
-        for finish_node in finish_node_dict:
-            if finish_node_dict[finish_node] > 0:
-                task, processor, position = _edge_to_task_processor_position(
-                        start_node, finish_node)
-                schedule_dict[processor][position] = task
-
-    result = Schedule(list(range(0, processor_count)))
-    for processor in schedule_dict:
-        for task in dropwhile(lambda x: x < 0, schedule_dict[processor]):
-            result.add_task(processor, task, task_costs[processor, task])
-    return result
+        from input_output.export import export_assignment
+        export_assignment(export_file_name_prefix + 'assignment', task_costs, task_rows, export_tasks,
+                          (default_timer() - start_time) * 1000., solver)
+    return task_rows
+
+
+def get_optimal_schedule(task_costs, export_intermediate_results=False, export_file_name_prefix='',
+                         solver=DEFAULT_SOLVER, cache=None, deadline=None, detect_structure=True,
+                         export_tasks=None, eligibility=None, prune_positions=True):
+    """
+    Возвращает оптимальное расписание. Если время deadline истекло, возвращается
+    лучшее найденное допустимое расписание с is_optimal = False
+
+    :param np.matrix task_costs:
+    :param bool export_intermediate_results:
+    :param str export_file_name_prefix:
+    :param str solver: алгоритм решения, один из SOLVERS
+    :param algorithm.cache.SolutionCache|None cache: кэш решений
+    :param util.Deadline|None deadline: ограничение времени решения
+    :param bool detect_structure: решать ли задачу для одинаковых и однородных
+        процессоров без решателя (см. get_optimal_assignment)
+    :param list|None export_tasks: номера тасков исходной задачи для экспорта
+    :param np.ndarray|None eligibility: булева матрица m x n допустимых пар процессор-таск
+    :param bool prune_positions: ограничивать ли число позиций процессоров (см. get_optimal_assignment)
+    :rtype classes.schedule.Schedule
+    :return:
+    :raises UnknownSolver If solver is not one of SOLVERS
+    :raises NoEligibleProcessor If some task can't be executed on any processor
+    """
+    task_rows = get_optimal_assignment(task_costs, export_intermediate_results, export_file_name_prefix,
+                                       solver, cache, deadline, detect_structure, export_tasks, eligibility,
+                                       prune_positions)
+    return assignment_to_schedule(task_costs, task_rows, check_eligibility(task_costs, eligibility))
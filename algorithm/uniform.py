@@ -0,0 +1,57 @@
+"""
+Точные алгоритмы для одинаковых и однородных процессоров.
+
+Процессоры однородные (Q||sum(Cj)), если все строки матрицы времен кратны
+одной базовой строке: task_costs[i, j] = weights[i] * base[j] / base[ref].
+Тогда стоимость строки row = (k, i) матрицы C для таска j равна
+(k + 1) * weights[i] * base[j] / base[ref], т.е. произведению множителя
+строки на длительность таска. Оптимальное назначение - n строк с наименьшими
+множителями, на которые по убыванию длительности ставятся таски по
+возрастанию множителя. Одинаковые процессоры (P||sum(Cj), все строки равны) -
+частный случай, для них это правило SPT с распределением тасков по кругу.
+"""
+
+import numpy as np
+
+
+def get_uniform_factors(task_costs):
+    """
+    Проверяет, кратны ли все строки матрицы времен одной строке
+
+    :param np.matrix task_costs:
+    :rtype (np.ndarray, np.ndarray)|None
+    :return: (base, weights): базовая строка и множители процессоров
+        (в единицах base[ref], где ref - наибольший элемент base) либо None,
+        если процессоры не однородные
+    """
+    costs = np.asarray(task_costs, np.int64)
+    base = costs[int(np.argmax(costs.sum(axis=1)))]
+    ref = int(np.argmax(base))
+    weights = costs[:, ref]
+    # сравнение без деления: costs[i, j] * base[ref] == weights[i] * base[j]
+    if not np.array_equal(costs * base[ref], np.outer(weights, base)):
+        return None
+    return base, weights
+
+
+def solve_uniform(base, weights):
+    """
+    Оптимальное назначение для однородных процессоров
+
+    :param np.ndarray base: длительности тасков
+    :param np.ndarray weights: множители процессоров
+    :rtype dict
+    :return: {таск: строка матрицы C, ...}
+    """
+    task_count = len(base)
+    if (weights == weights[0]).all():
+        # одинаковые процессоры: множители строк не убывают с номером строки
+        rows = np.arange(task_count)
+    else:
+        # строка row = k * m + i имеет множитель (k + 1) * weights[i]; устойчивая
+        # сортировка при равных множителях выбирает меньшие позиции с конца, так что
+        # на каждом процессоре выбранные позиции идут подряд
+        row_factors = np.outer(np.arange(1, task_count + 1), weights).ravel()
+        rows = np.argsort(row_factors, kind='stable')[:task_count]
+    tasks = np.argsort(-base, kind='stable')
+    return dict(zip(tasks.tolist(), rows.tolist()))
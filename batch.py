@@ -0,0 +1,157 @@
+"""
+Пакетное решение набора задач.
+
+Каждая задача - каталог с файлом параметров тасков (task_param*) и,
+возможно, файлом зависимостей (task_depend*), как в test_data. Задачи
+решаются в пуле процессов, результат по каждой задаче пишется отдельной
+строкой JSON в файл результатов сразу после её решения.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+from multiprocessing import Pool
+
+import util
+import algorithm.schedule as asc
+from classes.exception import BaseException as BException
+from util import exit_printing_error
+
+TASK_PARAMETERS_FILE_PREFIX = 'task_param'
+TASK_DEPENDENCY_FILE_PREFIX = 'task_depend'
+
+DEFAULT_RESULTS_FILE_NAME = 'results.jsonl'
+DEFAULT_TIMEOUT = 60
+
+
+class InstanceTimeout(BException):
+    pass
+
+
+def _find_file(directory, prefix):
+    """
+    :param str directory:
+    :param str prefix:
+    :rtype str|None
+    """
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.startswith(prefix) and os.path.isfile(path):
+            return path
+    return None
+
+
+def discover_instances(root):
+    """
+    Находит все каталоги задач внутри root
+
+    :param str root:
+    :rtype list
+    :return: [(каталог, файл параметров, файл зависимостей либо None), ...]
+    """
+    result = []
+    for directory, _, _ in os.walk(root):
+        parameters_path = _find_file(directory, TASK_PARAMETERS_FILE_PREFIX)
+        if parameters_path:
+            result.append((directory, parameters_path, _find_file(directory, TASK_DEPENDENCY_FILE_PREFIX)))
+    return sorted(result)
+
+
+def _raise_timeout(signum, frame):
+    raise InstanceTimeout('Instance took too long to solve')
+
+
+def _timed(timings, phase, function, *args, **kwargs):
+    """
+    Вызывает function и записывает время её работы в мс в timings[phase]
+    """
+    t0 = util.default_timer()
+    result = function(*args, **kwargs)
+    timings[phase] = (util.default_timer() - t0) * 1000.
+    return result
+
+
+def solve_instance(instance, solver, timeout):
+    """
+    Решает одну задачу. Выполняется в процессе-исполнителе
+
+    :param tuple instance: (каталог, файл параметров, файл зависимостей либо None)
+    :param str solver:
+    :param int timeout: ограничение времени решения задачи в секундах
+    :rtype dict
+    """
+    import input_output.input as i
+
+    directory, parameters_path, dependency_path = instance
+    timings = {}
+    result = {'instance': directory, 'timings_ms': timings, 'error': None}
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        task_costs = _timed(timings, 'read_parameters', i.read_task_parameters, parameters_path)
+        result['processors'], result['tasks'] = task_costs.shape
+        if dependency_path is None:
+            schedule = _timed(timings, 'schedule', asc.get_optimal_schedule, task_costs, solver=solver)
+            result['schedule'] = {'objective': schedule.total_flow_time(), 'makespan': schedule.max_busy_time()}
+        else:
+            import algorithm.dependency as ad
+            import algorithm.dependent_schedule as ads
+            import algorithm.optimized_dependent_schedule as aods
+            import algorithm.list_schedule as als
+
+            dependency_graph = _timed(timings, 'read_dependencies', i.read_task_dependencies, dependency_path)
+            error = _timed(timings, 'validate', ads.validate_dependency_graph, dependency_graph, task_costs)
+            if error:
+                raise ads.NoOptimalSchedule('Dependency graph validation error: {}'.format(error))
+            dependency_index = _timed(timings, 'index', ad.DependencyIndex, dependency_graph)
+            for name, module in (('dependent_schedule', ads), ('optimized_dependent_schedule', aods)):
+                schedule = _timed(timings, name, module.get_optimal_schedule, task_costs, dependency_index,
+                                  solver=solver)
+                result[name] = {'objective': schedule.total_flow_time(), 'makespan': schedule.max_busy_time()}
+            schedule = _timed(timings, 'list_schedule', als.get_schedule, task_costs, dependency_index)
+            result['list_schedule'] = {'objective': schedule.total_flow_time(), 'makespan': schedule.max_busy_time()}
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    return result
+
+
+def _solve_instance_star(arguments):
+    return solve_instance(*arguments)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gets optimal schedules for a directory of instances.')
+    parser.add_argument('instances_path', type=str, help='directory to look for instance directories in')
+    parser.add_argument('--output', '-o', type=str, default=DEFAULT_RESULTS_FILE_NAME,
+                        help='file to write JSON lines with results to')
+    parser.add_argument('--processes', '-j', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--timeout', '-t', type=int, default=DEFAULT_TIMEOUT,
+                        help='time limit for a single instance in seconds, 0 for no limit')
+    parser.add_argument('--solver', '-s', type=str, choices=asc.SOLVERS, default=asc.DEFAULT_SOLVER,
+                        help='algorithm used to solve independent task assignment problems')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.instances_path):
+        exit_printing_error('Wrong instances path given!')
+    if not args.processes or args.processes < 1:
+        exit_printing_error('Wrong processes number given!')
+
+    instances = discover_instances(args.instances_path)
+    failed = 0
+    with open(args.output, 'w') as output, Pool(args.processes) as pool:
+        jobs = ((instance, args.solver, args.timeout) for instance in instances)
+        for result in pool.imap_unordered(_solve_instance_star, jobs):
+            output.write(json.dumps(result, sort_keys=True) + '\n')
+            output.flush()
+            if result['error']:
+                failed += 1
+    print('Solved {} instances, {} failed'.format(len(instances) - failed, failed))
+    sys.exit(1 if failed else 0)
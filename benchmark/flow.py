@@ -0,0 +1,77 @@
+"""
+Сравнение алгоритма последовательных кратчайших путей на массивах
+(algorithm.graph.FlowNetwork) с nx.max_flow_min_cost на сетях задачи
+о расписании для независимых задач
+
+Запуск: python -m benchmark.flow [--processors M] [--tasks N [N ...]]
+"""
+
+import argparse
+
+import networkx as nx
+import numpy as np
+
+import util
+import input_output.input as i
+from algorithm.schedule import create_schedule_graph, create_schedule_flow_network
+
+DEFAULT_TASK_COUNTS = [10, 20, 40, 60]
+DEFAULT_PROCESSOR_COUNT = 5
+MAXIMUM_TASK_TIME = 20
+SEED = 0
+
+
+def _measure(function):
+    """
+    :param callable function:
+    :return: (результат, время в мс)
+    """
+    t0 = util.default_timer()
+    result = function()
+    return result, (util.default_timer() - t0) * 1000.
+
+
+def benchmark(processor_count, task_count):
+    """
+    Решает одну и ту же случайную задачу обоими способами
+
+    :param int processor_count:
+    :param int task_count:
+    :rtype dict
+    """
+    task_costs = i.random_task_parameters(processor_count, task_count, MAXIMUM_TASK_TIME)
+
+    graph, nx_build_time = _measure(lambda: create_schedule_graph(task_costs))
+    flow_dict, nx_solve_time = _measure(lambda: nx.max_flow_min_cost(graph, 'x0', 'y0', weight='cost'))
+    nx_cost = nx.cost_of_flow(graph, flow_dict, weight='cost')
+
+    (network, source, sink), ssp_build_time = _measure(lambda: create_schedule_flow_network(task_costs))
+    (_, ssp_cost), ssp_solve_time = _measure(lambda: network.min_cost_flow(source, sink))
+
+    if nx_cost != ssp_cost:
+        raise AssertionError('Flow costs differ: {} != {}'.format(nx_cost, ssp_cost))
+    return {
+        'processors': processor_count,
+        'tasks': task_count,
+        'edges': graph.number_of_edges(),
+        'cost': ssp_cost,
+        'nx_build_ms': nx_build_time,
+        'nx_solve_ms': nx_solve_time,
+        'ssp_build_ms': ssp_build_time,
+        'ssp_solve_ms': ssp_solve_time,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares min cost flow backends.')
+    parser.add_argument('--processors', '-m', type=int, default=DEFAULT_PROCESSOR_COUNT)
+    parser.add_argument('--tasks', '-n', type=int, nargs='+', default=DEFAULT_TASK_COUNTS)
+    args = parser.parse_args()
+
+    np.random.seed(SEED)
+    row_format = '{:>5} {:>6} {:>9} {:>12} {:>12} {:>12} {:>12}'
+    print(row_format.format('m', 'n', 'edges', 'nx build', 'nx solve', 'ssp build', 'ssp solve'))
+    for task_count in args.tasks:
+        r = benchmark(args.processors, task_count)
+        print(row_format.format(r['processors'], r['tasks'], r['edges'], *[
+            '{:.1f} ms'.format(r[k]) for k in ('nx_build_ms', 'nx_solve_ms', 'ssp_build_ms', 'ssp_solve_ms')]))
@@ -0,0 +1,245 @@
+"""
+Набор тестов производительности всех способов составления расписаний.
+
+Для каждой точки сетки (m, n, levels) генерируется случайная задача с
+фиксированным зерном, после чего отдельно замеряются время и пиковая память
+построения сети, решения задачи о назначениях и составления расписания для
+независимых задач, а также algorithm.dependent_schedule и
+algorithm.optimized_dependent_schedule. Результаты пишутся в JSON, два файла
+результатов можно сравнить и найти замедления.
+
+Запуск:
+python -m benchmark.suite run [-m M ...] [-n N ...] [-l L ...] [-o results.json]
+python -m benchmark.suite compare <старые результаты> <новые результаты> [--threshold 0.2]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+import util
+import input_output.export as export
+import input_output.input as i
+import algorithm.dependency as ad
+import algorithm.dependent_schedule as ads
+import algorithm.optimized_dependent_schedule as aods
+import algorithm.schedule as asc
+from algorithm.assignment import solve_assignment
+from algorithm.cost import PositionCostOracle
+
+DEFAULT_PROCESSOR_COUNTS = [3, 5]
+DEFAULT_TASK_COUNTS = [20, 50, 100]
+DEFAULT_LEVEL_COUNTS = [1, 4]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+MAXIMUM_TASK_TIME = 20
+SEED = 0
+
+# замеры, которые меньше этого порога, при сравнении не учитываются: шум таймера
+MINIMUM_COMPARED_TIME_MS = 5.
+
+
+def generate_instance(processor_count, task_count, level_count, seed=SEED):
+    """
+    Случайная задача, одинаковая для одинаковых параметров
+
+    :rtype (np.matrix, networkx.DiGraph)
+    """
+    instance_seed = seed * 1000003 + processor_count * 10007 + task_count * 101 + level_count
+    random.seed(instance_seed)
+    np.random.seed(instance_seed % (2 ** 32))
+    task_costs = i.random_task_parameters(processor_count, task_count, MAXIMUM_TASK_TIME)
+    level_count = min(level_count, task_count)
+    dependency_graph = i.random_dependency_graph(list(range(0, task_count)), level_count,
+                                                 max(task_count // level_count, 1))
+    ads.validate_dependency_graph(dependency_graph, task_costs)
+    return task_costs, dependency_graph
+
+
+def _measure(function, repeat):
+    """
+    Наименьшее из repeat времён работы и пиковая память отдельного запуска
+    под tracemalloc (он замедляет код, поэтому время замеряется без него)
+
+    :param callable function:
+    :param int repeat:
+    :return: (результат, время в мс, пиковая память в КиБ)
+    """
+    best_time = None
+    for _ in range(0, repeat):
+        t0 = util.default_timer()
+        result = function()
+        elapsed = (util.default_timer() - t0) * 1000.
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best_time, peak / 1024.
+
+
+def _assignment_phases(task_costs, solver):
+    """
+    Этапы решения задачи для независимых задач заданным решателем
+
+    :return: [(этап, функция), ...], функция этапа получает результат предыдущего
+    """
+    if solver == asc.SOLVER_FLOW:
+        def _solve(graph):
+            return nx.max_flow_min_cost(graph, 'x0', 'y0', weight='cost')
+        return [('graph_construction', lambda _: asc.create_schedule_graph(task_costs)), ('flow_solve', _solve)]
+    if solver == asc.SOLVER_SSP:
+        def _solve(network_source_sink):
+            network, source, sink = network_source_sink
+            return network.min_cost_flow(source, sink)
+        return [('graph_construction', lambda _: asc.create_schedule_flow_network(task_costs)), ('flow_solve', _solve)]
+    return [('graph_construction', lambda _: PositionCostOracle(task_costs)), ('flow_solve', solve_assignment)]
+
+
+def benchmark(processor_count, task_count, level_count, solver, repeat=DEFAULT_REPEAT):
+    """
+    :param int processor_count:
+    :param int task_count:
+    :param int level_count:
+    :param str solver: один из algorithm.schedule.SOLVERS
+    :param int repeat: количество повторов замера времени
+    :rtype dict
+    """
+    task_costs, dependency_graph = generate_instance(processor_count, task_count, level_count)
+    timings, memory, objectives = {}, {}, {}
+
+    def _run(phase, function):
+        result, timings[phase], memory[phase] = _measure(function, repeat)
+        return result
+
+    previous = None
+    for phase, function in _assignment_phases(task_costs, solver):
+        previous = _run(phase, lambda: function(previous))
+    task_rows = asc.get_optimal_assignment(task_costs, solver=solver)
+    schedule = _run('decode', lambda: asc.assignment_to_schedule(task_costs, task_rows))
+    schedule = _run('schedule', lambda: asc.get_optimal_schedule(task_costs, solver=solver))
+    objectives['schedule'] = schedule.total_flow_time()
+
+    dependency_index = _run('dependency_index', lambda: ad.DependencyIndex(dependency_graph))
+    for name, module in (('dependent_schedule', ads), ('optimized_dependent_schedule', aods)):
+        schedule = _run(name, lambda: module.get_optimal_schedule(task_costs, dependency_index, solver=solver))
+        objectives[name] = schedule.total_flow_time()
+
+    return {
+        'processors': processor_count,
+        'tasks': task_count,
+        'levels': level_count,
+        'timings_ms': timings,
+        'peak_memory_kib': memory,
+        'objectives': objectives,
+    }
+
+
+def run(processor_counts, task_counts, level_counts, solver, repeat):
+    """
+    :rtype dict
+    """
+    export.path = None
+    results = []
+    for processor_count in processor_counts:
+        for task_count in task_counts:
+            for level_count in level_counts:
+                result = benchmark(processor_count, task_count, level_count, solver, repeat)
+                print('m={processors} n={tasks} levels={levels}: '.format(**result) + ', '.join(
+                        '{} {:.1f} ms'.format(phase, time) for phase, time in sorted(result['timings_ms'].items())),
+                      file=sys.stderr)
+                results.append(result)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'networkx': nx.__version__,
+            'solver': solver,
+            'seed': SEED,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def _key(result):
+    return result['processors'], result['tasks'], result['levels']
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    Сравнивает два набора результатов
+
+    :param dict old:
+    :param dict new:
+    :param float threshold: относительный рост времени или памяти, считающийся замедлением
+    :rtype list[str]
+    :return: описания замедлений и изменений значений целевой функции
+    """
+    old_results = {_key(result): result for result in old['results']}
+    messages = []
+    for result in new['results']:
+        old_result = old_results.get(_key(result))
+        if old_result is None:
+            continue
+        prefix = 'm={} n={} levels={}'.format(*_key(result))
+        for metric, unit, minimum in (('timings_ms', 'ms', MINIMUM_COMPARED_TIME_MS), ('peak_memory_kib', 'KiB', 0)):
+            for phase, value in sorted(result[metric].items()):
+                old_value = old_result[metric].get(phase)
+                if old_value is None or max(old_value, value) < minimum:
+                    continue
+                if value > old_value * (1 + threshold):
+                    messages.append('{} {}: {:.1f} {} -> {:.1f} {} (+{:.0f}%)'.format(
+                            prefix, phase, old_value, unit, value, unit, (value / max(old_value, 1e-9) - 1) * 100))
+        for phase, value in sorted(result['objectives'].items()):
+            old_value = old_result['objectives'].get(phase)
+            if old_value is not None and old_value != value:
+                messages.append('{} {}: objective changed {} -> {}'.format(prefix, phase, old_value, value))
+    return messages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks all scheduling paths.')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run the benchmark grid')
+    run_parser.add_argument('--processors', '-m', type=int, nargs='+', default=DEFAULT_PROCESSOR_COUNTS)
+    run_parser.add_argument('--tasks', '-n', type=int, nargs='+', default=DEFAULT_TASK_COUNTS)
+    run_parser.add_argument('--levels', '-l', type=int, nargs='+', default=DEFAULT_LEVEL_COUNTS)
+    run_parser.add_argument('--solver', '-s', type=str, choices=asc.SOLVERS, default=asc.DEFAULT_SOLVER)
+    run_parser.add_argument('--repeat', '-r', type=int, default=DEFAULT_REPEAT)
+    run_parser.add_argument('--output', '-o', type=str, default=None, help='file to write JSON results to')
+    compare_parser = subparsers.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('old_path', type=str)
+    compare_parser.add_argument('new_path', type=str)
+    compare_parser.add_argument('--threshold', '-t', type=float, default=DEFAULT_THRESHOLD,
+                                help='relative slowdown to report, 0.2 means 20%%')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        if min(args.processors + args.tasks + args.levels) < 1 or args.repeat < 1:
+            util.exit_printing_error('Wrong grid given!')
+        results = run(args.processors, args.tasks, args.levels, args.solver, args.repeat)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        else:
+            print(json.dumps(results, indent=2, sort_keys=True))
+    elif args.command == 'compare':
+        with open(args.old_path) as f:
+            old_results = json.load(f)
+        with open(args.new_path) as f:
+            new_results = json.load(f)
+        regressions = compare(old_results, new_results, args.threshold)
+        print('\n'.join(regressions) if regressions else 'No regressions found')
+        sys.exit(1 if regressions else 0)
+    else:
+        parser.print_help()
+        sys.exit(1)
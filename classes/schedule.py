@@ -3,7 +3,11 @@
 """
 
 
-from copy import deepcopy
+import numbers
+from array import array
+
+import numpy as np
+
 from classes.exception import BaseException as BException
 
 
@@ -11,10 +15,21 @@ class UncompatibleSchedulesException(BException):
     pass
 
 
+class InvalidItemException(BException):
+    pass
+
+
+KIND_WAIT = 0
+KIND_TASK = 1
+ITEM_VALUE_RANGE = (-2 ** 63, 2 ** 63)  # имена тасков и времена хранятся в int64
+
+
 class Item:
     """
     Базовый класс элемента расписания
     """
+    __slots__ = ('time',)
+
     def __init__(self, time):
         self.time = time  # свойство "занимаемое время"
 
@@ -23,6 +38,8 @@ class Wait(Item):
     """
     Ожидание в расписании. Наследуется от Item
     """
+    __slots__ = ()
+
     def __str__(self, *args, **kwargs):
         return 'Wait(time={})'.format(self.time)
 
@@ -31,6 +48,8 @@ class Task(Item):
     """
     Задача в расписании
     """
+    __slots__ = ('name',)
+
     def __init__(self, name, time):
         super().__init__(time)
         self.name = name  # имя задачи
@@ -39,16 +58,220 @@ class Task(Item):
         return 'Task(name={}, time={})'.format(self.name, self.time)
 
 
+def _check_item_value(value, kind):
+    """
+    :param value: имя таска либо время
+    :param str kind: 'name' либо 'time' для сообщения об ошибке
+    :rtype int
+    :raises InvalidItemException If value is not an integer or does not fit into int64
+    """
+    if type(value) is int and ITEM_VALUE_RANGE[0] <= value < ITEM_VALUE_RANGE[1]:
+        return value
+    if isinstance(value, bool) or not isinstance(value, numbers.Integral):
+        if kind == 'name':
+            raise InvalidItemException('Task name must be an integer, got {!r}'.format(value))
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise InvalidItemException('Item time must be a number, got {!r}'.format(value))
+    value = int(value)
+    if not ITEM_VALUE_RANGE[0] <= value < ITEM_VALUE_RANGE[1]:
+        raise InvalidItemException('Item {} {} does not fit into int64'.format(kind, value))
+    return value
+
+
+class _TaskView(Task):
+    """
+    Таск, выданный при итерации по расписанию: имя и время читаются из
+    массивов расписания, присваивание записывает их обратно. Ссылка
+    действительна, пока расписание не нормализовано (normalize, concat)
+    """
+    __slots__ = ('_items', '_index')
+
+    def __init__(self, items, index):
+        self._items = items
+        self._index = index
+
+    @property
+    def name(self):
+        return self._items.names[self._index]
+
+    @name.setter
+    def name(self, value):
+        self._items.set_name(self._index, value)
+
+    @property
+    def time(self):
+        return self._items.times[self._index]
+
+    @time.setter
+    def time(self, value):
+        self._items.set_time(self._index, value)
+
+
+class _WaitView(Wait):
+    """
+    Ожидание, выданное при итерации по расписанию (см. _TaskView)
+    """
+    __slots__ = ('_items', '_index')
+
+    def __init__(self, items, index):
+        self._items = items
+        self._index = index
+
+    @property
+    def time(self):
+        return self._items.times[self._index]
+
+    @time.setter
+    def time(self, value):
+        self._items.set_time(self._index, value)
+
+
+class _ProcessorItems:
+    """
+    Элементы расписания одного процессора в виде массивов: вид элемента,
+    имя таска (целое число, для Wait не используется) и время.
+    Вместе с массивами поддерживаются время занятости процессора и сумма
+    flow time его тасков
+    """
+    __slots__ = ('kinds', 'names', 'times', 'busy_time', 'flow_time')
+
+    def __init__(self):
+        self.kinds = array('b')
+        self.names = array('q')
+        self.times = array('q')
+        self.busy_time = 0
+        self.flow_time = 0
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, kind, name, time):
+        """
+        :raises InvalidItemException If name or time is not an integer
+        """
+        name = _check_item_value(name, 'name')
+        time = _check_item_value(time, 'time')
+        self.kinds.append(kind)
+        self.names.append(name)
+        self.times.append(time)
+        self.busy_time += time
+        if kind == KIND_TASK:
+            self.flow_time += self.busy_time
+
+    def set_name(self, index, name):
+        """
+        :raises InvalidItemException If name is not an integer
+        """
+        self.names[index] = _check_item_value(name, 'name')
+
+    def set_time(self, index, time):
+        """
+        :raises InvalidItemException If time is not an integer
+        """
+        self.times[index] = _check_item_value(time, 'time')
+        self._update_aggregates()
+
+    def item(self, index):
+        """
+        :rtype Item
+        :return: Task либо Wait, присваивание полям которого меняет расписание
+        """
+        if self.kinds[index] == KIND_TASK:
+            return _TaskView(self, index)
+        return _WaitView(self, index)
+
+    def items(self):
+        """
+        :rtype list[Item]
+        """
+        return [self.item(index) for index in range(0, len(self))]
+
+    def finish_times(self):
+        """
+        Время окончания каждого элемента
+
+        :rtype np.ndarray
+        """
+        if not self.times:
+            return np.empty(0, np.int64)
+        return np.cumsum(np.frombuffer(self.times, np.int64))
+
+    def task_mask(self):
+        """
+        :rtype np.ndarray
+        """
+        if not self.kinds:
+            return np.empty(0, bool)
+        return np.frombuffer(self.kinds, np.int8) == KIND_TASK
+
+    def copy(self):
+        result = _ProcessorItems()
+        result.kinds = array('b', self.kinds)
+        result.names = array('q', self.names)
+        result.times = array('q', self.times)
+        result.busy_time = self.busy_time
+        result.flow_time = self.flow_time
+        return result
+
+    def _rebuild(self, kinds, names, times):
+        """
+        Заменяет содержимое и пересчитывает агрегаты
+        """
+        self.kinds, self.names, self.times = array('b', kinds), array('q', names), array('q', times)
+        self._update_aggregates()
+
+    def _update_aggregates(self):
+        finish_times = self.finish_times()
+        self.busy_time = int(finish_times[-1]) if len(finish_times) else 0
+        self.flow_time = int(finish_times[self.task_mask()].sum())
+
+    def join_waits(self):
+        """
+        Склеивает находящиеся рядом Wait в один с суммарным их временем
+        """
+        kinds, names, times = [], [], []
+        for kind, name, time in zip(self.kinds, self.names, self.times):
+            if kind == KIND_WAIT and kinds and kinds[-1] == KIND_WAIT:
+                times[-1] += time
+            else:
+                kinds.append(kind)
+                names.append(name)
+                times.append(time)
+        if len(kinds) != len(self.kinds):
+            self._rebuild(kinds, names, times)
+
+    def trim_waits(self):
+        """
+        Удаляет незначащие Wait с конца расписания
+        """
+        while self.kinds and self.kinds[-1] == KIND_WAIT:
+            self.kinds.pop()
+            self.names.pop()
+            self.busy_time -= self.times.pop()
+
+
 class Schedule:
     """
     Класс расписания. В нём хранятся расписания для каждого процессора в виде
-    списка Item (либо Task, либо Wait)
+    последовательности элементов (либо Task, либо Wait).
+
+    Элементы хранятся по столбцам в массивах, объекты Task и Wait создаются
+    только при итерации по расписанию и ссылаются на эти массивы:
+    присваивание их name и time меняет расписание (для переименования всех
+    тасков быстрее rename_tasks). Имена тасков - целые числа. Время занятости процессоров и total flow time
+    поддерживаются при добавлении элементов и вычисляются за O(1).
+
+    Флаг is_optimal сбрасывается, если решатель не успел доказать
+    оптимальность расписания (например, истекло отведённое время)
     """
     def __init__(self, processors):
-        self._data = {p: [] for p in processors}
+        self._data = {p: _ProcessorItems() for p in processors}
+        self.is_optimal = True
 
     def __iter__(self):  # синтаксический сахар для итерации по расписанию
-        return iter(self._data.items())
+        return ((processor, items.items()) for processor, items in self._data.items())
 
     def add_item(self, processor, item):
         """
@@ -57,7 +280,10 @@ class Schedule:
         :param item:
         :return:
         """
-        self._data[processor].append(item)
+        if isinstance(item, Task):
+            self._data[processor].append(KIND_TASK, item.name, item.time)
+        else:
+            self._data[processor].append(KIND_WAIT, 0, item.time)
 
     def add_wait(self, processor, time):
         """
@@ -66,7 +292,7 @@ class Schedule:
         :param time:
         :return:
         """
-        self.add_item(processor, Wait(int(time)))
+        self._data[processor].append(KIND_WAIT, 0, time)
 
     def add_task(self, processor, name, time):
         """
@@ -76,7 +302,7 @@ class Schedule:
         :param time:
         :return:
         """
-        self.add_item(processor, Task(name, int(time)))
+        self._data[processor].append(KIND_TASK, name, time)
 
     def busy_time(self, processor):
         """
@@ -84,7 +310,7 @@ class Schedule:
         :param processor:
         :return:
         """
-        return sum(item.time for item in self._data[processor])
+        return self._data[processor].busy_time
 
     def get_items_iter(self, processor):
         """
@@ -92,7 +318,8 @@ class Schedule:
         :param processor:
         :return:
         """
-        return iter(self._data[processor])
+        items = self._data[processor]
+        return (items.item(index) for index in range(0, len(items)))
 
     def max_busy_time(self):
         """
@@ -100,10 +327,7 @@ class Schedule:
         занятости по расписанию)
         :return:
         """
-        return max(
-            sum(item.time for item in items)
-            for _, items in self
-        )
+        return max(items.busy_time for items in self._data.values())
 
     def _iterate_task_flow_times(self):
         """
@@ -111,51 +335,51 @@ class Schedule:
         для каждой таски
         :return:
         """
-        for _, items in self:
-            time_passed = 0
-            for item in items:
-                time_passed += item.time
-                if isinstance(item, Task):
-                    yield (item, time_passed)
+        for items in self._data.values():
+            task_mask = items.task_mask()
+            names = np.frombuffer(items.names, np.int64)[task_mask] if len(items) else []
+            yield from zip(np.asarray(names).tolist(), items.finish_times()[task_mask].tolist())
 
     def task_flow_times(self):
         """
         Возвращает словарь вида {таск: flow time, ...}
         :return:
         """
-        return {task.name: flow_time for task, flow_time in self._iterate_task_flow_times()}
+        return dict(self._iterate_task_flow_times())
 
     def total_flow_time(self):
         """
         Возвращает total flow time расписания
         :return:
         """
-        return sum(map(lambda x: x[1], self._iterate_task_flow_times()))
+        return sum(items.flow_time for items in self._data.values())
+
+    def rename_tasks(self, names):
+        """
+        Переименовывает таски: таск с именем x получает имя names[x]
+
+        :param list|dict names:
+        """
+        for items in self._data.values():
+            for index in range(0, len(items)):
+                if items.kinds[index] == KIND_TASK:
+                    items.names[index] = names[items.names[index]]
 
     def _join_waits(self):
         """
         Склеивает находящиеся рядом Wait в один с суммарным их временем
         :return:
         """
-        for _, items in self:
-            i = 1
-            item_count = len(items)
-            while i < item_count:
-                if isinstance(items[i - 1], Wait) and isinstance(items[i], Wait):
-                    items[i].time = items[i].time + items[i-1].time
-                    del items[i-1]
-                    item_count -= 1
-                else:
-                    i += 1
+        for items in self._data.values():
+            items.join_waits()
 
     def _trim_waits(self):
         """
         Удаляет незначащие Wait с конца расписания
         :return:
         """
-        for _, items in self:
-            while items and isinstance(items[-1], Wait):
-                items.pop()
+        for items in self._data.values():
+            items.trim_waits()
 
     def normalize(self):
         """
@@ -169,11 +393,11 @@ class Schedule:
         """
         Adds waits for processors if needed so each processor is busy for the same time
         """
-        busy_times = {p: self.busy_time(p) for p in self.get_processors()}
-        max_busy_time = max(busy_times.values())
+        max_busy_time = self.max_busy_time()
         for processor in self.get_processors():
-            if busy_times[processor] < max_busy_time:
-                self.add_wait(processor, max_busy_time - busy_times[processor])
+            busy_time = self.busy_time(processor)
+            if busy_time < max_busy_time:
+                self.add_wait(processor, max_busy_time - busy_time)
 
     def get_processors(self):
         """
@@ -183,21 +407,34 @@ class Schedule:
         """
         return list(self._data.keys())
 
+    def get_task_interval_arrays(self):
+        """
+        Возвращает интервалы выполнения тасков в виде массивов
+        :rtype dict
+        :return: Словарь, в котором для каждого процессора определена тройка
+        np.ndarray (имена тасков, времена начала, времена завершения) в порядке выполнения
+        """
+        result = {}
+        for processor, items in self._data.items():
+            if not len(items):
+                empty = np.empty(0, np.int64)
+                result[processor] = (empty, empty, empty)
+                continue
+            task_mask = items.task_mask()
+            finish_times = items.finish_times()[task_mask]
+            times = np.frombuffer(items.times, np.int64)[task_mask]
+            names = np.frombuffer(items.names, np.int64)[task_mask]
+            result[processor] = (names, finish_times - times, finish_times)
+        return result
+
     def get_task_intervals(self):
         """
         Возвращает интервалы выполнения каждой таски
         :return: Словарь, в котором для каждого процессора определен список,
         в котором каждый элемент - (имя таски, время её начала, время её завершения)
         """
-        result = {}
-        for processor, items in self:
-            result[processor] = []
-            item_start = 0
-            for item in items:
-                if isinstance(item, Task):
-                    result[processor].append((item.name, item_start, item_start + item.time))
-                item_start += item.time
-        return result
+        return {processor: list(zip(names.tolist(), starts.tolist(), finishes.tolist()))
+                for processor, (names, starts, finishes) in self.get_task_interval_arrays().items()}
 
     def copy(self):
         """
@@ -205,7 +442,10 @@ class Schedule:
         :rtype Schedule
         :return:
         """
-        return deepcopy(self)
+        result = Schedule([])
+        result._data = {p: items.copy() for p, items in self._data.items()}
+        result.is_optimal = self.is_optimal
+        return result
 
     def concat(self, other):
         """
@@ -218,10 +458,11 @@ class Schedule:
         if set(self.get_processors()).symmetric_difference(other.get_processors()):
             raise UncompatibleSchedulesException('operand has different processor data')
         self.equalize_busy_time()
-        for processor, items in other:
-            for item in items:
-                self.add_item(processor, item)
+        for processor, items in other._data.items():
+            for kind, name, time in zip(items.kinds, items.names, items.times):
+                self._data[processor].append(kind, name, time)
         self.normalize()
+        self.is_optimal = self.is_optimal and other.is_optimal
         return self
 
     def __str__(self, *args, **kwargs):
@@ -240,19 +481,75 @@ class Schedule:
         result.concat(other)
         return result
 
+
+class PartialSchedule:
+    """
+    Неизменяемое (персистентное) расписание одного процессора в виде
+    связного списка от последнего элемента к первому. Дочернее расписание
+    разделяет с родительским весь префикс, поэтому добавление элемента
+    требует O(1) времени и памяти независимо от длины расписания. Время
+    занятости и total flow time хранятся в каждом узле
+    """
+    __slots__ = ('parent', 'kind', 'name', 'time', 'busy_time', 'flow_time')
+
+    def __init__(self, parent=None, kind=KIND_WAIT, name=0, time=0):
+        """
+        Пустое расписание создаётся вызовом без параметров
+        """
+        self.parent = parent
+        self.kind = kind
+        self.name = name
+        self.time = time
+        self.busy_time = time + (parent.busy_time if parent else 0)
+        self.flow_time = parent.flow_time if parent else 0
+        if kind == KIND_TASK:
+            self.flow_time += self.busy_time
+
+    def add_wait(self, time):
+        """
+        :param int time:
+        :rtype PartialSchedule
+        :return: новое расписание с ожиданием в конце
+        """
+        return PartialSchedule(self, KIND_WAIT, 0, int(time))
+
+    def add_task(self, name, time):
+        """
+        :param int name:
+        :param int time:
+        :rtype PartialSchedule
+        :return: новое расписание с таском в конце
+        """
+        return PartialSchedule(self, KIND_TASK, name, int(time))
+
+    def items(self):
+        """
+        Элементы расписания в порядке выполнения
+
+        :rtype list[Item]
+        """
+        result = []
+        node = self
+        while node.parent is not None:
+            result.append(Task(node.name, node.time) if node.kind == KIND_TASK else Wait(node.time))
+            node = node.parent
+        result.reverse()
+        return result
+
+
 if __name__ == '__main__':
     t = Schedule([0, 1])
-    t.add_item(0, Task('a', 3))
-    t.add_item(0, Task('b', 4))
-    t.add_item(0, Task('bb', 6))
+    t.add_item(0, Task(0, 3))
+    t.add_item(0, Task(1, 4))
+    t.add_item(0, Task(2, 6))
     t.add_item(1, Wait(10))
-    t.add_item(1, Task('c', 5))
+    t.add_item(1, Task(3, 5))
     t.add_item(0, Wait(1))
     t.add_item(0, Wait(1))
     t.add_item(0, Wait(1))
     t.add_item(0, Wait(1))
-    t.add_item(0, Task('d', 10))
-    t.add_item(0, Task('e', 20))
+    t.add_item(0, Task(4, 10))
+    t.add_item(0, Task(5, 20))
     t.add_item(0, Wait(5))
     print(t.max_busy_time()); print(t.total_flow_time()); print(t)
     t.equalize_busy_time()
@@ -0,0 +1,119 @@
+"""
+Преобразование файлов параметров задач между форматами CSV и .npy и
+файлов зависимостей между списками смежности и .npz.
+
+Формат определяется по расширению файла: .npy - двоичный формат numpy с
+типом элементов TASK_PARAMETERS_DTYPE, .npz - граф зависимостей в формате
+CSR (массивы offsets и targets), остальные файлы - текстовые. Запуск:
+python -m input_output.convert [--dependencies] <исходный файл> <результирующий файл>
+"""
+
+import argparse
+import os.path
+
+import numpy as np
+
+import input_output.input as i
+from util import exit_printing_error
+
+
+def write_task_parameters_csv(task_costs, path, chunk_columns=65536):
+    """
+    Записывает матрицу времен в CSV-файл. Строки матрицы форматируются
+    частями по chunk_columns значений, чтобы не создавать в памяти строку
+    для всей матрицы сразу
+
+    :param np.matrix task_costs:
+    :param str path:
+    :param int chunk_columns:
+    """
+    task_costs = np.asarray(task_costs)
+    with open(path, 'w') as f:
+        for row in task_costs:
+            for start in range(0, len(row), chunk_columns):
+                if start:
+                    f.write(',')
+                f.write(','.join(map(str, row[start:start + chunk_columns].tolist())))
+            f.write('\n')
+
+
+def write_task_parameters_binary(task_costs, path):
+    """
+    Записывает матрицу времен в файл .npy с типом элементов TASK_PARAMETERS_DTYPE
+
+    :param np.matrix task_costs:
+    :param str path:
+    """
+    np.save(path, np.ascontiguousarray(task_costs, i.TASK_PARAMETERS_DTYPE), allow_pickle=False)
+
+
+def convert_task_parameters(source_path, destination_path):
+    """
+    :param str source_path:
+    :param str destination_path:
+    :raises InvalidTaskParameters If something's wrong in the source file
+    """
+    task_costs = i.read_task_parameters(source_path)
+    if i.is_binary_task_parameters_path(destination_path):
+        write_task_parameters_binary(task_costs, destination_path)
+    else:
+        write_task_parameters_csv(task_costs, destination_path)
+
+
+def write_task_dependencies_text(dependency_graph, path):
+    """
+    Записывает граф зависимостей в формате списков смежности
+
+    :param algorithm.dependency.DependencyGraph dependency_graph:
+    :param str path:
+    """
+    offsets = dependency_graph.offsets.tolist()
+    with open(path, 'w') as f:
+        for node in range(0, dependency_graph.node_count()):
+            successors = dependency_graph.targets[offsets[node]:offsets[node + 1]].tolist()
+            f.write(' '.join(map(str, [node] + successors)) + '\n')
+
+
+def write_task_dependencies_binary(dependency_graph, path):
+    """
+    Записывает граф зависимостей в файл .npz
+
+    :param algorithm.dependency.DependencyGraph dependency_graph:
+    :param str path:
+    """
+    np.savez(path, offsets=dependency_graph.offsets, targets=dependency_graph.targets)
+
+
+def convert_task_dependencies(source_path, destination_path):
+    """
+    :param str source_path:
+    :param str destination_path:
+    :raises InvalidTaskDependencies If something's wrong in the source file
+    """
+    dependency_graph = i.read_task_dependencies(source_path)
+    if i.is_binary_task_dependencies_path(destination_path):
+        write_task_dependencies_binary(dependency_graph, destination_path)
+    else:
+        write_task_dependencies_text(dependency_graph, destination_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts task parameter and task dependency files between '
+                                                 'text and binary formats.')
+    parser.add_argument('source_path', type=str, help='file to read')
+    parser.add_argument('destination_path', type=str,
+                        help='file to write, .npy (task parameters) or .npz (task dependencies) for binary format')
+    parser.add_argument('--dependencies', '-d', action='store_true',
+                        help='convert a task dependency file instead of a task parameter file')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.source_path):
+        exit_printing_error('Wrong source path given!')
+
+    try:
+        if args.dependencies:
+            convert_task_dependencies(args.source_path, args.destination_path)
+        else:
+            convert_task_parameters(args.source_path, args.destination_path)
+    except (i.InvalidTaskParameters, i.InvalidTaskDependencies) as e:
+        exit_printing_error(e)
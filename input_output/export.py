@@ -1,9 +1,37 @@
+"""
+Экспорт промежуточных результатов в каталог path (если он задан).
+
+Назначения подзадач сохраняются в файлы .npz отдельным потоком, чтобы
+решение не ждало записи на диск. Очередь записи ограничена
+MAX_PENDING_BUNDLES файлами; flush дожидается записи всех файлов и
+сообщает об ошибках записи. Программы вызывают flush явно перед
+завершением, вызов при выходе через atexit - только запасной вариант,
+ошибка в нём не меняет код завершения.
+"""
+
 from networkx import write_graphml, write_adjlist
+import atexit
 import os.path
+import queue
+import threading
+
+import numpy as np
+
+from classes.exception import BaseException as BException
 
 
 path = None
 
+BUNDLE_EXTENSION = '.npz'
+MAX_PENDING_BUNDLES = 16
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class ExportFailed(BException):
+    pass
+
 
 def export_graph(g, file_name):
     """
@@ -25,3 +53,94 @@ def export_dependency_graph(g, file_name):
     :return:
     """
     write_adjlist(g, os.path.join(path, file_name + '.txt'))
+
+
+class _BackgroundWriter:
+    """
+    Поток, записывающий файлы .npz из очереди
+    """
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=MAX_PENDING_BUNDLES)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='export-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            file_path, arrays = self._queue.get()
+            try:
+                np.savez_compressed(file_path, **arrays)
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+            finally:
+                self._queue.task_done()
+
+    def submit(self, file_path, arrays):
+        """
+        :param str file_path:
+        :param dict arrays: {имя: np.ndarray, ...}
+        """
+        self._queue.put((file_path, arrays))
+
+    def flush(self):
+        """
+        :raises ExportFailed If some file could not be written
+        """
+        self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise ExportFailed('Failed to export intermediate results: {}'.format(error))
+
+
+def _get_writer():
+    global _writer
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = _BackgroundWriter()
+        return _writer
+
+
+def export_assignment(file_name, task_costs, task_rows, tasks=None, solve_time_ms=None, solver=''):
+    """
+    Экспортирует подзадачу о назначениях и её решение в файл .npz с массивами
+    task_costs (матрица времен подзадачи), tasks (номер таска исходной задачи
+    для каждого столбца), assignment (строка матрицы C для каждого столбца,
+    -1, если таск не назначен), solve_time_ms и solver. Запись происходит в
+    фоновом потоке
+
+    :param str file_name:
+    :param np.matrix task_costs:
+    :param dict task_rows: {таск: строка матрицы C, ...}
+    :param list|np.ndarray|None tasks: номера тасков исходной задачи, по умолчанию 0..n-1
+    :param float|None solve_time_ms: время решения
+    :param str solver:
+    """
+    if not path:
+        return
+    _, task_count = task_costs.shape
+    assignment = np.full(task_count, -1, np.int64)
+    if task_rows:
+        assignment[list(task_rows.keys())] = list(task_rows.values())
+    arrays = {
+        'task_costs': np.array(task_costs),
+        'tasks': np.arange(task_count) if tasks is None else np.array(tasks, np.int64),
+        'assignment': assignment,
+        'solve_time_ms': np.float64(np.nan if solve_time_ms is None else solve_time_ms),
+        'solver': np.str_(solver),
+    }
+    _get_writer().submit(os.path.join(path, file_name + BUNDLE_EXTENSION), arrays)
+
+
+def flush():
+    """
+    Дожидается записи всех экспортируемых файлов
+
+    :raises ExportFailed If some file could not be written
+    """
+    if _writer is not None:
+        _writer.flush()
+
+
+atexit.register(flush)
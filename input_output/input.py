@@ -7,6 +7,8 @@ import networkx as nx
 import numpy as np
 from classes.exception import BaseException as BException
 import random
+import re
+import warnings
 
 class InvalidTaskParameters(BException):
     pass
@@ -32,28 +34,282 @@ def read_task_dependency_graph(path):
         raise InvalidTaskDependencies('Error encountered while reading task dependencies file')
 
 
-def read_task_parameters(path):
+TASK_PARAMETERS_DTYPE = np.dtype(np.uint)
+BINARY_TASK_PARAMETERS_EXTENSION = '.npy'
+INELIGIBLE_TASK_PARAMETER = '-'  # в CSV: таск нельзя выполнять на процессоре
+
+
+def is_binary_task_parameters_path(path):
+    """
+    :param str path:
+    :rtype bool
+    """
+    return path.lower().endswith(BINARY_TASK_PARAMETERS_EXTENSION)
+
+
+BINARY_TASK_DEPENDENCIES_EXTENSION = '.npz'
+
+
+def is_binary_task_dependencies_path(path):
+    """
+    :param str path:
+    :rtype bool
+    """
+    return path.lower().endswith(BINARY_TASK_DEPENDENCIES_EXTENSION)
+
+
+def read_task_dependencies(path):
+    """
+    считывает граф зависимостей в формате CSR, не создавая графа networkx.
+    Файлы с расширением .npz читаются read_task_dependencies_binary,
+    остальные считаются списками смежности и читаются read_task_dependencies_text
+
+    :param str path: file to read dependency graph from
+    :rtype algorithm.dependency.DependencyGraph
+    :raises InvalidTaskDependencies If something's wrong in the file
+    """
+    if is_binary_task_dependencies_path(path):
+        return read_task_dependencies_binary(path)
+    return read_task_dependencies_text(path)
+
+
+def _parse_adjacency_lines(lines):
+    """
+    Разбирает пачку строк списков смежности одним вызовом numpy: концы строк
+    заменяются разделителем -1 (номера вершин неотрицательны)
+
+    :param list[str] lines:
+    :rtype (np.ndarray, np.ndarray, int)
+    :return: начальные и конечные вершины рёбер, наибольший номер вершины
+    :raises InvalidTaskDependencies If something's wrong in the lines
+    """
+    text = ''.join(lines)
+    if '#' in text:
+        text = '\n'.join(line.split('#', 1)[0] for line in lines)
+    if '-' in text:
+        raise InvalidTaskDependencies('Error encountered while reading task dependencies file: '
+                                      'negative task number')
+    text = text.replace('\n', ' -1 ') + ' -1'
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        values = np.fromstring(text, np.int64, sep=' ')
+    if len(values) != len(text.split()):
+        raise InvalidTaskDependencies('Error encountered while reading task dependencies file')
+
+    breaks = np.flatnonzero(values < 0)
+    starts = np.concatenate(([0], breaks[:-1] + 1))
+    lengths = breaks - starts
+    starts, lengths = starts[lengths > 0], lengths[lengths > 0]
+    is_target = values >= 0
+    is_target[starts] = False
+    return np.repeat(values[starts], lengths - 1), values[is_target], int(values.max())
+
+
+def read_task_dependencies_text(path, chunk_size=1 << 24):
+    """
+    считывает граф зависимостей из файла списков смежности (формат
+    networkx.write_adjlist: в строке вершина и её последователи через пробел,
+    после # - комментарий). Файл разбирается пачками строк примерно по
+    chunk_size байт
+
+    :param str path: file to read dependency graph from
+    :param int chunk_size:
+    :rtype algorithm.dependency.DependencyGraph
+    :raises InvalidTaskDependencies If something's wrong in the file
+    """
+    from algorithm.dependency import DependencyGraph
+
+    sources, targets = [], []
+    node_count = 0
+    try:
+        with open(path) as f:
+            while True:
+                lines = f.readlines(chunk_size)
+                if not lines:
+                    break
+                chunk_sources, chunk_targets, max_node = _parse_adjacency_lines(lines)
+                node_count = max(node_count, max_node + 1)
+                sources.append(chunk_sources)
+                targets.append(chunk_targets)
+    except InvalidTaskDependencies:
+        raise
+    except:
+        raise InvalidTaskDependencies('Error encountered while reading task dependencies file')
+    if not sources:
+        return DependencyGraph.from_edges(0, [], [])
+    return DependencyGraph.from_edges(node_count, np.concatenate(sources), np.concatenate(targets))
+
+
+def read_task_dependencies_binary(path):
     """
-    считывает матрицу времен возвращает двумерный массив
+    считывает граф зависимостей из файла .npz с массивами offsets и targets
+
+    :param str path: .npz file to read dependency graph from
+    :rtype algorithm.dependency.DependencyGraph
+    :raises InvalidTaskDependencies If something's wrong in the file
+    """
+    from algorithm.dependency import DependencyGraph
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            offsets, targets = data['offsets'], data['targets']
+    except:
+        raise InvalidTaskDependencies('Error encountered while reading task dependencies file')
+    node_count = len(offsets) - 1
+    if (offsets.ndim != 1 or targets.ndim != 1 or node_count < 0 or offsets[0] != 0 or
+            offsets[-1] != len(targets) or np.any(np.diff(offsets) < 0) or
+            (len(targets) and (targets.min() < 0 or targets.max() >= node_count))):
+        raise InvalidTaskDependencies('Error encountered while reading task dependencies file: invalid CSR arrays')
+    return DependencyGraph(offsets, targets)
+
+
+def read_task_parameters(path, with_eligibility=False):
+    """
+    считывает матрицу времен возвращает двумерный массив.
+    Файлы с расширением .npy читаются read_task_parameters_binary, остальные
+    считаются CSV и читаются read_task_parameters_csv
+    :param str path: file to read task parameters from
+    :param bool with_eligibility: разрешить ли пропуски в CSV (см. read_task_parameters_csv)
+    :rtype np.matrix|(np.matrix, np.ndarray|None)
+    :return: task parameters matrix, при with_eligibility - пара (матрица,
+        матрица допустимости либо None, если пропусков нет)
+    :raises InvalidTaskParameters If something's wrong in the file
+    """
+    if is_binary_task_parameters_path(path):
+        task_costs = read_task_parameters_binary(path)
+        return (task_costs, None) if with_eligibility else task_costs
+    return read_task_parameters_csv(path, with_eligibility)
+
+
+def _iterate_csv_rows(f):
+    """
+    Непустые строки CSV-файла
+    :param f: file object
+    :return: iterator
+    """
+    return (row for row in f if row.strip() != '')
+
+
+# строка CSV из неотрицательных чисел, которые заведомо помещаются в int64:
+# такие строки разбираются np.fromstring, остальные - построчно int()
+PLAIN_CSV_ROW = re.compile(r'\s*\d{1,18}\s*(?:,\s*\d{1,18}\s*)*\Z')
+
+
+def _parse_row(row, column_count, index, with_eligibility):
+    """
+    Разбирает строку CSV с проверкой каждого значения. При with_eligibility
+    пустое значение либо INELIGIBLE_TASK_PARAMETER означает, что таск нельзя
+    выполнять на процессоре
+    :param str row:
+    :param int column_count:
+    :param int index: номер строки
+    :param bool with_eligibility: разрешены ли пропуски
+    :rtype (np.ndarray, list[bool]|None)
+    :return: времена (0 для пропусков) и допустимость либо None, если пропусков нет
+    :raises InvalidTaskParameters If some value is missing, invalid or too large
+    """
+    cells = [cell.strip() for cell in row.split(',')]
+    if len(cells) != column_count:
+        raise InvalidTaskParameters('Error encountered while reading task parameters file: '
+                                    'wrong value count in row {}'.format(index + 1))
+    eligible = [cell not in ('', INELIGIBLE_TASK_PARAMETER) for cell in cells]
+    if not with_eligibility and not all(eligible):
+        raise InvalidTaskParameters('Error encountered while reading task parameters file: '
+                                    'missing value in row {}'.format(index + 1))
+    try:
+        values = np.array([int(cell) if cell_eligible else 0 for cell, cell_eligible in zip(cells, eligible)],
+                          np.int64)
+    except ValueError:
+        raise InvalidTaskParameters('Error encountered while reading task parameters file: '
+                                    'invalid value in row {}'.format(index + 1))
+    except OverflowError:
+        raise InvalidTaskParameters('Error encountered while reading task parameters file: '
+                                    'too large value in row {}'.format(index + 1))
+    return values, None if all(eligible) else eligible
+
+
+def read_task_parameters_csv(path, with_eligibility=False):
+    """
+    считывает матрицу времен из CSV-файла. Файл читается дважды: сначала
+    определяются размеры матрицы, затем каждая строка разбирается numpy
+    сразу в заранее выделенный массив, поэтому в памяти одновременно
+    находятся только результат и одна строка файла. Строки из небольших
+    неотрицательных чисел разбираются numpy, остальные проверяются
+    поштучно, так что неверные и слишком большие значения не пропускаются.
+    При with_eligibility значения могут быть пропущены (пустые либо
+    INELIGIBLE_TASK_PARAMETER): таск нельзя выполнять на этом процессоре
     :param str path: CSV-formatted file to read task parameters from
+    :param bool with_eligibility: разрешить ли пропуски
+    :rtype np.matrix|(np.matrix, np.ndarray|None)
+    :return: task parameters matrix, при with_eligibility - пара (матрица,
+        булева матрица допустимости либо None, если пропусков нет)
+    :raises InvalidTaskParameters If something's wrong in the file
+    """
+    eligibility = None
+    try:
+        with open(path) as f:
+            row_count = 0
+            column_count = 0
+            for row in _iterate_csv_rows(f):
+                if row_count == 0:
+                    column_count = row.count(',') + 1
+                row_count += 1
+            if row_count == 0:
+                raise InvalidTaskParameters('Error encountered while reading task parameters file: no data')
+
+            result = np.empty((row_count, column_count), TASK_PARAMETERS_DTYPE)
+            f.seek(0)
+            for index, row in enumerate(_iterate_csv_rows(f)):
+                values = None
+                if PLAIN_CSV_ROW.match(row) and row.count(',') + 1 == column_count:
+                    # np.fromstring не сообщает об ошибках, поэтому ему достаются только проверенные строки
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', DeprecationWarning)
+                        values = np.fromstring(row, np.int64, sep=',')
+                if values is None or len(values) != column_count:
+                    values, row_eligibility = _parse_row(row, column_count, index, with_eligibility)
+                    if row_eligibility is not None:
+                        if eligibility is None:
+                            eligibility = np.ones((row_count, column_count), bool)
+                        eligibility[index] = row_eligibility
+                if np.any(values < 0):
+                    raise InvalidTaskParameters(
+                            'Error encountered while reading task parameters file: negative task time')
+                result[index] = values
+    except InvalidTaskParameters:
+        raise
+    except ValueError as e:
+        raise InvalidTaskParameters('Error encountered while reading task parameters file: ' + str(e))
+    except:
+        raise InvalidTaskParameters('Error encountered while reading task parameters file')
+    if with_eligibility:
+        return np.asmatrix(result), eligibility
+    return np.asmatrix(result)
+
+
+def read_task_parameters_binary(path, mmap=True):
+    """
+    считывает матрицу времен из файла .npy. Если тип элементов в файле
+    совпадает с TASK_PARAMETERS_DTYPE, то при mmap=True файл отображается в
+    память и не копируется
+    :param str path: .npy file to read task parameters from
+    :param bool mmap: отображать ли файл в память (только для чтения)
     :rtype np.matrix
     :return: task parameters matrix
     :raises InvalidTaskParameters If something's wrong in the file
     """
-    with open(path) as f:
-        try:
-            result = [
-                [int(x.strip()) for x in row.split(',')]
-                for row in f if row.strip() != ''
-            ]
-        except ValueError as e:
-            raise InvalidTaskParameters('Error encountered while reading task parameters file: ' + str(e))
-        except:
-            raise InvalidTaskParameters('Error encountered while reading task parameters file')
     try:
-        return np.matrix(result, np.uint)
+        result = np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
     except:
         raise InvalidTaskParameters('Error encountered while reading task parameters file')
+    if result.ndim != 2 or not np.issubdtype(result.dtype, np.integer) or not result.size:
+        raise InvalidTaskParameters('Error encountered while reading task parameters file: '
+                                    'a non-empty 2D integer array expected')
+    if result.dtype != TASK_PARAMETERS_DTYPE:
+        if np.any(result < 0):
+            raise InvalidTaskParameters('Error encountered while reading task parameters file: negative task time')
+        result = result.astype(TASK_PARAMETERS_DTYPE)
+    return np.asmatrix(result)
 
 
 def random_dependency_graph(tasks, level_count, max_tasks_on_level):
@@ -2,6 +2,8 @@
 Функционал вывода данных (на экран либо в картинку)
 """
 
+import os.path
+
 import numpy as np
 import networkx as nx
 import util as u
@@ -17,7 +19,7 @@ def write_graph(graph, path):
 
 def write_dependency_graph(g):
     """
-    :param networkx.DiGraph g:
+    :param networkx.DiGraph|algorithm.dependency.DependencyIndex g:
     :return:
     """
     from algorithm.dependency import iterate_levels
@@ -52,12 +54,143 @@ def write_schedule(schedule, path=None):
         print(message)
 
 
-def draw_schedule(schedule, path):
+# размеры изображения: ширина фиксирована, высота растёт с числом процессоров
+FIGURE_WIDTH_INCHES = 30
+FIGURE_MINIMUM_HEIGHT_INCHES = 6
+FIGURE_MAXIMUM_HEIGHT_INCHES = 60
+PROCESSOR_HEIGHT_INCHES = 0.4
+FIGURE_DPI = 100
+
+MAX_TIME_TICKS = 40  # основных делений по оси времени
+MAX_MINOR_TIME_TICKS = 500  # при большем интервале дополнительные деления не по каждой единице времени
+MAX_PROCESSOR_TICKS = 50
+MAX_LABELS = 2000
+LABEL_CHAR_WIDTH_PIXELS = 8
+
+TASK_COLOR = 'yellow'
+MERGED_TASKS_COLOR = 'orange'
+
+
+def _merge_small_intervals(starts, finishes, pixel_time):
+    """
+    Объединяет подряд идущие интервалы короче пикселя, между которыми меньше
+    пикселя, в один интервал
+
+    :param np.ndarray starts:
+    :param np.ndarray finishes:
+    :param float pixel_time: время, соответствующее одному пикселю
+    :rtype (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+    :return: начала, концы, номер первого исходного интервала, признак
+        того, что интервал не объединённый
+    """
+    small = finishes - starts < pixel_time
+    group_first = np.ones(len(starts), bool)
+    group_first[1:] = ~(small[1:] & small[:-1] & (starts[1:] - finishes[:-1] < pixel_time))
+    first = np.flatnonzero(group_first)
+    last = np.append(first[1:], len(starts)) - 1
+    return starts[first], finishes[last], first, first == last
+
+
+def _draw_schedule_part(ax, task_interval_arrays, time_from, time_to, pixel_time):
+    """
+    Рисует часть расписания в интервале времени [time_from, time_to] одной
+    коллекцией прямоугольников. Интервалы короче пикселя объединяются,
+    подписи ставятся только тем таскам, в которые они помещаются
+
+    :param ax:
+    :param dict task_interval_arrays: см. Schedule.get_task_interval_arrays
+    :param float time_from:
+    :param float time_to:
+    :param float pixel_time:
+    """
+    from matplotlib.collections import PolyCollection
+
+    all_vertices, all_colors, all_line_widths = [], [], []
+    labels = []  # (ширина в пикселях, x, y, текст)
+    for processor, (names, starts, finishes) in task_interval_arrays.items():
+        visible = (finishes > time_from) & (starts < time_to)
+        names, starts, finishes = names[visible], starts[visible], finishes[visible]
+        if not len(starts):
+            continue
+        starts, finishes, first, single = _merge_small_intervals(starts, finishes, pixel_time)
+        vertices = np.empty((len(starts), 4, 2))
+        vertices[:, (0, 1), 0] = starts[:, None]
+        vertices[:, (2, 3), 0] = finishes[:, None]
+        vertices[:, (0, 3), 1] = processor
+        vertices[:, (1, 2), 1] = processor + 1
+        all_vertices.append(vertices)
+        all_colors.append(np.where(single, TASK_COLOR, MERGED_TASKS_COLOR))
+        widths = (finishes - starts) / pixel_time
+        # у узких прямоугольников рамка закрыла бы заливку
+        all_line_widths.append(np.where(widths >= 3, 1., 0.))
+
+        names = names[first].tolist()
+        for index in np.flatnonzero(single & (widths >= LABEL_CHAR_WIDTH_PIXELS)).tolist():
+            name = str(names[index])
+            if widths[index] >= LABEL_CHAR_WIDTH_PIXELS * (len(name) + 1):
+                labels.append((widths[index], (starts[index] + finishes[index]) / 2., processor + 0.5, name))
+
+    if all_vertices:
+        ax.add_collection(PolyCollection(np.concatenate(all_vertices), facecolors=np.concatenate(all_colors),
+                                         edgecolors='black', linewidths=np.concatenate(all_line_widths)))
+    if len(labels) > MAX_LABELS:
+        labels.sort(key=lambda label: -label[0])
+        del labels[MAX_LABELS:]
+    for _, x, y, text in labels:
+        ax.text(x, y, text, verticalalignment='center', horizontalalignment='center', clip_on=True)
+
+
+def _set_axes(ax, processors, time_from, time_to):
+    """
+    Оси и деления, количество делений ограничено
+
+    :param ax:
+    :param list processors:
+    :param float time_from:
+    :param float time_to:
+    """
+    from matplotlib.ticker import AutoMinorLocator, MaxNLocator, MultipleLocator
+
+    ax.set_xlabel('time')
+    step = -(-len(processors) // MAX_PROCESSOR_TICKS)
+    tick_processors = processors[::step]
+    ax.set_yticks([p + 0.5 for p in tick_processors])
+    ax.set_yticklabels(['$P_{{{}}}$'.format(p) for p in tick_processors])
+    ax.set_ylim(len(processors), 0)
+    ax.set_xlim(time_from, time_to)
+    ax.xaxis.set_major_locator(MaxNLocator(nbins=MAX_TIME_TICKS, integer=True))
+    if time_to - time_from <= MAX_MINOR_TIME_TICKS:
+        ax.xaxis.set_minor_locator(MultipleLocator(1))
+    else:
+        ax.xaxis.set_minor_locator(AutoMinorLocator())
+    ax.grid(True, axis='x', which='both')
+
+
+def get_tile_paths(path, tile_count):
+    """
+    Имена файлов частей изображения: schedule.png -> schedule_0.png, ...
+
+    :param str path:
+    :param int tile_count:
+    :rtype list[str]
+    """
+    if tile_count == 1:
+        return [path]
+    root, extension = os.path.splitext(path)
+    return ['{}_{}{}'.format(root, tile, extension) for tile in range(0, tile_count)]
+
+
+def draw_schedule(schedule, path, tile_count=1):
     """
-    Сохраняет изображение для заданного расписания
+    Сохраняет изображение для заданного расписания. Формат определяется
+    расширением path (например, .png или .svg). При tile_count > 1 время
+    делится на tile_count равных частей, каждая сохраняется в свой файл
+    (см. get_tile_paths) с подробностью, соответствующей её масштабу
 
     :param classes.schedule.Schedule schedule:
     :param str path:
+    :param int tile_count: количество частей изображения, не больше времени
+        выполнения расписания
     :return:
     """
     import matplotlib.pyplot as plt
@@ -66,33 +199,28 @@ def draw_schedule(schedule, path):
         import matplotlib
         matplotlib.use('tkagg')
 
-    fig, ax = plt.subplots()
-    fig.set_size_inches(30, 6)
-
-    ax.set_xlabel('time')
-
     sorted_processors = sorted(schedule.get_processors())
-    proc_count = len(sorted_processors)
-
-    tick_data = [(p + 0.5, '$P_{}$'.format(p)) for p in sorted_processors]
-    plt.yticks(*zip(*tick_data))
-    ax.set_ylim(proc_count, 0)
-    max_busy_time = schedule.max_busy_time()
-    ax.set_xlim(0, max_busy_time)
-    ax.xaxis.set_ticks(range(0, max_busy_time), minor=True)
-    ax.grid(True, axis='x', which='both')
+    height = min(max(len(sorted_processors) * PROCESSOR_HEIGHT_INCHES, FIGURE_MINIMUM_HEIGHT_INCHES),
+                 FIGURE_MAXIMUM_HEIGHT_INCHES)
+    max_busy_time = max(schedule.max_busy_time(), 1)
+    task_interval_arrays = schedule.get_task_interval_arrays()
+    tile_count = min(tile_count, max_busy_time)
+
+    for tile, tile_path in enumerate(get_tile_paths(path, tile_count)):
+        time_from = max_busy_time * tile / tile_count
+        time_to = max_busy_time * (tile + 1) / tile_count
+        fig, ax = plt.subplots()
+        fig.set_size_inches(FIGURE_WIDTH_INCHES, height)
+        _set_axes(ax, sorted_processors, time_from, time_to)
+        pixel_time = (time_to - time_from) / max(ax.get_window_extent().width * FIGURE_DPI / fig.dpi, 1.)
+        _draw_schedule_part(ax, task_interval_arrays, time_from, time_to, pixel_time)
+
+        # plt.tight_layout()
+        fig.savefig(tile_path, dpi=FIGURE_DPI)
+        if u.is_windows():
+            plt.show()
+        plt.close(fig)
 
-    for processor, task_intervals in schedule.get_task_intervals().items():
-        for task_name, task_start, task_finish in task_intervals:
-            plt.broken_barh([(task_start, task_finish - task_start)], (processor, 1),
-                            linestyle='solid', edgecolor='black', facecolor='yellow')
-            plt.text(task_start + 0.5, processor + 0.5, task_name,
-                     verticalalignment='center', horizontalalignment='center')
-
-    # plt.tight_layout()
-    plt.savefig(path)
-    if u.is_windows():
-        plt.show()
 
 if __name__ == '__main__':
     from classes.schedule import Schedule
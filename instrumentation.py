@@ -0,0 +1,235 @@
+"""
+Замеры этапов работы алгоритмов.
+
+Алгоритмы отмечают этапы (span) и счётчики (count), события передаются всем
+подключённым приёмникам (sink). Пока ни одного приёмника не подключено,
+span возвращает общий пустой контекстный менеджер, а count сразу
+возвращается, поэтому замеры почти ничего не стоят. События из процессов-
+исполнителей (algorithm.dependent_schedule с processes > 1) собираются там
+в collecting() и передаются приёмникам основного процесса через replay.
+
+Подключение приёмников и передача событий защищены общей блокировкой, так
+что события из нескольких потоков (algorithm.jobs, service) приёмники
+получают по одному и sink.handle можно не делать потокобезопасным.
+
+Событие - словарь:
+{'type': 'span', 'name': ..., 'duration_ms': ..., 'tags': {...}} либо
+{'type': 'counter', 'name': ..., 'value': ..., 'tags': {...}}
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+
+from util import default_timer
+
+_sinks = []
+_lock = threading.RLock()
+
+
+def add_sink(sink):
+    """
+    Подключает приёмник событий
+
+    :param Sink sink:
+    :return: sink
+    """
+    global _sinks
+    with _lock:
+        _sinks = _sinks + [sink]
+    return sink
+
+
+def remove_sink(sink):
+    """
+    :param Sink sink:
+    """
+    global _sinks
+    with _lock:
+        sinks = list(_sinks)
+        sinks.remove(sink)
+        _sinks = sinks
+
+
+def is_enabled():
+    """
+    :rtype bool
+    """
+    return bool(_sinks)
+
+
+def _emit(event):
+    with _lock:
+        for sink in _sinks:
+            sink.handle(event)
+
+
+def replay(events):
+    """
+    Передаёт подключённым приёмникам события, собранные в другом процессе
+
+    :param list events:
+    """
+    for event in events:
+        _emit(event)
+
+
+@contextmanager
+def collecting():
+    """
+    Контекстный менеджер для процесса-исполнителя: на время блока
+    приёмники (в том числе унаследованные от основного процесса) заменяются
+    одним ListSink, который и возвращается
+    """
+    global _sinks
+    sink = ListSink()
+    with _lock:
+        sinks = _sinks
+        _sinks = [sink]
+    try:
+        yield sink
+    finally:
+        with _lock:
+            _sinks = sinks
+
+
+class _Span:
+    __slots__ = ('name', 'tags', 'start_time')
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        _emit({'type': 'span', 'name': self.name, 'duration_ms': (default_timer() - self.start_time) * 1000.,
+               'tags': self.tags})
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **tags):
+    """
+    Контекстный менеджер, замеряющий время выполнения этапа:
+    with instrumentation.span('schedule.flow_solve', level=2): ...
+
+    :param str name:
+    """
+    if not _sinks:
+        return _NULL_SPAN
+    return _Span(name, tags)
+
+
+def count(name, value=1, **tags):
+    """
+    Увеличивает счётчик. В циклах значение лучше накапливать и передавать
+    один раз после цикла
+
+    :param str name:
+    :param int value:
+    """
+    if _sinks:
+        _emit({'type': 'counter', 'name': name, 'value': value, 'tags': tags})
+
+
+class Sink:
+    """
+    Базовый класс приёмника событий
+    """
+    def handle(self, event):
+        """
+        :param dict event:
+        """
+        raise NotImplementedError()
+
+
+class CallbackSink(Sink):
+    """
+    Передаёт каждое событие функции
+    """
+    def __init__(self, callback):
+        """
+        :param callable callback: функция от события
+        """
+        self.callback = callback
+
+    def handle(self, event):
+        self.callback(event)
+
+
+class ListSink(Sink):
+    """
+    Сохраняет события в списке events
+    """
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event):
+        self.events.append(event)
+
+
+class JsonLogSink(Sink):
+    """
+    Пишет каждое событие отдельной строкой JSON
+    """
+    def __init__(self, f):
+        """
+        :param f: file object, открытый на запись
+        """
+        self.file = f
+
+    def handle(self, event):
+        self.file.write(json.dumps(event, sort_keys=True) + '\n')
+
+
+class SummarySink(Sink):
+    """
+    Накапливает по каждому этапу количество, суммарное и наибольшее время,
+    по каждому счётчику - сумму. Теги не учитываются
+    """
+    def __init__(self):
+        self.spans = {}  # имя -> [количество, суммарное время, наибольшее время]
+        self.counters = {}  # имя -> сумма
+
+    def handle(self, event):
+        name = event['name']
+        if event['type'] == 'span':
+            stats = self.spans.setdefault(name, [0, 0., 0.])
+            stats[0] += 1
+            stats[1] += event['duration_ms']
+            stats[2] = max(stats[2], event['duration_ms'])
+        else:
+            self.counters[name] = self.counters.get(name, 0) + event['value']
+
+    def table(self):
+        """
+        :rtype str
+        :return: таблица с итогами
+        """
+        rows = ['{:<45} {:>8} {:>12} {:>12}'.format('span', 'count', 'total', 'max')]
+        for name, (span_count, total, maximum) in sorted(self.spans.items()):
+            rows.append('{:<45} {:>8} {:>9.3f} ms {:>9.3f} ms'.format(name, span_count, total, maximum))
+        if self.counters:
+            rows.append('{:<45} {:>8}'.format('counter', 'value'))
+            for name, value in sorted(self.counters.items()):
+                rows.append('{:<45} {:>8}'.format(name, value))
+        return '\n'.join(rows)
+
+    def __str__(self, *args, **kwargs):
+        return self.table()
@@ -1,15 +1,23 @@
 import argparse
 import os.path
 
+import algorithm.schedule as asc
 import input_output.export as export
+import instrumentation
 import util
 import input_output.input as i
 from input_output.visualization import draw_schedule
 from input_output.visualization import write_schedule
 from util import exit_printing_error
 
-SCHEDULE_IMAGE_NAME = 'schedule.png'
-SCHEDULE_OPTIMIZED_IMAGE_NAME = 'schedule_opt.png'
+SCHEDULE_IMAGE_NAME = 'schedule'
+SCHEDULE_OPTIMIZED_IMAGE_NAME = 'schedule_opt'
+SCHEDULE_LIST_IMAGE_NAME = 'schedule_list'
+IMAGE_FORMATS = ('png', 'svg')
+METRICS_FILE_NAME = 'metrics.jsonl'
+
+METRICS_SUMMARY = 'summary'
+METRICS_JSON = 'json'
 
 DEFAULT_TASKS_TO_GENERATE = 100
 DEFAULT_PROCESSORS_TO_GENERATE = 5
@@ -20,8 +28,10 @@ TASK_DEPENDENCY_LEVELS_TO_GENERATE = 6
 # get and validate command line parameters
 
 parser = argparse.ArgumentParser(description='Gets optimal schedules.')
-parser.add_argument('--task-parameter-path', '-p', type=str, help='path to the task configuration file')
-parser.add_argument('--task-dependency-path', '-d', type=str, help='path to the task dependency file')
+parser.add_argument('--task-parameter-path', '-p', type=str,
+                    help='path to the task configuration file (CSV, or .npy for binary format)')
+parser.add_argument('--task-dependency-path', '-d', type=str,
+                    help='path to the task dependency file (adjacency list, or .npz for binary format)')
 parser.add_argument('--randomize-dependency', '-z', type=bool, nargs='?', const=True, default=False)
 
 parser.add_argument('--tasks-to-generate', '-n', type=int, default=DEFAULT_TASKS_TO_GENERATE,
@@ -29,6 +39,35 @@ parser.add_argument('--tasks-to-generate', '-n', type=int, default=DEFAULT_TASKS
 parser.add_argument('--processors-to-generate', '-m', type=int, default=DEFAULT_PROCESSORS_TO_GENERATE,
                     help='number of processors to randomly generate')
 
+parser.add_argument('--solver', '-s', type=str, choices=asc.SOLVERS, default=None,
+                    help='algorithm used to solve independent task assignment problems (default: {}, '
+                         'with --time-budget: {})'.format(asc.DEFAULT_SOLVER, asc.DEFAULT_DEADLINE_SOLVER))
+
+parser.add_argument('--processes', '-j', type=int, default=1,
+                    help='number of processes to solve dependency levels in parallel with')
+
+parser.add_argument('--cache', '-c', type=bool, nargs='?', const=True, default=False,
+                    help='should solutions of assignment subproblems be cached')
+parser.add_argument('--cache-path', type=str, default=None,
+                    help='directory to store cached solutions in (implies --cache)')
+
+parser.add_argument('--packing-node-limit', type=int, default=None,
+                    help='maximum number of search nodes when packing tasks into idle time of a processor')
+parser.add_argument('--packing-time-limit', type=float, default=None,
+                    help='maximum search time in seconds when packing tasks into idle time of a processor')
+
+parser.add_argument('--time-budget', '-b', type=float, default=None,
+                    help='time limit in seconds for each method; when it is exceeded the best schedule found is used')
+
+parser.add_argument('--metrics', type=str, choices=[METRICS_SUMMARY, METRICS_JSON], default=None,
+                    help='collect per-phase timings and counters: print a summary at the end or write them '
+                         'as JSON lines to {} in the results path'.format(METRICS_FILE_NAME))
+
+parser.add_argument('--image-format', type=str, choices=IMAGE_FORMATS, default=IMAGE_FORMATS[0],
+                    help='format of the resulting schedule images')
+parser.add_argument('--image-tiles', type=int, default=1,
+                    help='split each schedule image along the time axis into this many files')
+
 parser.add_argument('--intermediate-results', '-i', type=bool, nargs='?', const=True, default=False,
                     help='should intermediate results be exported to files')
 parser.add_argument('--results-path', '-r', type=str, default='.',
@@ -45,14 +84,66 @@ if args.task_dependency_path and not os.path.isfile(args.task_dependency_path):
 if not os.path.isdir(args.results_path):
     exit_printing_error('Wrong results path given!')
 
+if args.processes < 1:
+    exit_printing_error('Wrong processes number given!')
+
+if args.cache_path and not os.path.isdir(args.cache_path):
+    exit_printing_error('Wrong cache path given!')
+
+if args.packing_node_limit is not None and args.packing_node_limit < 1:
+    exit_printing_error('Wrong packing node limit given!')
+
+if args.packing_time_limit is not None and args.packing_time_limit <= 0:
+    exit_printing_error('Wrong packing time limit given!')
+
+if args.time_budget is not None and args.time_budget <= 0:
+    exit_printing_error('Wrong time budget given!')
+
+# решатель flow не прерывается, с ограничением времени нужен решатель, проверяющий его во время решения
+if args.solver is None:
+    args.solver = asc.DEFAULT_DEADLINE_SOLVER if args.time_budget else asc.DEFAULT_SOLVER
+elif args.time_budget and args.solver not in asc.DEADLINE_SOLVERS:
+    exit_printing_error('Solver {} can not be interrupted, use one of {} with --time-budget'.format(
+            args.solver, ', '.join(asc.DEADLINE_SOLVERS)))
+
+if args.image_tiles < 1:
+    exit_printing_error('Wrong image tile number given!')
+
 # main logic
 
+
+def create_deadline():
+    return util.Deadline(args.time_budget) if args.time_budget else None
+
+
+def write_optimality(schedule):
+    if not schedule.is_optimal:
+        print('Search stopped by a time or node limit, the schedule is not proven optimal')
+
+
+def save_schedule_image(schedule, image_name):
+    draw_schedule(schedule, os.path.join(args.results_path, '{}.{}'.format(image_name, args.image_format)),
+                  args.image_tiles)
+
+
 export.path = args.results_path
 
+metrics_sink = None
+if args.metrics == METRICS_SUMMARY:
+    metrics_sink = instrumentation.add_sink(instrumentation.SummarySink())
+elif args.metrics == METRICS_JSON:
+    metrics_sink = instrumentation.add_sink(
+            instrumentation.JsonLogSink(open(os.path.join(args.results_path, METRICS_FILE_NAME), 'w')))
+
+solution_cache = None
+if args.cache or args.cache_path:
+    from algorithm.cache import SolutionCache
+    solution_cache = SolutionCache(path=args.cache_path)
+
 # read or generate task parameters:
 if args.task_parameter_path:
     try:
-        task_costs = i.read_task_parameters(args.task_parameter_path)
+        task_costs, eligibility = i.read_task_parameters(args.task_parameter_path, with_eligibility=True)
     except i.InvalidTaskParameters as e:
         exit_printing_error(e)
 else:
@@ -60,18 +151,29 @@ else:
         exit_printing_error('Wrong tasks or processors number to generate given!')
     task_costs = i.random_task_parameters(
             args.processors_to_generate, args.tasks_to_generate, MAXIMUM_TASK_TIME_TO_GENERATE)
+    eligibility = None
+
+try:
+    eligibility = asc.check_eligibility(task_costs, eligibility)
+except asc.NoEligibleProcessor as e:
+    exit_printing_error(e)
 
 if args.task_dependency_path or args.randomize_dependency:
     from input_output.input import read_task_dependency_graph
+    from algorithm.dependency import DependencyGraph, DependencyIndex, NotDirectedAcyclicGraph
     import algorithm.dependent_schedule as ads
     import algorithm.optimized_dependent_schedule as aods
+    import algorithm.list_schedule as als
     from input_output.visualization import write_dependency_graph
     print("Task dependencies given")
 
     # read or generate task dependencies
     if args.task_dependency_path:
         try:
-            task_dependencies = read_task_dependency_graph(args.task_dependency_path)
+            if i.is_binary_task_dependencies_path(args.task_dependency_path):
+                task_dependencies = i.read_task_dependencies(args.task_dependency_path)
+            else:
+                task_dependencies = read_task_dependency_graph(args.task_dependency_path)
         except i.InvalidTaskDependencies as e:
             exit_printing_error(e)
     else:
@@ -87,33 +189,73 @@ if args.task_dependency_path or args.randomize_dependency:
     if error:
         exit_printing_error("Dependency graph validation error: {}".format(error))
 
-    write_dependency_graph(task_dependencies)
+    # индекс графа зависимостей строится один раз и используется всеми алгоритмами
+    try:
+        dependency_index = DependencyIndex(task_dependencies)
+    except NotDirectedAcyclicGraph:
+        exit_printing_error('Dependency graph is not a directed acyclic graph')
+
+    write_dependency_graph(dependency_index)
     if args.intermediate_results:
-        export.export_graph(task_dependencies, 'dependency_graph')
-        export.export_dependency_graph(task_dependencies, 'dependency_graph')
+        dependency_graph = task_dependencies
+        if isinstance(dependency_graph, DependencyGraph):
+            dependency_graph = dependency_graph.to_networkx()
+        export.export_graph(dependency_graph, 'dependency_graph')
+        export.export_dependency_graph(dependency_graph, 'dependency_graph')
 
     try:
         t0 = util.default_timer()
-        schedule = ads.get_optimal_schedule(task_costs, task_dependencies)
+        schedule = ads.get_optimal_schedule(task_costs, dependency_index, args.intermediate_results,
+                                            solver=args.solver, cache=solution_cache,
+                                            processes=args.processes, deadline=create_deadline(),
+                                            eligibility=eligibility)
         dt = util.default_timer() - t0
-    except ads.NoOptimalSchedule as e:
+    except (ads.NoOptimalSchedule, export.ExportFailed) as e:
         exit_printing_error(e)
     print('\nStaged method (took {0:.3f} ms to finish):'.format(dt * 1000.))
     write_schedule(schedule)
-    draw_schedule(schedule, os.path.join(args.results_path, SCHEDULE_IMAGE_NAME))
+    write_optimality(schedule)
+    save_schedule_image(schedule, SCHEDULE_IMAGE_NAME)
 
     try:
         t0 = util.default_timer()
-        schedule = aods.get_optimal_schedule(task_costs, task_dependencies)
+        schedule = aods.get_optimal_schedule(task_costs, dependency_index, args.intermediate_results,
+                                             export_file_name_prefix='optimized_',
+                                             solver=args.solver, cache=solution_cache,
+                                             node_limit=args.packing_node_limit,
+                                             time_limit=args.packing_time_limit, deadline=create_deadline(),
+                                             eligibility=eligibility)
         dt = util.default_timer() - t0
     except aods.NoOptimalSchedule as e:
         exit_printing_error(e)
     print('\nStaged method with packing optimization (took {0:.3f} ms to finish):'.format(dt * 1000.))
     write_schedule(schedule)
-    draw_schedule(schedule, os.path.join(args.results_path, SCHEDULE_OPTIMIZED_IMAGE_NAME))
+    write_optimality(schedule)
+    save_schedule_image(schedule, SCHEDULE_OPTIMIZED_IMAGE_NAME)
+
+    t0 = util.default_timer()
+    schedule = als.get_schedule(task_costs, dependency_index, eligibility)
+    dt = util.default_timer() - t0
+    print('\nList scheduling (HEFT) (took {0:.3f} ms to finish):'.format(dt * 1000.))
+    write_schedule(schedule)
+    save_schedule_image(schedule, SCHEDULE_LIST_IMAGE_NAME)
 else:
-    import algorithm.schedule as asc
     print("No task dependencies")
-    schedule = asc.get_optimal_schedule(task_costs)
+    schedule = asc.get_optimal_schedule(task_costs, args.intermediate_results, solver=args.solver,
+                                        cache=solution_cache, deadline=create_deadline(), eligibility=eligibility)
     write_schedule(schedule)
-    draw_schedule(schedule, os.path.join(args.results_path, SCHEDULE_IMAGE_NAME))
+    write_optimality(schedule)
+    save_schedule_image(schedule, SCHEDULE_IMAGE_NAME)
+
+try:
+    export.flush()
+except export.ExportFailed as e:
+    exit_printing_error(e)
+
+if solution_cache is not None:
+    print(solution_cache)
+
+if isinstance(metrics_sink, instrumentation.SummarySink):
+    print(metrics_sink)
+elif metrics_sink is not None:
+    metrics_sink.file.close()
@@ -0,0 +1,451 @@
+"""
+Сервис составления расписаний.
+
+Процесс держит пул заранее запущенных процессов-исполнителей, в которых уже
+импортированы решатели, и принимает задачи по HTTP на localhost либо через
+Unix-сокет. Запросы:
+
+POST /schedule - тело запроса JSON:
+    {"task_costs": [[...], ...],          матрица времен m x n
+     "dependencies": [[u, v], ...],       необязательно, рёбра графа зависимостей
+     "method": "staged",                  для зависимых задач: staged, optimized или list
+     "solver": "flow",                    один из algorithm.schedule.SOLVERS; при ограничении
+                                          времени - из DEADLINE_SOLVERS, по умолчанию hungarian
+     "time_budget": 1.5}                  необязательно, ограничение времени в секундах
+    ответ - расписание (см. schedule_to_json)
+GET /health - состояние сервиса
+
+Одновременно принимается не больше processes + queue_size задач, при
+переполнении сервис сразу отвечает 503 с заголовком Retry-After, не
+накапливая очередь. Запуск:
+python service.py [--port 8080 | --unix-socket <путь>] [-j N] [--queue-size Q]
+"""
+
+import argparse
+import json
+import os
+import stat
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import util
+import algorithm.schedule as asc
+from classes.exception import BaseException as BException
+from util import exit_printing_error
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_QUEUE_SIZE = 16
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+RETRY_AFTER_SECONDS = 1
+
+METHOD_STAGED = 'staged'  # algorithm.dependent_schedule
+METHOD_OPTIMIZED = 'optimized'  # algorithm.optimized_dependent_schedule
+METHOD_LIST = 'list'  # algorithm.list_schedule
+METHODS = (METHOD_STAGED, METHOD_OPTIMIZED, METHOD_LIST)
+
+
+class InvalidRequest(BException):
+    pass
+
+
+class Overloaded(BException):
+    pass
+
+
+class WorkersUnavailable(BException):
+    pass
+
+
+def _warm_up():
+    """
+    Инициализация процесса-исполнителя: импорт решателей и решение
+    маленькой задачи, чтобы первый запрос не платил за загрузку модулей
+    """
+    import numpy as np
+    import algorithm.dependent_schedule
+    import algorithm.optimized_dependent_schedule
+    import algorithm.list_schedule
+
+    asc.get_optimal_schedule(np.matrix([[1, 2], [2, 1]]), solver=asc.SOLVER_HUNGARIAN, detect_structure=False)
+
+
+def _integer_array(value, name):
+    """
+    Преобразует вложенные списки JSON в массив целых чисел. Дробные числа и
+    логические значения не принимаются, а не округляются
+
+    :param value:
+    :param str name: имя поля для сообщения об ошибке
+    :rtype np.ndarray
+    :raises InvalidRequest If some element is not an integer
+    """
+    import numpy as np
+
+    error = InvalidRequest('{} must contain only integers'.format(name))
+    try:
+        elements = np.array(value, object)
+    except ValueError:
+        raise error
+    if not all(isinstance(element, int) and not isinstance(element, bool) for element in elements.ravel()):
+        raise error
+    try:
+        return np.array(elements, np.int64)
+    except OverflowError:
+        raise InvalidRequest('{} contains too large integers'.format(name))
+
+
+def parse_request(request):
+    """
+    Проверяет запрос и преобразует его в параметры решателей
+
+    :param dict request:
+    :rtype (np.matrix, algorithm.dependency.DependencyGraph|None, str, str|None, float|None)
+    :return: матрица времен, граф зависимостей, метод, решатель (None - по умолчанию), ограничение времени
+    :raises InvalidRequest If the request is malformed
+    """
+    import numpy as np
+    import algorithm.dependency as ad
+    import algorithm.dependent_schedule as ads
+
+    if not isinstance(request, dict):
+        raise InvalidRequest('Request must be a JSON object')
+    if 'task_costs' not in request:
+        raise InvalidRequest('task_costs is required')
+    task_costs = _integer_array(request['task_costs'], 'task_costs')
+    if task_costs.ndim != 2 or not task_costs.size:
+        raise InvalidRequest('task_costs must be a non-empty matrix')
+    if (task_costs < 0).any():
+        raise InvalidRequest('task_costs must not be negative')
+    task_costs = np.matrix(task_costs)
+    _, task_count = task_costs.shape
+
+    method = request.get('method', METHOD_STAGED)
+    if method not in METHODS:
+        raise InvalidRequest('method must be one of {}'.format(', '.join(METHODS)))
+    solver = request.get('solver')
+    if solver is not None and solver not in asc.SOLVERS:
+        raise InvalidRequest('solver must be one of {}'.format(', '.join(asc.SOLVERS)))
+    time_budget = request.get('time_budget')
+    if time_budget is not None and (not isinstance(time_budget, (int, float)) or isinstance(time_budget, bool) or
+                                    time_budget <= 0):
+        raise InvalidRequest('time_budget must be a positive number')
+
+    dependency_graph = None
+    if request.get('dependencies') is not None:
+        edges = _integer_array(request['dependencies'], 'dependencies')
+        if edges.ndim != 2 or edges.shape[1] != 2:
+            if edges.size:
+                raise InvalidRequest('dependencies must be a list of [task, dependent task] pairs')
+            edges = edges.reshape(-1, 2)
+        if len(edges) and (edges.min() < 0 or edges.max() >= task_count):
+            raise InvalidRequest('dependencies refer to tasks missing in task_costs')
+        dependency_graph = ad.DependencyGraph.from_edges(task_count, edges[:, 0], edges[:, 1])
+        ads.validate_dependency_graph(dependency_graph, task_costs)
+    return task_costs, dependency_graph, method, solver, time_budget
+
+
+def schedule_to_json(schedule):
+    """
+    :param classes.schedule.Schedule schedule:
+    :rtype dict
+    :return: {"processors": {процессор: [[таск, начало, конец], ...], ...},
+        "objective": total flow time, "makespan": ..., "is_optimal": ...}
+    """
+    return {
+        'processors': {str(processor): [list(interval) for interval in intervals]
+                       for processor, intervals in schedule.get_task_intervals().items()},
+        'objective': schedule.total_flow_time(),
+        'makespan': schedule.max_busy_time(),
+        'is_optimal': schedule.is_optimal,
+    }
+
+
+def solve_request(request, default_time_budget=None):
+    """
+    Решает задачу из запроса. Выполняется в процессе-исполнителе
+
+    :param dict request:
+    :param float|None default_time_budget: ограничение времени, если в запросе его нет
+    :rtype dict
+    :raises InvalidRequest If the request is malformed
+    """
+    timings = {}
+    t0 = util.default_timer()
+    task_costs, dependency_graph, method, solver, time_budget = parse_request(request)
+    timings['parse'] = (util.default_timer() - t0) * 1000.
+
+    time_budget = time_budget or default_time_budget
+    if solver is None:
+        solver = asc.DEFAULT_DEADLINE_SOLVER if time_budget else asc.DEFAULT_SOLVER
+    elif time_budget and solver not in asc.DEADLINE_SOLVERS:
+        raise InvalidRequest('solver {} can not be interrupted, use one of {} with time_budget'.format(
+                solver, ', '.join(asc.DEADLINE_SOLVERS)))
+    deadline = util.Deadline(time_budget) if time_budget else None
+    t0 = util.default_timer()
+    if dependency_graph is None:
+        schedule = asc.get_optimal_schedule(task_costs, solver=solver, deadline=deadline)
+    else:
+        import algorithm.dependency as ad
+        import algorithm.dependent_schedule as ads
+        import algorithm.optimized_dependent_schedule as aods
+        import algorithm.list_schedule as als
+
+        try:
+            dependency_index = ad.DependencyIndex(dependency_graph)
+        except ad.NotDirectedAcyclicGraph:
+            raise InvalidRequest('Dependency graph is not a directed acyclic graph')
+        if method == METHOD_LIST:
+            schedule = als.get_schedule(task_costs, dependency_index)
+        elif method == METHOD_OPTIMIZED:
+            schedule = aods.get_optimal_schedule(task_costs, dependency_index, solver=solver, deadline=deadline)
+        else:
+            schedule = ads.get_optimal_schedule(task_costs, dependency_index, solver=solver, deadline=deadline)
+    timings['schedule'] = (util.default_timer() - t0) * 1000.
+
+    result = schedule_to_json(schedule)
+    result['timings_ms'] = timings
+    return result
+
+
+class SchedulingService:
+    """
+    Пул процессов-исполнителей с ограниченным количеством принятых задач.
+    Если процесс-исполнитель погиб, пул становится неработоспособным: он
+    перезапускается в отдельном потоке, а пока перезапуск не закончен,
+    задачи не принимаются и /health сообщает "degraded"
+    """
+    def __init__(self, processes, queue_size=DEFAULT_QUEUE_SIZE, default_time_budget=None):
+        """
+        :param int processes: количество процессов-исполнителей
+        :param int queue_size: сколько задач может ждать свободного исполнителя
+        :param float|None default_time_budget: ограничение времени для запросов без time_budget
+        """
+        self.processes = processes
+        self.capacity = processes + queue_size
+        self.default_time_budget = default_time_budget
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor = self._start_executor()  # None, пока пул перезапускается
+
+    def _start_executor(self):
+        """
+        :rtype ProcessPoolExecutor
+        """
+        executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_warm_up)
+        try:
+            # исполнители запускаются лениво, запускаем их сразу
+            for future in [executor.submit(_warm_up) for _ in range(0, self.processes)]:
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return executor
+
+    def _restart(self, broken_executor):
+        """
+        Заменяет неработоспособный пул новым. Повторные вызовы для того же пула
+        ничего не делают
+
+        :param ProcessPoolExecutor broken_executor:
+        """
+        with self._lock:
+            if self._executor is not broken_executor:
+                return
+            self._executor = None
+            self.restarts += 1
+
+        def _run():
+            broken_executor.shutdown(wait=False)
+            while True:
+                try:
+                    executor = self._start_executor()
+                    break
+                except Exception as e:
+                    # например, BrokenProcessPool или OSError при нехватке ресурсов
+                    print('Failed to restart worker processes, retrying in {} s: {!r}'.format(
+                            RETRY_AFTER_SECONDS, e), file=sys.stderr)
+                    time.sleep(RETRY_AFTER_SECONDS)
+            with self._lock:
+                self._executor = executor
+
+        threading.Thread(target=_run, name='executor-restart', daemon=True).start()
+
+    def _release(self, executor, future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._restart(executor)
+
+    def submit(self, request):
+        """
+        :param dict request:
+        :rtype concurrent.futures.Future
+        :return: future с результатом solve_request
+        :raises Overloaded If all workers are busy and the queue is full
+        :raises WorkersUnavailable If worker processes died and are being restarted
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded('Service is overloaded')
+        executor = None
+        try:
+            with self._lock:
+                executor = self._executor
+            if executor is None:
+                raise WorkersUnavailable('Worker processes are being restarted')
+            future = executor.submit(solve_request, request, self.default_time_budget)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._restart(executor)
+            raise WorkersUnavailable('Worker processes died and are being restarted')
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.pending += 1
+            self.accepted += 1
+        future.add_done_callback(lambda done: self._release(executor, done))
+        return future
+
+    def status(self):
+        """
+        :rtype dict
+        """
+        with self._lock:
+            return {'status': 'ok' if self._executor is not None else 'degraded', 'processes': self.processes,
+                    'capacity': self.capacity, 'pending': self.pending, 'accepted': self.accepted,
+                    'rejected': self.rejected, 'restarts': self.restarts}
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # у соединений через Unix-сокет нет адреса клиента
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def _reply(self, code, body, headers=None):
+        data = json.dumps(body, sort_keys=True).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._reply(404, {'error': 'Not found'})
+            return
+        self._reply(200, self.server.service.status())
+
+    def do_POST(self):
+        if self.path != '/schedule':
+            self._reply(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self._reply(411, {'error': 'Content-Length is required'})
+            return
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self._reply(413, {'error': 'Request is larger than {} bytes'.format(MAX_REQUEST_BYTES)})
+            return
+        try:
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError as e:
+            self._reply(400, {'error': 'Invalid JSON: {}'.format(e)})
+            return
+
+        try:
+            future = self.server.service.submit(request)
+        except (Overloaded, WorkersUnavailable) as e:
+            self._reply(503, {'error': str(e)}, {'Retry-After': str(RETRY_AFTER_SECONDS)})
+            return
+        try:
+            self._reply(200, future.result())
+        except InvalidRequest as e:
+            self._reply(400, {'error': str(e)})
+        except BrokenProcessPool:
+            self._reply(503, {'error': 'Worker process died, the request was not solved'},
+                        {'Retry-After': str(RETRY_AFTER_SECONDS)})
+        except Exception as e:
+            self._reply(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    """
+    :param SchedulingService service:
+    :param str host:
+    :param int port:
+    :param str|None unix_socket: путь к Unix-сокету, если задан, host и port не используются
+    :rtype socketserver.BaseServer
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket) and stat.S_ISSOCK(os.stat(unix_socket).st_mode):
+            os.unlink(unix_socket)
+        server = _UnixHTTPServer(unix_socket, _RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves schedules over HTTP on localhost or a Unix socket.')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST)
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix-socket', '-u', type=str, default=None,
+                        help='path of a Unix socket to listen on instead of TCP')
+    parser.add_argument('--processes', '-j', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--queue-size', '-q', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='number of requests that may wait for a worker, the rest are rejected with 503')
+    parser.add_argument('--time-budget', '-b', type=float, default=None,
+                        help='time limit in seconds for requests without their own time_budget')
+    args = parser.parse_args()
+
+    if not args.processes or args.processes < 1:
+        exit_printing_error('Wrong processes number given!')
+    if args.queue_size < 0:
+        exit_printing_error('Wrong queue size given!')
+    if args.time_budget is not None and args.time_budget <= 0:
+        exit_printing_error('Wrong time budget given!')
+
+    service = SchedulingService(args.processes, args.queue_size, args.time_budget)
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    print('Listening on {}'.format(args.unix_socket or 'http://{}:{}'.format(args.host, args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
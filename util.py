@@ -1,4 +1,5 @@
 import sys
+import threading
 import time
 
 
@@ -10,9 +11,80 @@ def exit_printing_error(msg):
     print(msg)
     sys.exit(1)
 
-if is_windows():
-    # On Windows, the best timer is time.clock()
-    default_timer = time.clock
-else:
-    # On most other platforms the best timer is time.time()
-    default_timer = time.time
+# монотонный таймер наибольшей точности на всех платформах
+# (time.clock удалён в Python 3.8, time.time может идти назад)
+default_timer = time.perf_counter
+
+
+class Deadline:
+    """
+    Момент времени, к которому вычисления должны завершиться. Считается по
+    default_timer, часы которого общие для всей системы, поэтому объект
+    может передаваться в другие процессы
+    """
+    def __init__(self, budget):
+        """
+        :param float budget: бюджет времени в секундах, отсчитывается с момента создания
+        """
+        self.budget = budget
+        self.finish_time = default_timer() + budget
+
+    def remaining(self):
+        """
+        :rtype float
+        :return: оставшееся время в секундах, не меньше нуля
+        """
+        return max(0., self.finish_time - default_timer())
+
+    def expired(self):
+        """
+        :rtype bool
+        """
+        return default_timer() >= self.finish_time
+
+
+class CancellationToken:
+    """
+    Флаг отмены вычислений, передаётся решателям вместо Deadline: они
+    проверяют его в тех же местах, что и ограничение времени, и после отмены
+    останавливаются на ближайшей проверке. В отличие от Deadline работает
+    только внутри одного процесса
+    """
+    def __init__(self, deadline=None):
+        """
+        :param Deadline|None deadline: ограничение времени, которое тоже нужно соблюдать
+        """
+        self.deadline = deadline
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self):
+        """
+        :rtype bool
+        """
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        """
+        :rtype float
+        :return: оставшееся время в секундах, не меньше нуля
+        """
+        if self.cancelled():
+            return 0.
+        return self.deadline.remaining() if self.deadline is not None else float('inf')
+
+    def expired(self):
+        """
+        :rtype bool
+        """
+        return self.cancelled() or is_expired(self.deadline)
+
+
+def is_expired(deadline):
+    """
+    :param Deadline|CancellationToken|None deadline: None - ограничения по времени нет
+    :rtype bool
+    """
+    return deadline is not None and deadline.expired()